@@ -0,0 +1,92 @@
+"""
+Compares the memory used by ChecksumHelperData.entries when stored in a dict of
+HashedFiles vs. in a CompactEntries for 1M and 10M entries
+
+Usage: python benchmarks/bench_entries_memory.py [--counts N [N ...]] [--algo ALGO]
+
+NOTE: every measurement runs in a new process and reports the growth of the peak RSS
+      while filling the entries (Unix only), so the numbers include the path strings
+      that are kept alive by the dict, but also any allocator overhead
+      10M entries in a dict need about 4GiB of RAM
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import resource  # noqa: E402
+
+from checksum_helper.checksum_helper import HashedFile, CompactEntries  # noqa: E402
+
+MiB = 1024 * 1024
+
+COUNTS = (1_000_000, 10_000_000)
+BACKENDS = ("dict", "compact")
+DIGEST_SIZES = {"md5": 16, "sha1": 20, "sha256": 32, "sha512": 64}
+# files per directory, directories per parent directory
+FILES_PER_DIR = 100
+DIRS_PER_DIR = 100
+
+
+def peak_rss() -> int:
+    # KiB on linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def fill(backend: str, count: int, algo: str) -> None:
+    entries = {} if backend == "dict" else CompactEntries()
+    digest_size = DIGEST_SIZES[algo]
+    mtime = 1_524_334_794_406_719_400
+    for i in range(count):
+        sub_dir = i // FILES_PER_DIR
+        path = os.path.join(os.sep, "bench", f"dir_{sub_dir // DIRS_PER_DIR}",
+                            f"sub_{sub_dir % DIRS_PER_DIR}", f"file_{i}.jpg")
+        digest = i.to_bytes(8, "little") * (digest_size // 8) + bytes(digest_size % 8)
+        entries[path] = HashedFile(path, mtime + i, algo, digest, False, i * 4096)
+    assert len(entries) == count
+
+
+def run_child(backend: str, count: int, algo: str) -> None:
+    before = peak_rss()
+    start = time.perf_counter()
+    fill(backend, count, algo)
+    elapsed = time.perf_counter() - start
+    print(f"{peak_rss() - before} {elapsed}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", nargs="+", type=int, default=COUNTS,
+                        help="Number of entries to test (default: 1M 10M)")
+    parser.add_argument("--algo", default="sha512", choices=sorted(DIGEST_SIZES))
+    parser.add_argument("--child", nargs=2, metavar=("BACKEND", "COUNT"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], int(args.child[1]), args.algo)
+        return
+
+    print(f"{'entries':>10} | " + " | ".join(f"{b:>18}" for b in BACKENDS) +
+          "  (MiB, bytes/entry, fill time)")
+    for count in args.counts:
+        results = []
+        for backend in BACKENDS:
+            out = subprocess.run(
+                [sys.executable, os.path.realpath(__file__), "--algo", args.algo,
+                 "--child", backend, str(count)],
+                check=True, capture_output=True, text=True).stdout
+            used, elapsed = out.split()
+            results.append((int(used), float(elapsed)))
+        print(f"{count:>10} | " + " | ".join(
+            f"{used / MiB:>7.0f} {used / count:>4.0f} {elapsed:>4.1f}s"
+            for used, elapsed in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compares hashing a tree of many small files (default: 1M 4KiB files) serially,
+on a thread pool and on a ProcessHashPool using gen_missing_checksums
+
+Usage: python benchmarks/bench_hash_backends.py [--dir DIR] [--count N] [--size SIZE]
+                                                [--jobs N] [--processes N] [--algo ALGO]
+
+NOTE: the tree is created once in DIR (default: temp dir, which is removed afterwards)
+      and re-used by later runs with the same DIR, count and size
+      1M 4KiB files need about 4GiB (+ file system overhead) of disk space
+      all backends after the first one mostly read from the page cache, use a tree
+      that's bigger than your RAM to get numbers that include disk I/O
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from checksum_helper.checksum_helper import (  # noqa: E402
+    ChecksumHelper, ProcessHashPool, set_hash_pool
+)
+
+KiB = 1024
+FILES_PER_DIR = 1000
+
+
+def create_tree(root: str, count: int, size: int) -> None:
+    marker = os.path.join(root, f".bench_tree_{count}_{size}")
+    if os.path.isfile(marker):
+        return
+    print(f"Creating {count} files of {size} bytes in {root}")
+    for i in range(count):
+        dirpath = os.path.join(root, f"dir_{i // FILES_PER_DIR}")
+        if i % FILES_PER_DIR == 0:
+            os.makedirs(dirpath, exist_ok=True)
+        with open(os.path.join(dirpath, f"file_{i}"), "wb") as f:
+            f.write(i.to_bytes(8, "little") * (size // 8) + bytes(size % 8))
+    open(marker, "w").close()
+
+
+def bench(root: str, algo: str, jobs: int) -> float:
+    ch = ChecksumHelper(root)
+    start = time.perf_counter()
+    hashed = ch.gen_missing_checksums(algo, jobs=jobs)
+    elapsed = time.perf_counter() - start
+    assert hashed is not None
+    return elapsed
+
+
+def run(root: str, args: argparse.Namespace) -> None:
+    create_tree(root, args.count, args.size)
+
+    results = [("serial", bench(root, args.algo, 1)),
+               (f"threads ({args.jobs})", bench(root, args.algo, args.jobs))]
+    with ProcessHashPool(args.processes or None) as pool:
+        set_hash_pool(pool)
+        try:
+            results.append((f"processes ({pool.processes})",
+                            bench(root, args.algo, pool.processes * pool.batch_size)))
+        finally:
+            set_hash_pool(None)
+
+    print(f"{'backend':>16} | {'time':>8} | {'files/s':>10}")
+    for name, elapsed in results:
+        print(f"{name:>16} | {elapsed:>7.1f}s | {args.count / elapsed:>10.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=None,
+                        help="Directory the tree is created in (default: temp dir)")
+    parser.add_argument("--count", default=1_000_000, type=int,
+                        help="Number of files (default: 1M)")
+    parser.add_argument("--size", default=4 * KiB, type=int,
+                        help="Size of every file in bytes (default: 4096)")
+    parser.add_argument("--jobs", default=os.cpu_count() or 1, type=int,
+                        help="Number of threads (default: number of CPUs)")
+    parser.add_argument("--processes", default=0, type=int,
+                        help="Number of processes (default: number of CPUs)")
+    parser.add_argument("--algo", default="sha512")
+    args = parser.parse_args()
+
+    if args.dir is not None:
+        os.makedirs(args.dir, exist_ok=True)
+        run(args.dir, args)
+    else:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            run(tmpdir, args)
+
+
+if __name__ == "__main__":
+    main()
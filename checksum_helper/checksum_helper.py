@@ -10,13 +10,30 @@ import binascii
 import datetime
 import enum
 import copy
+import mmap
+import sqlite3
+import threading
+import queue
+import multiprocessing
+import asyncio
+import collections
+import functools
+import re
+
+from array import array
+
+from concurrent.futures import (
+    Executor, ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+)
 
 from dataclasses import dataclass, fields
 from logging.handlers import RotatingFileHandler
 
 from typing import (
     Optional, List, Union, Sequence, Tuple, overload, Literal, Iterable, cast,
-    Dict, TypedDict, Set, Iterator, Final
+    Dict, TypedDict, Set, Iterator, Final, Callable, TypeVar, Deque, AbstractSet,
+    MutableMapping, ItemsView, ValuesView, FrozenSet, Generic, Generator, AsyncGenerator,
+    Any
 )
 
 MODULE_PATH = os.path.dirname(os.path.realpath(__file__))
@@ -118,6 +135,109 @@ def wildcard_match(pattern: str, text: str, partial_match: bool = False) -> bool
     return False
 
 
+def _wildcard_regex(pattern: str) -> str:
+    return "".join(".*" if c == '*' else "." if c == '?' else re.escape(c) for c in pattern)
+
+
+class PatternSet:
+    """
+    Set of wildcard patterns that are compiled once, answers the same queries
+    as calling wildcard_match for every pattern:
+    matches(path)         -> any(wildcard_match(pat, path) for pat in patterns)
+    partial_matches(path) -> any(wildcard_match(pat, path, partial_match=True) for ...)
+    Use `pattern_set` to get a cached instance
+
+    The typical patterns 'dir/sub/*' (literal prefix), '*.ext' (literal suffix) and
+    ones without any wildcards are answered using set look-ups (one per distinct
+    prefix/suffix length), only the remaining ones are matched using a regex
+    """
+
+    __slots__ = ("patterns", "_exact", "_prefixes", "_suffixes", "_combined",
+                 "_partial_prefixes")
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: Tuple[str, ...] = tuple(patterns)
+        self._exact: Set[str] = set()
+        prefixes: Dict[int, Set[str]] = {}
+        suffixes: Dict[int, Set[str]] = {}
+        general: List[str] = []
+        for pat in self.patterns:
+            if '?' in pat:
+                general.append(pat)
+            elif '*' not in pat:
+                self._exact.add(pat)
+            elif '*' not in pat.rstrip('*'):
+                # NOTE: also matches '*' (empty prefix)
+                prefix = pat.rstrip('*')
+                prefixes.setdefault(len(prefix), set()).add(prefix)
+            elif '*' not in pat.lstrip('*'):
+                suffix = pat.lstrip('*')
+                suffixes.setdefault(len(suffix), set()).add(suffix)
+            else:
+                general.append(pat)
+        # (length, literals with that length)
+        self._prefixes = [(length, frozenset(lits)) for length, lits in prefixes.items()]
+        self._suffixes = [(length, frozenset(lits)) for length, lits in suffixes.items()]
+        # all remaining patterns combined into one alternation, so a path is checked
+        # against all of them by the regex engine in a single call
+        self._combined = re.compile(
+            "|".join(f"(?:{_wildcard_regex(pat)})" for pat in general),
+            re.DOTALL) if general else None
+        # wildcard_match can only fail a partial match before it reaches the first '*',
+        # afterwards the rest of the text is always accepted
+        # -> only the part before the first '*' is needed:
+        # (prefix, whether there's a '*', whether prefix contains a '?')
+        self._partial_prefixes: List[Tuple[str, bool, bool]] = []
+        for pat in self.patterns:
+            prefix, star, _ = pat.partition('*')
+            self._partial_prefixes.append((prefix, bool(star), '?' in prefix))
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def __repr__(self) -> str:
+        return f"PatternSet({list(self.patterns)!r})"
+
+    def matches(self, path: str) -> bool:
+        if path in self._exact:
+            return True
+        for length, prefixes in self._prefixes:
+            if path[:length] in prefixes:
+                return True
+        for length, suffixes in self._suffixes:
+            # suffixes are never empty, so path[-length:] is fine
+            if path[-length:] in suffixes:
+                return True
+        return self._combined is not None and self._combined.fullmatch(path) is not None
+
+    def partial_matches(self, path: str) -> bool:
+        for prefix, has_star, has_qmark in self._partial_prefixes:
+            # without a '*' the text can't be longer than the pattern
+            if not has_star and len(path) > len(prefix):
+                continue
+            if not has_qmark:
+                if prefix.startswith(path[:len(prefix)]):
+                    return True
+            elif all(p == '?' or p == c for p, c in zip(prefix, path)):
+                return True
+        return False
+
+
+@functools.lru_cache(maxsize=128)
+def _cached_pattern_set(patterns: Tuple[str, ...]) -> PatternSet:
+    return PatternSet(patterns)
+
+
+def pattern_set(patterns: Union[Iterable[str], PatternSet]) -> PatternSet:
+    """Returns a (cached) compiled PatternSet for `patterns`"""
+    if isinstance(patterns, PatternSet):
+        return patterns
+    return _cached_pattern_set(tuple(patterns))
+
+
 def split_path(path_str: str) -> Tuple[Optional[List[str]], Optional[str]]:
     result = []
     sep = ('/', '\\')
@@ -196,38 +316,823 @@ def move_fpath(abspath: str, mv_path: str) -> Optional[str]:
         return os.sep.join(curr_path)
 
 
+class ReadStrategy(enum.Enum):
+    # read() chunks, each read allocates a new bytes object
+    READ = "read"
+    # read chunks into a re-used buffer, so no allocations happen per chunk
+    READINTO = "readinto"
+    # memory-map the file and hash slices of the mapping
+    # NOTE: accessing the mapping fails with SIGBUS if the file gets truncated
+    #       while it's being hashed
+    MMAP = "mmap"
+
+
+# (file size upper bound (exclusive, None -> no bound), strategy, chunk size)
+# the first entry whose bound is bigger than the file size will be used
+# defaults were chosen using benchmarks/bench_read_strategies.py
+ReadStrategies = Sequence[Tuple[Optional[int], ReadStrategy, int]]
+READ_STRATEGIES: ReadStrategies = (
+    (64 * 1024, ReadStrategy.READ, 64 * 1024),
+    (None, ReadStrategy.READINTO, 1024 * 1024),
+)
+# files smaller than this are hashed in batches of SMALL_FILE_BATCH_SIZE files
+# (see gen_hashes_from_files) to reduce the per-file overhead
+SMALL_FILE_MAX_SIZE = 64 * 1024
+SMALL_FILE_BATCH_SIZE = 64
+
+# per thread buffers used by ReadStrategy.READINTO
+_read_buffers = threading.local()
+
+
+def _read_buffer(size: int) -> memoryview:
+    buf = getattr(_read_buffers, "buffer", None)
+    if buf is None or len(buf) < size:
+        buf = bytearray(size)
+        _read_buffers.buffer = buf
+    return memoryview(buf)[:size]
+
+
+SIZE_SUFFIXES = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(value: str) -> int:
+    """Parses sizes like 4096, 500M or 1.5T (binary units)"""
+    number, suffix = value, ""
+    if value and value[-1].upper() in SIZE_SUFFIXES:
+        number, suffix = value[:-1], value[-1].upper()
+    return int(float(number) * SIZE_SUFFIXES[suffix])
+
+
+class IOThrottle:
+    """
+    Token bucket that limits the read rate (bytes/s) and optionally the number of
+    read calls per second (IOPS) of all threads hashing files
+    Reads are allowed to go into debt, so a big read waits proportionally
+    long afterwards instead of starving
+
+    The limits can be changed while hashing using `set_limits` or by writing
+    `RATE [IOPS]` (e.g. `50M 200`, `0` disables a limit) to `control_file`,
+    which is checked at most once a second
+    """
+
+    CONTROL_FILE_CHECK_INTERVAL: Final[float] = 1.0
+
+    def __init__(self, bytes_per_sec: Optional[int] = None, iops: Optional[int] = None,
+                 control_file: Optional[str] = None, burst_seconds: float = 1.0):
+        self.burst_seconds = burst_seconds
+        self.control_file = control_file
+        self._lock = threading.Lock()
+        self._last = time.monotonic()
+        self._control_checked = 0.0
+        self._control_mtime: Optional[int] = None
+        self.set_limits(bytes_per_sec, iops)
+
+    def set_limits(self, bytes_per_sec: Optional[int], iops: Optional[int]) -> None:
+        """None or 0 disables the limit"""
+        with self._lock:
+            self._set_limits(bytes_per_sec, iops)
+
+    def _set_limits(self, bytes_per_sec: Optional[int], iops: Optional[int]) -> None:
+        # needs self._lock to be held
+        self.bytes_per_sec = bytes_per_sec or None
+        self.iops = iops or None
+        # start with a full bucket
+        self._byte_tokens = (self.bytes_per_sec or 0) * self.burst_seconds
+        self._op_tokens = (self.iops or 0) * self.burst_seconds
+
+    def _check_control_file(self, now: float) -> None:
+        # needs self._lock to be held
+        if (self.control_file is None or
+                now - self._control_checked < self.CONTROL_FILE_CHECK_INTERVAL):
+            return
+        self._control_checked = now
+        try:
+            mtime = os.stat(self.control_file).st_mtime_ns
+            if mtime == self._control_mtime:
+                return
+            with open(self.control_file, "r", encoding="UTF-8") as f:
+                parts = f.read().split()
+            self._control_mtime = mtime
+        except OSError:
+            return
+
+        try:
+            bytes_per_sec = parse_size(parts[0]) if parts else None
+            iops = int(parts[1]) if len(parts) > 1 else self.iops
+        except (ValueError, KeyError):
+            logger.warning("Invalid I/O limits in control file '%s': '%s'",
+                           self.control_file, " ".join(parts))
+            return
+        self._set_limits(bytes_per_sec, iops)
+        logger.info("Changed I/O limits to %s bytes/s and %s IOPS",
+                    self.bytes_per_sec or "unlimited", self.iops or "unlimited")
+
+    def acquire(self, nbytes: int) -> None:
+        """Blocks until a read of `nbytes` is allowed"""
+        wait = 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._check_control_file(now)
+            elapsed = now - self._last
+            self._last = now
+            if self.bytes_per_sec:
+                self._byte_tokens = min(
+                    self._byte_tokens + elapsed * self.bytes_per_sec,
+                    self.bytes_per_sec * self.burst_seconds) - nbytes
+                if self._byte_tokens < 0:
+                    wait = -self._byte_tokens / self.bytes_per_sec
+            if self.iops:
+                self._op_tokens = min(
+                    self._op_tokens + elapsed * self.iops,
+                    self.iops * self.burst_seconds) - 1
+                if self._op_tokens < 0:
+                    wait = max(wait, -self._op_tokens / self.iops)
+        if wait > 0:
+            time.sleep(wait)
+
+
+# used by gen_hash_from_file if no throttle is passed, see set_io_throttle
+_io_throttle: Optional[IOThrottle] = None
+
+
+def set_io_throttle(throttle: Optional[IOThrottle]) -> None:
+    """Limits the reads of all following gen_hash_from_file calls (None -> unlimited)"""
+    global _io_throttle
+    _io_throttle = throttle
+
+
+def _hash_file_obj(f, file_size: int, hash_objs: List['hashlib._Hash'],
+                   read_strategies: ReadStrategies,
+                   throttle: Optional[IOThrottle] = None) -> None:
+    strategy, chunk_size = ReadStrategy.READINTO, 1024 * 1024
+    for max_size, strategy, chunk_size in read_strategies:
+        if max_size is None or file_size < max_size:
+            break
+
+    # mmap can't map empty files
+    if strategy is ReadStrategy.MMAP and file_size > 0:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                memoryview(mm) as view:
+            for offset in range(0, len(view), chunk_size):
+                chunk = view[offset:offset + chunk_size]
+                if throttle is not None:
+                    throttle.acquire(len(chunk))
+                for hash_obj in hash_objs:
+                    hash_obj.update(chunk)
+                chunk.release()
+    elif strategy is ReadStrategy.READINTO:
+        buf = _read_buffer(chunk_size)
+        # reads are paid for afterwards, so the actual size is used
+        nread = f.readinto(buf)
+        while nread:
+            if throttle is not None:
+                throttle.acquire(nread)
+            chunk = buf[:nread]
+            for hash_obj in hash_objs:
+                hash_obj.update(chunk)
+            nread = f.readinto(buf)
+    else:
+        # the size might have changed after the stat, so read until EOF
+        data = f.read(chunk_size)
+        while data:
+            if throttle is not None:
+                throttle.acquire(len(data))
+            for hash_obj in hash_objs:
+                hash_obj.update(data)
+            data = f.read(chunk_size)
+
+
 # _hex = ... so we use the default _hex=False when omitting _hex
 @overload
 def gen_hash_from_file(fname: str, hash_algo_str: str,
-                       _hex: Literal[False] = ...) -> bytes: ...
+                       _hex: Literal[False] = ...,
+                       read_strategies: Optional[ReadStrategies] = ...,
+                       throttle: Optional[IOThrottle] = ...) -> bytes: ...
 
 
 @overload
 def gen_hash_from_file(fname: str, hash_algo_str: str,
-                       _hex: Literal[True]) -> str: ...
+                       _hex: Literal[True],
+                       read_strategies: Optional[ReadStrategies] = ...,
+                       throttle: Optional[IOThrottle] = ...) -> str: ...
+
+
+@overload
+def gen_hash_from_file(fname: str, hash_algo_str: AbstractSet[str],
+                       _hex: Literal[False] = ...,
+                       read_strategies: Optional[ReadStrategies] = ...,
+                       throttle: Optional[IOThrottle] = ...) -> Dict[str, bytes]: ...
 
 
-def gen_hash_from_file(fname: str, hash_algo_str: str, _hex: bool = False) -> Union[str, bytes]:
+@overload
+def gen_hash_from_file(fname: str, hash_algo_str: AbstractSet[str],
+                       _hex: Literal[True],
+                       read_strategies: Optional[ReadStrategies] = ...,
+                       throttle: Optional[IOThrottle] = ...) -> Dict[str, str]: ...
+
+
+def gen_hash_from_file(
+        fname: str, hash_algo_str: Union[str, AbstractSet[str]],
+        _hex: bool = False,
+        read_strategies: Optional[ReadStrategies] = None,
+        throttle: Optional[IOThrottle] = None
+) -> Union[str, bytes, Dict[str, str], Dict[str, bytes]]:
+    """
+    Hashes the file `fname` using the hash algorithm `hash_algo_str`
+    If a set of algorithm names is passed, all of them are computed while reading
+    the file only once and a dict of algorithm name -> digest is returned
+
+    read_strategies: how the file is read depending on its size,
+                     see READ_STRATEGIES (default)
+    throttle: limits the read rate (default: the one set with set_io_throttle)
+    """
     # construct a hash object by calling the appropriate constructor function
-    hash_obj = hashlib.new(hash_algo_str)
+    if isinstance(hash_algo_str, str):
+        hash_objs = [hashlib.new(hash_algo_str)]
+    else:
+        hash_objs = [hashlib.new(algo) for algo in hash_algo_str]
     # open file in read-only byte-mode
-    with open(fname, "rb") as f:
-        # only read in chunks of 64 KiB (larger chunks better for big files,
-        # but going beyond 64k did not make much of a difference)
-        chunk = f.read(65536)
-        while chunk:
-            # update it with the data by calling update() on the object
-            # as many times as you need to iteratively update the hash
-            hash_obj.update(chunk)
-            chunk = f.read(65536)
-        # using the lambda was slower (~30-40ms) for ~586 files
-        # for chunk in iter(lambda: f.read(4096), b""):
+    # unbuffered, since we either read the whole file at once or read big
+    # chunks into our own buffer
+    with open(fname, "rb", buffering=0) as f:
+        _hash_file_obj(f, os.fstat(f.fileno()).st_size, hash_objs,
+                       READ_STRATEGIES if read_strategies is None else read_strategies,
+                       _io_throttle if throttle is None else throttle)
 
     # get digest out of the object by calling digest() (or hexdigest() for hex-encoded string)
-    if _hex:
-        return hash_obj.hexdigest()
+    if isinstance(hash_algo_str, str):
+        return hash_objs[0].hexdigest() if _hex else hash_objs[0].digest()
+    elif _hex:
+        return {algo: hash_obj.hexdigest() for algo, hash_obj in zip(hash_algo_str, hash_objs)}
+    else:
+        return {algo: hash_obj.digest() for algo, hash_obj in zip(hash_algo_str, hash_objs)}
+
+
+def _hash_constructor(algo: str) -> Callable[[bytes], 'hashlib._Hash']:
+    # the named constructors (hashlib.sha512 etc.) are faster than hashlib.new
+    ctor = getattr(hashlib, algo, None) if algo in hashlib.algorithms_guaranteed else None
+    return ctor if ctor is not None else functools.partial(hashlib.new, algo)
+
+
+def gen_hashes_from_files(
+        fnames: Iterable[str], hash_algo_str: Union[str, AbstractSet[str]],
+        throttle: Optional[IOThrottle] = None
+) -> List[Union[None, bytes, Dict[str, bytes]]]:
+    """
+    Same as gen_hash_from_file but hashes many small files in one call: the hash
+    constructors are only looked up once and every file is read with a single read()
+    Returns the digest(s) for every file in `fnames` or None if the file couldn't be
+    read (errors are not logged, so the caller can hash these files again to report them)
+    """
+    single = isinstance(hash_algo_str, str)
+    algos = [cast(str, hash_algo_str)] if single else list(hash_algo_str)
+    ctors = [_hash_constructor(algo) for algo in algos]
+    if throttle is None:
+        throttle = _io_throttle
+
+    results: List[Union[None, bytes, Dict[str, bytes]]] = []
+    for fname in fnames:
+        try:
+            with open(fname, "rb", buffering=0) as f:
+                # reads until EOF, in case the file grew
+                data = f.read()
+        except OSError:
+            results.append(None)
+            continue
+        if throttle is not None:
+            throttle.acquire(len(data))
+        if single:
+            results.append(ctors[0](data).digest())
+        else:
+            results.append({algo: ctor(data).digest() for algo, ctor in zip(algos, ctors)})
+    return results
+
+
+def _hash_batch(
+        batch: List[Tuple[str, Union[str, FrozenSet[str]], Optional[int]]]
+) -> List[Tuple[bool, Union[bytes, Dict[str, bytes], OSError], int]]:
+    """
+    Runs on the worker processes of a ProcessHashPool
+    Items are (file name, hash type(s), file size if the caller knows it)
+    Returns (success, digest(s) or the raised OSError, file size) for every file
+    """
+    results: List[Tuple[bool, Union[bytes, Dict[str, bytes], OSError], int]] = []
+    for fname, hash_type, size in batch:
+        try:
+            digest = gen_hash_from_file(fname, hash_type)
+        except OSError as e:
+            results.append((False, e, 0))
+            continue
+        if size is None:
+            try:
+                size = os.stat(fname).st_size
+            except OSError:
+                size = 0
+        results.append((True, digest, size))
+    return results
+
+
+def _resolve_batch(futures: List['Future'], task: 'Future') -> None:
+    try:
+        results = task.result()
+    except BaseException as e:
+        for fut in futures:
+            fut.set_exception(e)
+        return
+    for fut, (success, value, size) in zip(futures, results):
+        if success:
+            fut.set_result((value, size))
+        else:
+            fut.set_exception(cast(OSError, value))
+
+
+class ProcessHashPool:
+    """
+    Computes digests on worker processes instead of the calling thread, for hash
+    algorithms that don't release the GIL or when hashing many tiny files (where the
+    GIL is held for most of the work), see set_hash_pool
+
+    The requests of all threads are batched (up to `batch_size` files or the ones that
+    arrived within `linger` seconds per task) to amortize the IPC, so there should be
+    about processes * batch_size threads requesting digests
+    """
+
+    def __init__(self, processes: Optional[int] = None, batch_size: int = 32,
+                 linger: float = 0.002):
+        self.processes = processes or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.linger = linger
+        # NOTE: spawn since forking a process that runs threads (hashing, pipeline stages)
+        #       might deadlock; the spawned workers also don't inherit the io throttle,
+        #       reads are paid for by the requesting threads instead
+        self._executor = ProcessPoolExecutor(max_workers=self.processes,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        self._cond = threading.Condition()
+        self._batch: List[Tuple[str, Union[str, FrozenSet[str]], Optional[int], 'Future']] = []
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="hash-pool-flusher",
+                                         daemon=True)
+        self._flusher.start()
+
+    def __enter__(self) -> 'ProcessHashPool':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def hash_file(self, fname: str, hash_type: Union[str, AbstractSet[str]],
+                  size: Optional[int] = None) -> Union[bytes, Dict[str, bytes]]:
+        """
+        Same as gen_hash_from_file(fname, hash_type), raises the same OSErrors
+        size: size of the file if it's already known (used for the io throttle),
+              otherwise the worker has to stat the file
+        """
+        fut: 'Future[Tuple[Union[bytes, Dict[str, bytes]], int]]' = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ProcessHashPool is closed")
+            self._batch.append(
+                (fname, hash_type if isinstance(hash_type, str) else frozenset(hash_type),
+                 size, fut))
+            if len(self._batch) >= self.batch_size:
+                self._submit_batch()
+            elif len(self._batch) == 1:
+                self._cond.notify()
+
+        digest, size = fut.result()
+        # reads are paid for afterwards by the threads of this process
+        if _io_throttle is not None:
+            _io_throttle.acquire(size)
+        return digest
+
+    def _submit_batch(self) -> None:
+        # NOTE: expects self._cond to be held
+        batch, self._batch = self._batch, []
+        task = self._executor.submit(
+            _hash_batch, [(fname, ht, size) for fname, ht, size, _ in batch])
+        task.add_done_callback(
+            functools.partial(_resolve_batch, [fut for _, _, _, fut in batch]))
+
+    def _flush_loop(self) -> None:
+        with self._cond:
+            while not self._closed:
+                if not self._batch:
+                    self._cond.wait()
+                    continue
+                # give the other threads a moment to fill up the batch
+                deadline = time.monotonic() + self.linger
+                while self._batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._batch:
+                    self._submit_batch()
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            if self._batch:
+                self._submit_batch()
+            self._cond.notify()
+        self._flusher.join()
+        self._executor.shutdown()
+
+
+# used by HashedFile to compute digests if set, see set_hash_pool
+_hash_pool: Optional[ProcessHashPool] = None
+
+
+def set_hash_pool(pool: Optional[ProcessHashPool]) -> None:
+    """Computes the digests of all following hashing on `pool` (None -> on the calling thread)"""
+    global _hash_pool
+    _hash_pool = pool
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def batch_small_files(items: Iterable[T], size_of: Callable[[T], Optional[int]],
+                      max_size: Optional[int] = None,
+                      batch_size: Optional[int] = None) -> Iterator[List[T]]:
+    """
+    Groups consecutive items whose size (`size_of`, None -> unknown) is smaller than
+    `max_size` (default: SMALL_FILE_MAX_SIZE) into lists of up to `batch_size`
+    (default: SMALL_FILE_BATCH_SIZE) items, all other items are yielded on their own
+    """
+    if max_size is None:
+        max_size = SMALL_FILE_MAX_SIZE
+    if batch_size is None:
+        batch_size = SMALL_FILE_BATCH_SIZE
+    batch: List[T] = []
+    for item in items:
+        size = size_of(item)
+        if size is not None and size < max_size:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        else:
+            if batch:
+                yield batch
+                batch = []
+            yield [item]
+    if batch:
+        yield batch
+
+
+def _item_path(item: Tuple[str, Optional[os.DirEntry]]) -> str:
+    """path_of for imap_ordered when the items are (path, DirEntry) pairs"""
+    return item[0]
+
+
+def _entry_size(item: Tuple[str, Optional[os.DirEntry]]) -> Optional[int]:
+    """size_of for batch_small_files when the items are (path, DirEntry) pairs"""
+    entry = item[1]
+    if entry is None:
+        return None
+    try:
+        return entry.stat().st_size
+    except OSError:
+        return None
+
+
+def _pool_size_hint(entry: Optional[os.DirEntry]) -> Optional[int]:
+    """
+    Size of the file of `entry` for ProcessHashPool.hash_file, so the workers don't
+    have to stat it again (None without a pool, so files aren't stat'ed needlessly)
+    """
+    if _hash_pool is None or entry is None:
+        return None
+    return _entry_size((entry.path, entry))
+
+
+def _batch_path(batch: List[Tuple[str, Optional[os.DirEntry]]]) -> str:
+    """path_of for imap_ordered when the items are batches of (path, DirEntry) pairs"""
+    return batch[0][0]
+
+
+def imap_ordered(func: Callable[[T], R], items: Iterable[T], jobs: int = 1,
+                 max_pending: Optional[int] = None,
+                 scheduler: Optional['DeviceScheduler'] = None,
+                 path_of: Optional[Callable[[T], str]] = None) -> Iterator[Tuple[T, R]]:
+    """
+    Applies `func` to every item in `items` using up to `jobs` worker threads
+    and yields `(item, result)` pairs in the same order as `items`
+    (hashlib releases the GIL when hashing larger chunks so threads scale for I/O
+    and hashing)
+    Only `max_pending` items (default: 4 * jobs) are in flight at the same time
+    so `items` can be a lazy iterator like the one returned from os.walk
+
+    scheduler: if passed the work is distributed by device using the
+               DeviceScheduler instead (`jobs` is ignored), `path_of` is used to get
+               the file path of an item (default: the item itself)
+    """
+    submit: Callable[[T], 'Future[R]']
+    if scheduler is not None:
+        if max_pending is None:
+            max_pending = scheduler.max_pending
+        get_path = path_of if path_of is not None else cast(Callable[[T], str], lambda x: x)
+        sched = scheduler
+
+        def submit(item: T) -> 'Future[R]':
+            return sched.submit(get_path(item), func, item)
+        shutdown = sched.shutdown
+    elif jobs <= 1:
+        for item in items:
+            yield item, func(item)
+        return
     else:
-        return hash_obj.digest()
+        if max_pending is None:
+            max_pending = 4 * jobs
+        executor = ThreadPoolExecutor(max_workers=jobs)
+
+        def submit(item: T) -> 'Future[R]':
+            return executor.submit(func, item)
+        shutdown = executor.shutdown
+
+    try:
+        pending: Deque[Tuple[T, 'Future[R]']] = collections.deque()
+        for item in items:
+            pending.append((item, submit(item)))
+            if len(pending) >= max_pending:
+                done_item, fut = pending.popleft()
+                yield done_item, fut.result()
+
+        while pending:
+            done_item, fut = pending.popleft()
+            yield done_item, fut.result()
+    finally:
+        shutdown()
+
+
+class DeviceScheduler:
+    """
+    Runs (I/O bound) work on one thread pool per device so files that live on
+    different disks are hashed simultaneously, while the number of concurrent
+    reads per disk stays bounded (e.g. 1 for HDDs to avoid seek thrashing, 8 for SSDs)
+
+    Files are grouped by the longest path in `device_jobs` (user-declared device map:
+    path -> number of jobs) they are located in, otherwise by the `st_dev` of their
+    parent directory using `default_jobs` as the number of jobs
+    """
+
+    def __init__(self, default_jobs: int = 1, device_jobs: Optional[Dict[str, int]] = None,
+                 max_pending: int = 256):
+        self.default_jobs = default_jobs
+        # longest paths first so the most specific declared path wins
+        # paths end in a separator so we only match whole path components
+        self.device_jobs: List[Tuple[str, int]] = sorted(
+            ((os.path.join(os.path.normpath(os.path.abspath(p)), ""), j)
+             for p, j in (device_jobs or {}).items()),
+            key=lambda x: len(x[0]), reverse=True)
+        # max. nr of items in flight when used with imap_ordered, needs to be big enough
+        # so that a slow device doesn't stall the other ones
+        self.max_pending = max_pending
+        # dirpath -> st_dev; all files in a directory live on the same device
+        self._dev_cache: Dict[str, Optional[int]] = {}
+        self._executors: Dict[Union[str, int, None], ThreadPoolExecutor] = {}
+
+    def device_key(self, file_path: str) -> Tuple[Union[str, int, None], int]:
+        """Returns the key of the device group `file_path` belongs to and its number of jobs"""
+        for declared, jobs in self.device_jobs:
+            if file_path.startswith(declared):
+                return declared, jobs
+
+        dirname = os.path.dirname(file_path)
+        try:
+            dev = self._dev_cache[dirname]
+        except KeyError:
+            try:
+                dev = os.stat(dirname).st_dev
+            except OSError:
+                # errors are reported when trying to hash the file
+                dev = None
+            self._dev_cache[dirname] = dev
+
+        return dev, self.default_jobs
+
+    def submit(self, file_path: str, func: Callable[..., R], *args) -> 'Future[R]':
+        key, jobs = self.device_key(file_path)
+        try:
+            executor = self._executors[key]
+        except KeyError:
+            executor = ThreadPoolExecutor(max_workers=max(1, jobs))
+            self._executors[key] = executor
+
+        return executor.submit(func, *args)
+
+    def shutdown(self) -> None:
+        """Waits for all submitted work; the scheduler can still be re-used afterwards"""
+        for executor in self._executors.values():
+            executor.shutdown()
+        self._executors.clear()
+        self._dev_cache.clear()
+
+
+class _PipelineFailed:
+    """Passed down the queues of a Pipeline when a stage raised an exception"""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class PipelineStage:
+    """A stage of a Pipeline and its output queue"""
+
+    def __init__(self, name: str, func: Callable[[Iterator], Iterator], maxsize: int):
+        self.name = name
+        self.func = func
+        # output of the stage
+        self.queue: 'queue.Queue' = queue.Queue(maxsize=maxsize)
+        self.processed = 0
+        self.thread: Optional[threading.Thread] = None
+
+
+class Pipeline:
+    """
+    Producer/consumer pipeline where every stage runs on its own thread and passes
+    its items to the next stage using a bounded queue, so the stages overlap
+    (e.g. walking the next directories while files are being hashed), while a full
+    queue blocks the previous stage (backpressure)
+
+    A stage is a function that takes an iterator of the items of the previous stage
+    and yields its own items; iterating over the pipeline yields the items of the last
+    stage on the calling thread
+    """
+
+    _END = object()
+
+    def __init__(self, source: Iterable, maxsize: int = 256):
+        self.source = source
+        self.maxsize = maxsize
+        self.stages: List[PipelineStage] = []
+        self._stop = threading.Event()
+        self._started_at = 0.0
+
+    def add_stage(self, name: str, func: Callable[[Iterator], Iterator]) -> 'Pipeline':
+        self.stages.append(PipelineStage(name, func, self.maxsize))
+        return self
+
+    def _put(self, q: 'queue.Queue', item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _drain(self, q: 'queue.Queue') -> Iterator:
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is Pipeline._END:
+                return
+            if isinstance(item, _PipelineFailed):
+                raise item.exc
+            yield item
+
+    def _run_stage(self, idx: int) -> None:
+        stage = self.stages[idx]
+        try:
+            items = iter(self.source) if idx == 0 else self._drain(self.stages[idx - 1].queue)
+            for item in stage.func(items):
+                stage.processed += 1
+                if not self._put(stage.queue, item):
+                    return
+            self._put(stage.queue, Pipeline._END)
+        except BaseException as e:
+            self._put(stage.queue, _PipelineFailed(e))
+
+    def __iter__(self) -> Iterator:
+        if not self.stages:
+            yield from self.source
+            return
+
+        self._stop.clear()
+        self._started_at = time.time()
+        for idx, stage in enumerate(self.stages):
+            stage.processed = 0
+            stage.thread = threading.Thread(target=self._run_stage, args=(idx,),
+                                            name=f"pipeline-{stage.name}", daemon=True)
+            stage.thread.start()
+        try:
+            yield from self._drain(self.stages[-1].queue)
+        finally:
+            # also stops the stages when the consumer stopped early
+            self._stop.set()
+            for stage in self.stages:
+                cast(threading.Thread, stage.thread).join()
+
+    def status(self) -> str:
+        """Number of processed items, throughput and queue depth of every stage"""
+        elapsed = max(time.time() - self._started_at, 1e-9)
+        return " | ".join(
+            f"{stage.name}: {stage.processed} ({stage.processed / elapsed:.1f}/s, "
+            f"queued {stage.queue.qsize()})" for stage in self.stages)
+
+
+class AsyncRun(Generic[T, R]):
+    """
+    Runs the blocking `func(emit, cancel)` on a worker thread of `executor` (default:
+    the default executor of the running loop) and streams the items it passes to
+    `emit` as an async iterator; `result` is the return value of `func` once the
+    iteration is done. Awaiting the AsyncRun drops the items and returns the result
+    At most `maxsize` items are buffered, `emit` blocks while the consumer is behind
+
+    Cancelling the consuming task or closing the iterator sets `cancel` and waits for
+    `func` to return, which has to stop at the next item (so e.g. hash files are never
+    left partially written)
+    If the consumer stops iterating without closing it (e.g. breaks out of the
+    `async for`), `cancel` is set once the AsyncRun is garbage collected or the loop
+    is closed, so the worker thread doesn't block in `emit` forever
+    """
+
+    _END = object()
+
+    def __init__(self, func: Callable[[Callable[[T], None], threading.Event], R],
+                 executor: Optional[Executor] = None, maxsize: int = 256):
+        self.func = func
+        self.executor = executor
+        self.maxsize = maxsize
+        self.cancel = threading.Event()
+        self.result: Optional[R] = None
+        self._gen: Optional[AsyncGenerator[T, None]] = None
+
+    def __aiter__(self) -> 'AsyncRun[T, R]':
+        return self
+
+    async def __anext__(self) -> T:
+        if self._gen is None:
+            self._gen = self._run()
+        return await self._gen.__anext__()
+
+    async def aclose(self) -> None:
+        if self._gen is not None:
+            await self._gen.aclose()
+
+    def __await__(self) -> Generator[Any, None, Optional[R]]:
+        return self._drain().__await__()
+
+    def __del__(self) -> None:
+        # nobody can consume the items anymore
+        self.cancel.set()
+
+    async def _drain(self) -> Optional[R]:
+        async for _ in self:
+            pass
+        return self.result
+
+    async def _run(self) -> AsyncGenerator[T, None]:
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        slots = threading.Semaphore(self.maxsize)
+        cancel = self.cancel
+
+        def emit(item: T) -> None:
+            while not slots.acquire(timeout=0.1):
+                if cancel.is_set() or loop.is_closed():
+                    # nobody is going to consume the item anymore
+                    cancel.set()
+                    return
+            try:
+                loop.call_soon_threadsafe(items.put_nowait, item)
+            except RuntimeError:
+                # loop was closed in the meantime
+                cancel.set()
+
+        fut = loop.run_in_executor(self.executor, self.func, emit, cancel)
+        # the items emitted by func are queued before the future is done
+        fut.add_done_callback(lambda _: items.put_nowait(AsyncRun._END))
+        try:
+            while True:
+                item = await items.get()
+                if item is AsyncRun._END:
+                    break
+                slots.release()
+                yield item
+            self.result = await fut
+        finally:
+            if not fut.done():
+                cancel.set()
+                # the thread can't be interrupted, so wait until func stopped, even
+                # if we're cancelled again in the meantime (passed on afterwards)
+                cancelled = False
+                while not fut.done():
+                    try:
+                        await asyncio.shield(fut)
+                    except asyncio.CancelledError:
+                        cancelled = True
+                    except Exception:
+                        logger.exception("Error while cancelling")
+                if cancelled:
+                    raise asyncio.CancelledError()
 
 
 # for varags *args only the type of the first item needs to be specified
@@ -248,34 +1153,246 @@ HASH_FILE_EXTENSIONS.add('cshd')
 DIR_START_STR_EXCLUDE = (".git",)
 
 
+# result of _list_dir
+_Listing = Optional[Tuple[List[os.DirEntry], List[os.DirEntry]]]
+
+
+def _list_dir(dirpath: str) -> _Listing:
+    """
+    Lists `dirpath` and splits the entries into (dirs, files)
+    Returns None if the directory can't be listed
+    """
+    try:
+        with os.scandir(dirpath) as it:
+            entries = list(it)
+    except OSError:
+        return None
+
+    dirs: List[os.DirEntry] = []
+    files: List[os.DirEntry] = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        (dirs if is_dir else files).append(entry)
+    return dirs, files
+
+
+def _subdir_paths(dirs: List[os.DirEntry]) -> List[str]:
+    """Paths of the directories in `dirs` that a walk descends into (no symlinks)"""
+    paths = []
+    for entry in dirs:
+        try:
+            if entry.is_symlink():
+                continue
+        except OSError:
+            pass
+        paths.append(entry.path)
+    return paths
+
+
+def scandir_walk(top: str) -> Iterator[Tuple[str, List[os.DirEntry], List[os.DirEntry]]]:
+    """
+    Same as os.walk (top-down, errors are ignored, symlinks to dirs are listed but
+    not followed) but yields the os.DirEntry objects of the directories and files,
+    so their stat data can be used instead of calling os.stat again
+    (on Windows it's already included in the directory listing, otherwise it's cached
+    on the entry after the first call)
+    Remove entries from the directory list to not descend into them
+    """
+    stack = [top]
+    while stack:
+        dirpath = stack.pop()
+        listing = _list_dir(dirpath)
+        if listing is None:
+            continue
+        dirs, files = listing
+
+        yield dirpath, dirs, files
+
+        # reversed so the dirs are visited in the same order as with os.walk
+        stack.extend(reversed(_subdir_paths(dirs)))
+
+
+def parallel_scandir_walk(
+        top: str, jobs: int = 1, ordered: bool = True,
+        max_pending: Optional[int] = None) -> Iterator[Tuple[str, List[os.DirEntry], List[os.DirEntry]]]:
+    """
+    Same as scandir_walk but lists up to `max_pending` (default: 4 * jobs) directories
+    ahead of the consumer using `jobs` worker threads, which hides the latency of
+    listing directories on network shares
+    Pruning works the same way: remove entries from the directory list to not
+    descend into them (only the dirs that are left are listed after the yield returns)
+
+    ordered: yield the directories in the same order as scandir_walk, otherwise they
+             are yielded as soon as they were listed (dirs are still yielded before
+             their subdirs)
+    """
+    if jobs <= 1:
+        yield from scandir_walk(top)
+        return
+
+    if max_pending is None:
+        max_pending = 4 * jobs
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        if ordered:
+            yield from _parallel_walk_ordered(executor, top, max_pending)
+        else:
+            yield from _parallel_walk_unordered(executor, top, max_pending)
+    finally:
+        # don't wait for listings that were prefetched when the consumer stops early
+        # (e.g. root_only), the walkers cancel the ones that didn't start yet
+        # (shutdown's cancel_futures needs python 3.9)
+        executor.shutdown(wait=False)
+
+
+def _parallel_walk_ordered(
+        executor: ThreadPoolExecutor, top: str,
+        max_pending: int) -> Iterator[Tuple[str, List[os.DirEntry], List[os.DirEntry]]]:
+    # same stack as scandir_walk, but the next `max_pending` dirs that will be
+    # popped from it are already being listed
+    stack: List[Tuple[str, Optional['Future[_Listing]']]] = [(top, None)]
+    in_flight = 0
+    try:
+        while stack:
+            idx = len(stack) - 1
+            while idx >= 0 and in_flight < max_pending:
+                path, fut = stack[idx]
+                if fut is None:
+                    stack[idx] = (path, executor.submit(_list_dir, path))
+                    in_flight += 1
+                idx -= 1
+
+            dirpath, fut = stack.pop()
+            if fut is None:
+                # all workers are busy with dirs further down the stack
+                listing = _list_dir(dirpath)
+            else:
+                in_flight -= 1
+                listing = fut.result()
+            if listing is None:
+                continue
+            dirs, files = listing
+
+            yield dirpath, dirs, files
+
+            stack.extend((path, None) for path in reversed(_subdir_paths(dirs)))
+    finally:
+        for _, fut in stack:
+            if fut is not None:
+                fut.cancel()
+
+
+def _parallel_walk_unordered(
+        executor: ThreadPoolExecutor, top: str,
+        max_pending: int) -> Iterator[Tuple[str, List[os.DirEntry], List[os.DirEntry]]]:
+    todo = [top]
+    running: Dict['Future[_Listing]', str] = {}
+    try:
+        while todo or running:
+            while todo and len(running) < max_pending:
+                path = todo.pop()
+                running[executor.submit(_list_dir, path)] = path
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                dirpath = running.pop(fut)
+                listing = fut.result()
+                if listing is None:
+                    continue
+                dirs, files = listing
+
+                yield dirpath, dirs, files
+
+                todo.extend(reversed(_subdir_paths(dirs)))
+    finally:
+        for fut in running:
+            fut.cancel()
+
+
+class TreeListing:
+    """
+    Listings of all directories of a tree gathered by a single walk, so discovering
+    hash files, checking for missing files and hashing can re-use them instead of
+    listing every directory again
+    NOTE: changes to the tree after the walk are not reflected in the listings
+    """
+
+    def __init__(self, root: str,
+                 walker: Optional[Iterable[Tuple[str, List[os.DirEntry], List[os.DirEntry]]]] = None):
+        self.root = root
+        self._prefix = root if root.endswith(os.sep) else root + os.sep
+        # dirpath -> (dirs, files), dirs that couldn't be listed are missing
+        self.listings: Dict[str, Tuple[List[os.DirEntry], List[os.DirEntry]]] = {}
+        self.file_count = 0
+        for dirpath, dirs, files in (walker if walker is not None else scandir_walk(root)):
+            self.listings[dirpath] = (dirs, files)
+            self.file_count += len(files)
+
+    def covers(self, path: str) -> bool:
+        return path == self.root or path.startswith(self._prefix)
+
+    def is_empty(self, dirpath: str) -> Optional[bool]:
+        """None if `dirpath` wasn't listed"""
+        listing = self.listings.get(dirpath)
+        if listing is None:
+            return None
+        return not (listing[0] or listing[1])
+
+    def walk(self, top: str) -> Iterator[Tuple[str, List[os.DirEntry], List[os.DirEntry]]]:
+        """Same as scandir_walk(top) but using the stored listings"""
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            listing = self.listings.get(dirpath)
+            if listing is None:
+                continue
+            # copies so pruning doesn't modify the stored listing
+            dirs, files = list(listing[0]), list(listing[1])
+
+            yield dirpath, dirs, files
+
+            stack.extend(reversed(_subdir_paths(dirs)))
+
+
 def discover_hash_files(start_path: str, depth: int = 2,
-                        exclude_pattern: Optional[Sequence[str]] = None) -> List[str]:
+                        exclude_pattern: Optional[Sequence[str]] = None,
+                        walk_jobs: int = 1, walk_ordered: bool = True,
+                        listing: Optional[TreeListing] = None) -> List[str]:
+    """
+    listing: walk the stored listings instead of the directories (if it covers start_path)
+    """
     if exclude_pattern is None:
         exclude_pattern = ()
 
-    # os.walk invokes os.path.join to build the 'top' directory name on each iteration; the count
+    # the walk invokes os.path.join to build the 'top' directory name on each iteration; the count
     # of path separators (that is, os.sep) in each directory name is related to its depth. Just
     # substract the starting count to obtain a relative depth.
     # Note that mixing \ and / in the initial directory (both are allowed on Windows) doesn't
     # affect the result, neither using absolute or relative directory names.
     starting_level = start_path.count(os.sep)
     hashfiles = []
-    for dirpath, dirnames, fnames in os.walk(start_path):
+    exclude = pattern_set(exclude_pattern) if exclude_pattern else None
+    walker = (listing.walk(start_path) if listing is not None and listing.covers(start_path)
+              else parallel_scandir_walk(start_path, walk_jobs, ordered=walk_ordered))
+    for dirpath, dirs, files in walker:
         current_depth = dirpath.count(os.sep) - starting_level
         if current_depth == depth:
-            # dirnames[:] = [] changes list in-place whereas dirnames=[] just reassigsn/rebinds
-            # the variable to a new list while the original list (which os.walk is using remains
+            # dirs[:] = [] changes list in-place whereas dirs=[] just reassigsn/rebinds
+            # the variable to a new list while the original list (which the walk is using remains
             # unchanged; also possible to use del but this would break code below
-            dirnames[:] = []
+            dirs[:] = []
 
-        if dirnames:
-            # When topdown is true, the caller can modify the dirnames list in-place (e.g., via del
-            # or slice assignment), and walk will only recurse into the subdirectories whose names
-            # remain in dirnames; this can be used to prune the search...
-            dirnames[:] = [d for d in dirnames if not any(d.startswith(s)
-                           for s in DIR_START_STR_EXCLUDE)]
+        if dirs:
+            # the caller can modify the dirs list in-place (e.g., via del
+            # or slice assignment), and walk will only recurse into the subdirectories that
+            # remain in dirs; this can be used to prune the search...
+            dirs[:] = [d for d in dirs if not any(d.name.startswith(s)
+                       for s in DIR_START_STR_EXCLUDE)]
 
-        for fname in fnames:
+        for fname in (f.name for f in files):
             try:
                 _, ext = fname.rsplit(".", 1)
                 # replace works here for computing the relpath since all paths share
@@ -287,16 +1404,15 @@ def discover_hash_files(start_path: str, depth: int = 2,
                 continue
             # no exclude patterns -> append files with supported hash file extensions
             # exclude patterns -> supported extension and not matching any of the exclude patterns
-            if ((not exclude_pattern and (ext in HASH_FILE_EXTENSIONS)) or
-                    (ext in HASH_FILE_EXTENSIONS and not any(
-                        wildcard_match(pat, rel_fp) for pat in exclude_pattern))):
+            if ((not exclude and (ext in HASH_FILE_EXTENSIONS)) or
+                    (ext in HASH_FILE_EXTENSIONS and not cast(PatternSet, exclude).matches(rel_fp))):
                 hashfiles.append(os.path.join(dirpath, fname))
 
     return hashfiles
 
 
-def descend_into(path: str, whitelist: Optional[List[str]] = None,
-                 blacklist: Optional[List[str]] = None) -> bool:
+def descend_into(path: str, whitelist: Optional[Union[List[str], PatternSet]] = None,
+                 blacklist: Optional[Union[List[str], PatternSet]] = None) -> bool:
     """
     Tests whether to descend into a directory based on its path
     expects that only one of white/blacklist is not None"""
@@ -305,11 +1421,11 @@ def descend_into(path: str, whitelist: Optional[List[str]] = None,
     # (partial blacklist pattern matches still mean we have to descend into
     #  the matched dirpath e.g.: pattern: 'foo/bar/*.txt' dirpath: 'foo/bar/')
     #  only an exact match excludes the dir -> pattern: 'foo/bar/*' dirpath: 'foo/bar/')
-    if whitelist and not any(wildcard_match(pat, path, partial_match=True) for pat in whitelist):
+    if whitelist and not pattern_set(whitelist).partial_matches(path):
         # if we have a whitelist only descend into dirs that match or partially match
         # one of the whitelist patterns
         descend = False
-    elif blacklist and any(wildcard_match(pat, path) for pat in blacklist):
+    elif blacklist and pattern_set(blacklist).matches(path):
         # if we have a blacklist only descend into dirs that dont match one of the
         # blacklisted patterns exactly
         descend = False
@@ -317,15 +1433,15 @@ def descend_into(path: str, whitelist: Optional[List[str]] = None,
     return descend
 
 
-def include_path(path: str, whitelist: Optional[List[str]] = None,
-                 blacklist: Optional[List[str]] = None) -> bool:
+def include_path(path: str, whitelist: Optional[Union[List[str], PatternSet]] = None,
+                 blacklist: Optional[Union[List[str], PatternSet]] = None) -> bool:
     """expects that only one of white/blacklist is not None"""
     include = True
-    if whitelist and not any(wildcard_match(pat, path) for pat in whitelist):
+    if whitelist and not pattern_set(whitelist).matches(path):
         # if we have a whitelist only include files that match one of the whitelist
         # patterns
         include = False
-    elif blacklist and any(wildcard_match(pat, path) for pat in blacklist):
+    elif blacklist and pattern_set(blacklist).matches(path):
         # if we have a blacklist only include files that dont match one of the
         # blacklisted patterns
         include = False
@@ -368,10 +1484,238 @@ def move_info(source_path: str, mv_path: str,
     return source_path, src_is_dir, dest_path, dest_exists, dest_is_dir, real_dest
 
 
+class StatCache:
+    """
+    Persistent on-disk cache (SQLite) of file digests, that stores the stat data
+    (st_dev, st_ino, size, mtime_ns) of a file at the time it was hashed
+    A cached digest is only returned if the current stat data of the file still matches
+    so unchanged files don't have to be re-read on subsequent runs
+    NOTE: like --skip-unchanged this trusts the file metadata, so corruption that
+          doesn't change the stat data won't be detected
+    """
+
+    COMMIT_AFTER_N_STORES: Final[int] = 1000
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        # accessed from the hashing worker threads, all access is guarded by self._lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stat_cache ("
+                " path TEXT NOT NULL,"
+                " algo TEXT NOT NULL,"
+                " st_dev INTEGER NOT NULL,"
+                " st_ino INTEGER NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " digest BLOB NOT NULL,"
+                " PRIMARY KEY (path, algo))")
+            self._conn.commit()
+
+    def __enter__(self) -> 'StatCache':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def lookup(self, file_path: str, stat: os.stat_result, algo: str) -> Optional[bytes]:
+        """Returns the cached digest if the file's stat data still matches the cached one"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT st_dev, st_ino, size, mtime_ns, digest FROM stat_cache "
+                "WHERE path = ? AND algo = ?", (file_path, algo)).fetchone()
+        if row is None:
+            return None
+        if tuple(row[:4]) != (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns):
+            return None
+        return row[4]
+
+    def store(self, file_path: str, stat: os.stat_result, algo: str, digest: bytes) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stat_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_path, algo, stat.st_dev, stat.st_ino, stat.st_size,
+                 stat.st_mtime_ns, digest))
+            self._uncommitted += 1
+            if self._uncommitted >= self.COMMIT_AFTER_N_STORES:
+                self._conn.commit()
+                self._uncommitted = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+class VerifyBudget:
+    """
+    Limits how much a single verify run does: no further entries are started once
+    `max_bytes` (based on the file sizes) were handed out or `max_seconds` passed
+    At least one entry is always verified so runs with a small budget still progress
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, max_seconds: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.deadline: Optional[float] = None
+        self.bytes_used = 0
+        # nr of entries handed out so far
+        self.nr_entries = 0
+        # whether entries were left unverified since the budget was used up
+        self.stopped = False
+
+    def start(self) -> None:
+        if self.deadline is None and self.max_seconds is not None:
+            self.deadline = time.monotonic() + self.max_seconds
+
+    def exhausted(self) -> bool:
+        if self.nr_entries == 0:
+            return False
+        if self.max_bytes is not None and self.bytes_used >= self.max_bytes:
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return False
+
+    def consume(self, nbytes: int) -> None:
+        self.bytes_used += nbytes
+        self.nr_entries += 1
+
+
+class VerifyJournal:
+    """
+    Append-only file that records the outcome of every verified file as soon as it's
+    known, so an interrupted (or budgeted) verify can be resumed without verifying
+    those files again
+    Format: one line per file: `OK|MISSING|FAILED,failure type,absolute path`
+    """
+
+    OK: Final[str] = "OK"
+    MISSING: Final[str] = "MISSING"
+    FAILED: Final[str] = "FAILED"
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = os.path.abspath(path)
+        # abs normed path -> (kind, failure type)
+        self.outcomes: Dict[str, Tuple[str, str]] = {}
+        if resume:
+            self._read()
+        # line buffered so every outcome is flushed right away
+        self._file = open(self.path, "a" if resume else "w", encoding="UTF-8", buffering=1)
+
+    def __enter__(self) -> 'VerifyJournal':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _read(self) -> None:
+        try:
+            with open(self.path, "r", encoding="UTF-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            logger.warning("Journal '%s' doesn't exist, verifying all files!", self.path)
+            return
+
+        for ln in lines:
+            try:
+                kind, failure_type, fpath = ln.split(",", 2)
+            except ValueError:
+                # last line might be incomplete if we were killed while writing it
+                continue
+            if kind in (self.OK, self.MISSING, self.FAILED):
+                self.outcomes[fpath] = (kind, failure_type)
+        logger.info("Resuming from journal '%s': %d files were already verified",
+                    self.path, len(self.outcomes))
+
+    def record(self, fpath: str, kind: str, failure_type: str = "") -> None:
+        self.outcomes[fpath] = (kind, failure_type)
+        self._file.write(f"{kind},{failure_type},{fpath}\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+@dataclass
+class VerifyResult:
+    """Outcome of verifying a single entry, see ChecksumHelperData.iter_verify"""
+    # absolute path
+    path: str
+    # relative to the root dir of the hash file
+    rel_path: str
+    # VerifyJournal.OK, FAILED or MISSING
+    status: str
+    # e.g. 'CORRUPTED (same modification time)', might be empty for FAILED entries
+    failure_type: str
+    hash_type: str
+    # 0 if the file wasn't hashed (missing, size mismatch or quick verify)
+    bytes_read: int
+    # in seconds, files that were hashed in a batch get an equal share of its time
+    duration: float
+    # outcome was taken from the journal instead of verifying the file again
+    resumed: bool = False
+
+
+SCRUB_STATE_FILENAME = ".checksum_helper_scrub_state"
+
+
+class ScrubState:
+    """
+    Sidecar file that records when every file was last verified by a scrub, so
+    successive scrub runs verify the least recently verified files first and
+    eventually cover all of them
+    Format: one line per file: `unix time,path relative to the state file's directory`
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.normpath(os.path.abspath(path))
+        self.root_dir = os.path.dirname(self.path)
+        # abs normed path -> unix time of the last verification
+        self.last_verified: Dict[str, float] = {}
+
+    def read(self) -> None:
+        try:
+            with open(self.path, "r", encoding="UTF-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+
+        for i, ln in enumerate(lines):
+            if not ln.strip():
+                continue
+            try:
+                verified_at, rel_path = ln.split(",", 1)
+                self.last_verified[os.path.normpath(os.path.join(self.root_dir, rel_path))] = float(
+                    verified_at)
+            except ValueError:
+                logger.warning("Invalid line %d in scrub state file '%s': '%s'",
+                               i + 1, self.path, ln)
+
+    def write(self) -> None:
+        lines = []
+        for fpath, verified_at in self.last_verified.items():
+            rel_path = os.path.relpath(fpath, start=self.root_dir)
+            if os.sep == '\\':
+                rel_path = rel_path.replace(os.sep, '/')
+            lines.append(f"{int(verified_at)},{rel_path}\n")
+        # write to a temporary file first so an interrupted write doesn't lose the state
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="UTF-8", newline='') as w:
+            w.writelines(lines)
+        os.replace(tmp_path, self.path)
+
+
 CHOptions = TypedDict('CHOptions', {'include_unchanged_files_incremental': bool,
                                     'discover_hash_files_depth': int,
                                     'incremental_skip_unchanged': bool,
-                                    'incremental_collect_fstat': bool})
+                                    'incremental_collect_fstat': bool,
+                                    'compact_entries': bool,
+                                    'walk_jobs': int,
+                                    'walk_ordered': bool,
+                                    'single_walk': bool})
 
 
 class ChecksumHelper:
@@ -397,6 +1741,12 @@ class ChecksumHelper:
             self.log_path = None
         self.skipped_unchanged_files: int = 0
         self.total_files_processed: int = 0
+        # guards the counters above since _build_verfiy_hash might run on worker threads
+        self._counter_lock = threading.Lock()
+        # when set digests of files whose stat data didn't change are taken from the cache
+        self.stat_cache: Optional[StatCache] = None
+        # when set all walks of the tree use these listings instead of listing the dirs
+        self.tree_listing: Optional[TreeListing] = None
 
         # susbtrings that cant be in filename of hash file
         if hash_filename_filter is None:
@@ -422,22 +1772,41 @@ class ChecksumHelper:
             "discover_hash_files_depth": -1,
             "incremental_skip_unchanged": False,
             "incremental_collect_fstat": True,
+            # use CompactEntries for big hash files that are read and for most_current
+            "compact_entries": False,
+            # number of threads listing directories when walking the tree
+            "walk_jobs": 1,
+            # walk the tree in the same order as os.walk when using multiple walk_jobs
+            "walk_ordered": True,
+            # walk the tree only once when generating checksums and re-use the listings
+            # for discovering hash files, checking for missing files and hashing
+            # (keeps the listings of the whole tree in memory, so it's opt-in)
+            "single_walk": False,
         }
 
     def discover_hash_files(self) -> None:
         hash_files = discover_hash_files(self.root_dir,
                                          depth=self.options["discover_hash_files_depth"],
-                                         exclude_pattern=self.hash_filename_filter)
+                                         exclude_pattern=self.hash_filename_filter,
+                                         walk_jobs=self.options["walk_jobs"],
+                                         walk_ordered=self.options["walk_ordered"],
+                                         listing=self.tree_listing)
         self.all_hash_files = [ChecksumHelperData(
-            self, hfile_path) for hfile_path in hash_files]
+            self, hfile_path, compact_entries=self.options["compact_entries"])
+            for hfile_path in hash_files]
         self.discovered_hash_files = True
         logger.info("Done discovering hash files")
 
     def most_current_from_file(self, filename: str) -> None:
-        self.hash_file_most_current = ChecksumHelperData(self, filename)
+        self.hash_file_most_current = ChecksumHelperData(
+            self, filename, compact_entries=self.options["compact_entries"])
         self.hash_file_most_current.read()
 
-    def build_most_current(self) -> None:
+    def build_most_current(self, cancel: Optional[threading.Event] = None) -> None:
+        """
+        cancel: once it's set no further hash files are read and
+                hash_file_most_current isn't set
+        """
         if not self.discovered_hash_files:
             self.discover_hash_files()
 
@@ -465,7 +1834,8 @@ class ChecksumHelper:
                 f"{time.strftime('%Y-%m-%d')}.cshd")
 
         logger.info("Start building most_current")
-        most_current = ChecksumHelperData(self, filename)
+        most_current = ChecksumHelperData(
+            self, filename, compact_entries=self.options["compact_entries"])
         # update dict with dicts from hash files -> sorted
         # dicts with biggest mtime last(newest) -> most current
         # @Bug TODO: Windows only -> if two hash files have an entry for the same file
@@ -473,6 +1843,9 @@ class ChecksumHelper:
         # => different entries in the CSHD, but same file being accessed on a Windows
         # system
         for cshd in self.all_hash_files:
+            if cancel is not None and cancel.is_set():
+                logger.info("Cancelled building most current")
+                return
             if not cshd.was_read:
                 cshd.read()
             for file_path, hashed_file in cshd.entries.items():
@@ -485,7 +1858,7 @@ class ChecksumHelper:
                     combined_path,
                     HashedFile(
                         combined_path, hashed_file.mtime, hashed_file.hash_type,
-                        hashed_file.hash_bytes, hashed_file.text_mode)
+                        hashed_file.hash_bytes, hashed_file.text_mode, hashed_file.size)
                 )
             # NOTE: free memory in case the file was very large
             cshd.clear()
@@ -494,6 +1867,36 @@ class ChecksumHelper:
         logger.info("Done building most current")
         self.hash_file_most_current = most_current
 
+    def async_build_most_current(self, executor: Optional[Executor] = None) -> 'AsyncRun[None, None]':
+        """
+        Same as build_most_current but runs on a worker thread of `executor`,
+        await the returned AsyncRun
+        """
+        def run(emit: Callable[[None], None], cancel: threading.Event) -> None:
+            self.build_most_current(cancel=cancel)
+        return AsyncRun(run, executor)
+
+    def walk(self, start_path: str) -> Iterator[Tuple[str, List[os.DirEntry], List[os.DirEntry]]]:
+        """
+        scandir_walk using the walk_jobs and walk_ordered options or
+        the stored tree_listing if there is one
+        """
+        if self.tree_listing is not None and self.tree_listing.covers(start_path):
+            return self.tree_listing.walk(start_path)
+        return parallel_scandir_walk(start_path, self.options["walk_jobs"],
+                                     ordered=self.options["walk_ordered"])
+
+    def scan_tree(self) -> TreeListing:
+        """
+        Walks the whole tree once and stores the listings as tree_listing, so all
+        following walks re-use them until tree_listing is reset to None
+        """
+        self.tree_listing = None
+        self.tree_listing = TreeListing(self.root_dir, self.walk(self.root_dir))
+        logger.info("Done walking the tree: %d directories, %d files",
+                    len(self.tree_listing.listings), self.tree_listing.file_count)
+        return self.tree_listing
+
     def filtered_walk(self, start_path: str, root_only: bool = False,
                       whitelist: Optional[List[str]] = None,
                       blacklist: Optional[List[str]] = None,
@@ -502,6 +1905,22 @@ class ChecksumHelper:
         if file_list is not None -> will iter file_list instead
         NOTE: assumes file_list paths are __absolute__   
         """
+        for file_path, _ in self.filtered_walk_entries(
+                start_path, root_only, whitelist=whitelist, blacklist=blacklist,
+                file_list=file_list):
+            yield file_path
+
+    def filtered_walk_entries(
+            self, start_path: str, root_only: bool = False,
+            whitelist: Optional[List[str]] = None,
+            blacklist: Optional[List[str]] = None,
+            file_list: Optional[List[str]] = None,
+            file_entries: Optional[Dict[str, os.DirEntry]] = None) -> Iterator[Tuple[str, Optional[os.DirEntry]]]:
+        """
+        Same as filtered_walk but also yields the os.DirEntry of the file, so its stat
+        data can be re-used (entry is None for paths from file_list that are not
+        in file_entries)
+        """
         # NOTE: either start_path equals self.root_dir (no path separator as ending character)
         # or its a subpath or the path with a path separator at the end (starts with root_dir + sep)
         if start_path != self.root_dir and not start_path.startswith(self.root_dir + os.sep):
@@ -515,32 +1934,36 @@ class ChecksumHelper:
                 "Can only use either a whitelist or blacklist - not both!")
             return None
 
+        # compile the patterns once instead of for every path
+        whitelist_set = pattern_set(whitelist) if whitelist else None
+        blacklist_set = pattern_set(blacklist) if blacklist else None
+
         relative_start_idx = len(self.root_dir) + \
             (1 if not self.root_dir.endswith(os.sep) else 0)
         # TODO add test for different paths
         if file_list is None:
-            for dirpath, dirnames, fnames in os.walk(start_path):
-                # filter dirnames before traversing into them
-                dirnames[:] = [d for d in dirnames
-                               if descend_into(os.path.join(dirpath[relative_start_idx:], d),
-                                               whitelist=whitelist, blacklist=blacklist)]
+            for dirpath, dirs, files in self.walk(start_path):
+                # filter dirs before traversing into them
+                dirs[:] = [d for d in dirs
+                           if descend_into(os.path.join(dirpath[relative_start_idx:], d.name),
+                                           whitelist=whitelist_set, blacklist=blacklist_set)]
 
-                for fname in fnames:
-                    file_path = os.path.join(dirpath, fname)
+                for entry in files:
+                    file_path = entry.path
 
-                    if self._include_path_helper(file_path, whitelist, blacklist):
-                        yield file_path
+                    if self._include_path_helper(file_path, whitelist_set, blacklist_set):
+                        yield file_path, entry
 
                 if root_only:
                     break
         else:
             for file_path in file_list:
-                if self._include_path_helper(file_path, whitelist, blacklist):
-                    yield file_path
+                if self._include_path_helper(file_path, whitelist_set, blacklist_set):
+                    yield file_path, file_entries.get(file_path) if file_entries else None
 
     def _include_path_helper(self, file_path: str,
-                             whitelist: Optional[List[str]] = None,
-                             blacklist: Optional[List[str]] = None) -> bool:
+                             whitelist: Optional[Union[List[str], PatternSet]] = None,
+                             blacklist: Optional[Union[List[str], PatternSet]] = None) -> bool:
         # replace works here for computing the relpath since all paths share
         # self.root_dir (it's part of dirpath)
         # rel_fpath = file_path[len(start_path) + 1:]
@@ -557,6 +1980,11 @@ class ChecksumHelper:
                     file_path.startswith(log_path_rolling_base) and
                     file_path[len(log_path_rolling_base):].isdigit()):
                 return False
+        # exclude the scrub state (by default it's stored in the root dir and
+        # changes on every scrub)
+        if file_path.endswith(SCRUB_STATE_FILENAME) and (
+                os.path.basename(file_path) == SCRUB_STATE_FILENAME):
+            return False
         # match white/blacklist against relative path starting from root dir
         # so it behaves correctly for different start_paths and it's
         # not confusing for the user
@@ -570,7 +1998,11 @@ class ChecksumHelper:
             root_only: bool = False, whitelist: Optional[List[str]] = None,
             blacklist: Optional[List[str]] = None,
             only_missing: bool = False,
-            incremental_writes: bool = False) -> Optional['ChecksumHelperData']:
+            incremental_writes: bool = False,
+            jobs: int = 1,
+            scheduler: Optional[DeviceScheduler] = None,
+            on_entry: Optional[Callable[[str, 'HashedFile'], None]] = None,
+            cancel: Optional[threading.Event] = None) -> Optional['ChecksumHelperData']:
         """
         Creates checksums for all changed files (that dont match checksums in
         hash_file_most_current)
@@ -580,6 +2012,12 @@ class ChecksumHelper:
         only_missing: only include hashes for files that don't have one yet
         incremental_writes: flush the state of the incremental hash file to
                             disk periodically
+        jobs: number of worker threads used for hashing; entries are still
+              added in the order the files were discovered in
+        scheduler: distribute the hashing by device instead (overrides jobs)
+        on_entry: called with every entry that's added to the incremental hash file
+        cancel: once it's set no further files are hashed, the entries up to that
+                point are returned (and flushed when using incremental_writes)
         """
         # NOTE: white/blacklist are mutually exclusive which is checked in filtered_walk
         # but we do the duplicate check here as well so we can avoid the cost of
@@ -589,9 +2027,6 @@ class ChecksumHelper:
                 "Can only use either a whitelist or blacklist - not both!")
             return None
 
-        if not self.hash_file_most_current:
-            self.build_most_current()
-
         if start_path is None:
             start_path = self.root_dir
 
@@ -609,94 +2044,281 @@ class ChecksumHelper:
         else:
             incremental = ChecksumHelperData(self, filename)
 
-        skip_unchanged = self.options['incremental_skip_unchanged']
-        collect_fstat = self.options['incremental_collect_fstat']
-        last_report = time.time()
-
-        file_list: Optional[List[str]] = None
-        if only_missing:
-            file_list = self.check_missing_files()
-
-        for file_path in self.filtered_walk(
+        # discovering the hash files and checking for missing files/hashing would
+        # each walk the tree -> walk it only once and re-use the listings
+        single_walk = (self.options["single_walk"] and not self.hash_file_most_current
+                       and self.tree_listing is None and (only_missing or not root_only))
+        if single_walk:
+            self.scan_tree()
+        try:
+            if not self.hash_file_most_current:
+                self.build_most_current()
+
+            skip_unchanged = self.options['incremental_skip_unchanged']
+            collect_fstat = self.options['incremental_collect_fstat']
+            last_report = time.time()
+
+            file_list: Optional[List[str]] = None
+            missing: Optional[Dict[str, os.DirEntry]] = None
+            if only_missing:
+                missing = self._check_missing_files()
+                file_list = list(missing)
+
+            def build_verify_batch(
+                    batch: List[Tuple[str, Optional[os.DirEntry]]]
+            ) -> List[Tuple[bool, Optional['HashedFile']]]:
+                prehashed = self._prehash_small_files(batch, algo_name, skip_unchanged)
+                return [self._build_verfiy_hash(file_path, algo_name,
+                                                collect_fstat=collect_fstat, skip_unchanged=skip_unchanged,
+                                                single_hash=single_hash, entry=entry,
+                                                prehashed=prehashed.get(file_path))
+                        for file_path, entry in batch]
+
+            def fetch_stat(
+                    items: Iterator[Tuple[str, Optional[os.DirEntry]]]
+            ) -> Iterator[Tuple[str, Optional[os.DirEntry]]]:
+                for file_path, entry in items:
+                    # the stat result is cached on the DirEntry so the hashing stage
+                    # doesn't have to wait for it (needed for batching small files,
+                    # the skip decision, the stat cache and recording the mtime/size)
+                    if entry is not None:
+                        try:
+                            entry.stat()
+                        except OSError:
+                            # reported when the file is hashed
+                            pass
+                    yield file_path, entry
+
+            def hash_files(
+                    items: Iterator[Tuple[str, Optional[os.DirEntry]]]
+            ) -> Iterator[Tuple[Tuple[str, Optional[os.DirEntry]], Tuple[bool, Optional['HashedFile']]]]:
+                for batch, results in imap_ordered(
+                        build_verify_batch, batch_small_files(items, _entry_size),
+                        jobs=jobs, scheduler=scheduler, path_of=_batch_path):
+                    yield from zip(batch, results)
+
+            walk = self.filtered_walk_entries(
                 start_path, root_only, whitelist=whitelist, blacklist=blacklist,
-                file_list=file_list):
-            # status report every N seconds
-            if time.time() - last_report >= 30:
-                logger.info("STATUS: Checking file \"%s\" Skipped %d/%d", file_path, self.skipped_unchanged_files, self.total_files_processed)
-                last_report = time.time()
-
-            include, hashed_file = self._build_verfiy_hash(file_path, algo_name,
-                                                           collect_fstat=collect_fstat, skip_unchanged=skip_unchanged,
-                                                           single_hash=single_hash)
-            self.total_files_processed += 1
-            if include:
-                incremental.set_entry(file_path, cast(HashedFile, hashed_file))
-                if incremental_writes:
-                    incremental.write()
+                file_list=file_list, file_entries=missing)
+            pipeline: Optional[Pipeline] = None
+            results: Iterable[Tuple[Tuple[str, Optional[os.DirEntry]],
+                                    Tuple[bool, Optional['HashedFile']]]]
+            if jobs <= 1 and scheduler is None:
+                # files are hashed one after another on this thread anyway, so the
+                # stage threads would only add queue handoffs
+                results = hash_files(walk)
+            else:
+                # walk -> stat -> hash -> writer (this thread), every stage runs on its own
+                # thread so walking the tree overlaps with reading the files
+                pipeline = (Pipeline(walk)
+                            .add_stage("walk", iter)
+                            .add_stage("stat", fetch_stat)
+                            .add_stage("hash", hash_files))
+                results = pipeline
+
+            # NOTE: results are consumed on this thread in the order of the walk so
+            #       the entry order stays deterministic even when using multiple jobs
+            for (file_path, _), (include, hashed_file) in results:
+                # status report every N seconds
+                if time.time() - last_report >= 30:
+                    status = f" | {pipeline.status()}" if pipeline is not None else ""
+                    logger.info("STATUS: Checking file \"%s\" Skipped %d/%d%s", file_path, self.skipped_unchanged_files, self.total_files_processed, status)
+                    last_report = time.time()
+
+                self.total_files_processed += 1
+                if include:
+                    incremental.set_entry(file_path, cast(HashedFile, hashed_file))
+                    if incremental_writes:
+                        incremental.write()
+                    if on_entry is not None:
+                        on_entry(file_path, cast(HashedFile, hashed_file))
+
+                if cancel is not None and cancel.is_set():
+                    logger.info("Cancelled incremental checksums after %d files",
+                                self.total_files_processed)
+                    break
+        finally:
+            if single_walk:
+                self.tree_listing = None
 
         if incremental_writes:
             cast(ChecksumHelperDataIncremental, incremental).write(flush=True)
 
         return incremental if len(incremental.entries) > 0 else None
 
+    def async_do_incremental_checksums(
+            self, algo_name: str, single_hash: bool = False, start_path: Optional[str] = None,
+            root_only: bool = False, whitelist: Optional[List[str]] = None,
+            blacklist: Optional[List[str]] = None,
+            only_missing: bool = False,
+            incremental_writes: bool = False,
+            jobs: int = 1,
+            scheduler: Optional[DeviceScheduler] = None,
+            executor: Optional[Executor] = None
+    ) -> 'AsyncRun[Tuple[str, HashedFile], Optional[ChecksumHelperData]]':
+        """
+        Same as do_incremental_checksums but runs on a worker thread of `executor` and
+        streams the (file path, HashedFile) pairs that are added to the incremental hash
+        file; the `result` of the returned AsyncRun is the incremental hash file
+        (await the AsyncRun to only get the result)
+        """
+        def run(emit: Callable[[Tuple[str, HashedFile]], None],
+                cancel: threading.Event) -> Optional[ChecksumHelperData]:
+            return self.do_incremental_checksums(
+                algo_name, single_hash=single_hash, start_path=start_path,
+                root_only=root_only, whitelist=whitelist, blacklist=blacklist,
+                only_missing=only_missing, incremental_writes=incremental_writes,
+                jobs=jobs, scheduler=scheduler,
+                on_entry=lambda file_path, hashed_file: emit((file_path, hashed_file)),
+                cancel=cancel)
+        return AsyncRun(run, executor)
+
+    def _file_hashes(self, file_path: str, algos: AbstractSet[str],
+                     entry: Optional[os.DirEntry] = None,
+                     prehashed: Optional[Dict[str, bytes]] = None) -> Optional[Dict[str, bytes]]:
+        """
+        Computes the digests of `file_path` for all `algos` in one pass, using the
+        digests of self.stat_cache (if set) if the file is unchanged
+        entry: the stat data of the DirEntry is used for the cache look-up
+        prehashed: digests that were already computed by a batch (see _prehash_small_files)
+        """
+        if prehashed is not None and algos <= prehashed.keys():
+            return {algo: prehashed[algo] for algo in algos}
+        cache = self.stat_cache
+        if cache is None:
+            return HashedFile.compute_file_hashes(file_path, algos, _pool_size_hint(entry))
+
+        try:
+            # the stat data of a DirEntry doesn't include st_ino/st_dev on Windows
+            stat = (entry.stat() if entry is not None and os.name != 'nt'
+                    else os.stat(file_path))
+        except OSError:
+            # let compute_file_hashes report the error
+            return HashedFile.compute_file_hashes(file_path, algos)
+
+        digests: Dict[str, bytes] = {}
+        for algo in algos:
+            cached = cache.lookup(file_path, stat, algo)
+            if cached is not None:
+                digests[algo] = cached
+        uncached = algos - digests.keys()
+        if uncached:
+            computed = HashedFile.compute_file_hashes(file_path, uncached, stat.st_size)
+            if computed is None:
+                return None
+            for algo, digest in computed.items():
+                cache.store(file_path, stat, algo, digest)
+            digests.update(computed)
+        else:
+            logger.infovv("Using cached hash for unchanged file '%s'", file_path)  # type: ignore
+
+        return digests
+
+    def _file_hash(self, file_path: str, algo: str,
+                   entry: Optional[os.DirEntry] = None,
+                   prehashed: Optional[Dict[str, bytes]] = None) -> Optional[bytes]:
+        if prehashed is not None and algo in prehashed:
+            return prehashed[algo]
+        if self.stat_cache is None:
+            return HashedFile.compute_file_hash(file_path, algo, _pool_size_hint(entry))
+        digests = self._file_hashes(file_path, {algo}, entry)
+        return digests[algo] if digests is not None else None
+
     def _build_verfiy_hash(
             self, file_path: str, algo_name: str, single_hash: bool = False,
             rehash_other_types: bool = True, collect_fstat: bool = True,
-            skip_unchanged: bool = False) -> Tuple[bool, Optional['HashedFile']]:
+            skip_unchanged: bool = False,
+            entry: Optional[os.DirEntry] = None,
+            prehashed: Optional[Dict[str, bytes]] = None) -> Tuple[bool, Optional['HashedFile']]:
         # NOTE: assumes self.hash_file_most_current is not None
+        # entry: DirEntry of file_path from the walk, its stat data is used instead
+        #        of calling os.stat again
+        # prehashed: digests of file_path computed by _prehash_small_files
         new: Optional['HashedFile'] = None
         include = False
         # fpath is an absolute path
         old = cast(ChecksumHelperData,
                    self.hash_file_most_current).get_entry(file_path)
         if old is None:
-            new_hash = HashedFile.compute_file_hash(file_path, algo_name)
+            new_hash = self._file_hash(file_path, algo_name, entry, prehashed)
             if new_hash is None:
                 logger.warning("File '%s' will be skipped!", file_path)
                 return False, None
             new = HashedFile(file_path, None, algo_name, new_hash, False)
             if collect_fstat:
-                new.update_mtime()
+                new.update_fstat(entry)
 
             include = True
         else:
             # do a size/mtime comparison first if skip_unchanged and the same hash_type was used
-            mtime: Optional[float] = None
+            mtime: Optional[int] = None
+            size: Optional[int] = None
             algos_match = old.hash_type == algo_name
             old_has_mtime = old.mtime is not None
             if collect_fstat or (skip_unchanged and old_has_mtime):
-                mtime = HashedFile.fetch_mtime(file_path)
+                stat = HashedFile.fetch_stat(file_path, entry)
+                if stat is not None:
+                    mtime, size = stat.st_mtime_ns, stat.st_size
 
             # 0 match -1 current mtime is smaller/older 1 current mtime is bigger/younger
             comp_mtime: Optional[int] = None
             # # 0 match -1 current size is smaller 1 current size is bigger
             comp_size:  Optional[int] = None
             if old_has_mtime and mtime is not None:
-                comp_mtime = (0 if old.mtime == mtime else
-                              1 if cast(float, mtime) > cast(float, old.mtime) else -1)
+                comp_mtime = (0 if mtime_ns_matches(cast(int, old.mtime), mtime) else
+                              1 if mtime > cast(int, old.mtime) else -1)
+            if old.size is not None and size is not None:
+                comp_size = (0 if old.size == size else
+                             1 if size > old.size else -1)
 
             # we already compared the mtime so now we can update the mtime on old
             # NOTE: not used! we just use mtime below, otherwise mtime would
             #       not be updated
             # TODO remove?
-            if not old_has_mtime and mtime is not None:
+            # also replaces mtimes that only matched at the precision of
+            # older versions (float seconds) with the exact one
+            updated = False
+            if mtime is not None and (not old_has_mtime or comp_mtime == 0):
+                updated = old.mtime != mtime
                 old.mtime = mtime
+            if old.size is None and size is not None and comp_mtime in (0, None):
+                updated = True
+                old.size = size
+            most_current_entries = cast(ChecksumHelperData, self.hash_file_most_current).entries
+            if updated and isinstance(most_current_entries, CompactEntries):
+                # CompactEntries returns copies -> store the updated entry again
+                # (only overwrites the columns of an existing row with the same digest
+                # size, so it's safe to do from multiple hashing threads)
+                most_current_entries[os.path.normpath(file_path)] = old
 
             skip = False
-            if skip_unchanged and comp_mtime == 0:
+            # a different size means the file changed even if the mtime matches
+            if skip_unchanged and comp_mtime == 0 and comp_size in (0, None):
                 include = self.options['include_unchanged_files_incremental']
                 skip = True
-                self.skipped_unchanged_files += 1
+                with self._counter_lock:
+                    self.skipped_unchanged_files += 1
                 logger.infovv(  # type: ignore
                     "Skipping generation of a hash for file '%s' since the mtime matches!",
                     file_path)
 
+            # hash computed with algo_name, when we have to re-hash a file that
+            # was recorded using a different algorithm
+            rehashed: Optional[bytes] = None
             if not skip:
                 # when building incremental hashfile we have to use
                 # the hash type for which we have A HASH in most_current
                 # to find out if file changed -> changed -> use new hash type
-                current_hash = HashedFile.compute_file_hash(
-                    file_path, old.hash_type)
+                current_hash: Optional[bytes]
+                if not algos_match and rehash_other_types:
+                    # compute both hashes while only reading the file once
+                    digests = self._file_hashes(
+                        file_path, {old.hash_type, algo_name}, entry, prehashed)
+                    current_hash = digests[old.hash_type] if digests is not None else None
+                    rehashed = digests[algo_name] if digests is not None else None
+                else:
+                    current_hash = self._file_hash(
+                        file_path, old.hash_type, entry, prehashed)
                 if current_hash is None:
                     logger.warning("File '%s' will be skipped!", file_path)
                     return False, None
@@ -735,26 +2357,64 @@ class ChecksumHelper:
             if not algos_match and rehash_other_types:
                 logger.infov("Recorded hash used %s as algorithm -> re-hashing "  # type: ignore
                              "with %s: %s!", old.hash_type, algo_name, file_path)
-                new_hash = HashedFile.compute_file_hash(file_path, algo_name)
+                new_hash = (rehashed if rehashed is not None
+                            else self._file_hash(file_path, algo_name, entry, prehashed))
                 new = None  # so below creates new HashedFile with different hash type
                 include = True
 
             if include and new is None:
                 new = HashedFile(file_path, mtime, algo_name,
-                                 cast(bytes, new_hash), False)
+                                 cast(bytes, new_hash), False, size)
 
         return include, new
 
+    def _prehash_small_files(self, batch: List[Tuple[str, Optional[os.DirEntry]]],
+                             algo_name: str, skip_unchanged: bool = False) -> Dict[str, Dict[str, bytes]]:
+        """
+        Computes the digests that _build_verfiy_hash will most likely need for a batch of
+        small files at once using gen_hashes_from_files
+        Files that will probably be skipped (matching mtime) or couldn't be read are left
+        out, _build_verfiy_hash hashes those on its own if needed
+        """
+        # the stat cache and the process pool have their own ways of avoiding the overhead
+        if len(batch) < 2 or self.stat_cache is not None or _hash_pool is not None:
+            return {}
+
+        most_current = cast(ChecksumHelperData, self.hash_file_most_current)
+        by_algos: Dict[FrozenSet[str], List[str]] = {}
+        for file_path, entry in batch:
+            old = most_current.get_entry(file_path)
+            if old is None:
+                algos = frozenset((algo_name,))
+            else:
+                if skip_unchanged and old.mtime is not None:
+                    stat = HashedFile.fetch_stat(file_path, entry)
+                    if stat is not None and mtime_ns_matches(old.mtime, stat.st_mtime_ns):
+                        continue
+                algos = frozenset((old.hash_type, algo_name))
+            by_algos.setdefault(algos, []).append(file_path)
+
+        prehashed: Dict[str, Dict[str, bytes]] = {}
+        for algos, file_paths in by_algos.items():
+            for file_path, digests in zip(file_paths, gen_hashes_from_files(file_paths, algos)):
+                if digests is not None:
+                    prehashed[file_path] = cast(Dict[str, bytes], digests)
+        return prehashed
+
     def gen_missing_checksums(
             self, algo_name: str, single_hash: bool = False, start_path: Optional[str] = None,
             whitelist: Optional[List[str]] = None,
-            blacklist: Optional[List[str]] = None) -> Optional['ChecksumHelperData']:
+            blacklist: Optional[List[str]] = None,
+            jobs: int = 1,
+            scheduler: Optional[DeviceScheduler] = None) -> Optional['ChecksumHelperData']:
         """
         Creates checksums for all changed files (that dont match checksums in
         hash_file_most_current)
 
         start_path: has to be a subpath of self.root_dir
         root_only:  only do incremental checksums for the files of the root/start_path only
+        jobs: number of worker threads used for hashing
+        scheduler: distribute the hashing by device instead (overrides jobs)
         """
         # NOTE: white/blacklist are mutually exclusive which is checked in filtered_walk
         # but we do the duplicate check here as well so we can avoid the cost of
@@ -764,9 +2424,6 @@ class ChecksumHelper:
                 "Can only use either a whitelist or blacklist - not both!")
             return None
 
-        if not self.hash_file_most_current:
-            self.build_most_current()
-
         if start_path is None:
             start_path = self.root_dir
 
@@ -779,29 +2436,52 @@ class ChecksumHelper:
                 start_path, f"{dir_name}_missing_{time.strftime('%Y-%m-%d')}.cshd")
         missing_cshd = ChecksumHelperData(self, filename)
 
-        collect_fstat = self.options['incremental_collect_fstat']
-        last_report = time.time()
-
-        for file_path in self.filtered_walk(start_path, whitelist=whitelist, blacklist=blacklist):
-            # status report every N seconds
-            if time.time() - last_report >= 30:
-                logger.info("STATUS: Checking file \"%s\"", file_path)
-                last_report = time.time()
-
-            # fpath is an absolute path
-            old = cast(ChecksumHelperData,
-                       self.hash_file_most_current).get_entry(file_path)
-            # only include files that don't have a checksum yet
-            if old is None:
-                new_hash = HashedFile.compute_file_hash(file_path, algo_name)
+        # discovering the hash files and hashing would each walk the tree
+        # -> walk it only once and re-use the listings
+        single_walk = (self.options["single_walk"] and not self.hash_file_most_current
+                       and self.tree_listing is None)
+        if single_walk:
+            self.scan_tree()
+        try:
+            if not self.hash_file_most_current:
+                self.build_most_current()
+            most_current = cast(ChecksumHelperData, self.hash_file_most_current)
+
+            collect_fstat = self.options['incremental_collect_fstat']
+            last_report = time.time()
+
+            def missing_files() -> Iterator[Tuple[str, Optional[os.DirEntry]]]:
+                for file_path, entry in self.filtered_walk_entries(
+                        start_path, whitelist=whitelist, blacklist=blacklist):
+                    # fpath is an absolute path
+                    # only include files that don't have a checksum yet
+                    if file_path not in most_current:
+                        yield file_path, entry
+
+            def hash_missing(item: Tuple[str, Optional[os.DirEntry]]) -> Optional[HashedFile]:
+                file_path, entry = item
+                new_hash = self._file_hash(file_path, algo_name, entry)
                 if new_hash is None:
                     logger.warning("File '%s' will be skipped!", file_path)
-                    continue
+                    return None
                 new = HashedFile(file_path, None, algo_name, new_hash, False)
                 if collect_fstat:
-                    new.update_mtime()
-
-                missing_cshd.set_entry(file_path, cast(HashedFile, new))
+                    new.update_fstat(entry)
+                return new
+
+            for (file_path, _), new in imap_ordered(hash_missing, missing_files(),
+                                                    jobs=jobs, scheduler=scheduler,
+                                                    path_of=_item_path):
+                # status report every N seconds
+                if time.time() - last_report >= 30:
+                    logger.info("STATUS: Checking file \"%s\"", file_path)
+                    last_report = time.time()
+
+                if new is not None:
+                    missing_cshd.set_entry(file_path, new)
+        finally:
+            if single_walk:
+                self.tree_listing = None
 
         return missing_cshd if len(missing_cshd.entries) > 0 else None
 
@@ -830,55 +2510,56 @@ class ChecksumHelper:
         """
         Check if all files in subdirs of root_dir are represented in hash_file_most_current
         """
+        return list(self._check_missing_files())
+
+    def _check_missing_files(self) -> Dict[str, os.DirEntry]:
+        """
+        Same as check_missing_files but returns the DirEntries of the missing files
+        (in the order of the walk)
+        """
         if not self.hash_file_most_current:
             self.build_most_current()
 
-        file_paths = cast(ChecksumHelperData,
-                          self.hash_file_most_current).entries.keys()
-        all_files = set()
-        dirs = set()
-        # add root dir
-        dirs.add(self.root_dir)
-        # account for a filename filter or dir without files and just subdirs
-        # causing dirpath not being in dirs but deleting it from dirnames means
+        most_current = cast(ChecksumHelperData, self.hash_file_most_current)
+        missing_files: Dict[str, os.DirEntry] = {}
+        # the trie also knows about dirs without (checksummed) files that only have
+        # subdirs with checksummed files; deleting those from dirs would mean
         # that we dont descend into any subdirs of that folder either
-        # -> create set of all directory paths (and all of its sub-paths (dirs leading up to dir) to
-        # account for dirs without (checksummed) files)
-        for fp in file_paths:
-            # normalize path so the check for ..path in dirs.. later works properly
-            dirname = os.path.dirname(os.path.normpath(fp))
-            while dirname != self.root_dir:
-                dirs.add(dirname)
-                dirname = os.path.dirname(dirname)
+        index = most_current.path_index()
 
         missing_dirs = []
 
-        for dirpath, dirnames, fnames in os.walk(self.root_dir):
-            dirnames_filtered = []
-            for dn in dirnames:
+        for dirpath, dirs, files in self.walk(self.root_dir):
+            dirs_filtered = []
+            for d in dirs:
+                dn = d.name
                 # dirpath is path to current dir
                 # use normpath to remove ./ or .\ at start of path, relpath also works
                 dirpath_dirname = os.path.normpath(os.path.join(dirpath, dn))
 
                 # filter out directories that dont contain any checksummed files
-                if dirpath_dirname not in dirs:
+                if not index.has_files(dirpath_dirname):
                     missing_dirs.append(dirpath_dirname)
                 else:
-                    # IMPORTANT append dirname not combined dirpath and name!
-                    dirnames_filtered.append(dn)
+                    # IMPORTANT append the entry not combined dirpath and name!
+                    dirs_filtered.append(d)
 
-            dirnames[:] = dirnames_filtered
+            dirs[:] = dirs_filtered
 
-            for fname in fnames:
+            for f in files:
                 # normpath otherwise generated file paths might be different
                 # even though they point to the same location
-                file_path = os.path.normpath(os.path.join(dirpath, fname))
-                all_files.add(file_path)
-
-        missing_files = all_files - file_paths
+                file_path = os.path.normpath(f.path)
+                if file_path not in most_current:
+                    missing_files[file_path] = f
 
         missing_dirs_non_empty = []
         for d in missing_dirs:
+            is_empty = self.tree_listing.is_empty(d) if self.tree_listing is not None else None
+            if is_empty is not None:
+                if not is_empty:
+                    missing_dirs_non_empty.append(d)
+                continue
             try:
                 if len(os.listdir(d)) > 0:
                     missing_dirs_non_empty.append(d)
@@ -900,7 +2581,7 @@ class ChecksumHelper:
                                    for fp in sorted(missing_files)))
             print("\n".join(missing_format))
 
-        return list(missing_files)
+        return missing_files
 
     def move_files(self, source_path: str, mv_path: str) -> None:
         # error when trying to move to diff drive
@@ -963,20 +2644,24 @@ class ChecksumHelper:
         for chsd in all_hash_files:
             modified = False
             if src_is_dir:
-                moved_fn_hash_dict = {}
-                for fpath, hashed_file in chsd.entries.items():
-                    # NOTE: since we're using absolute paths we have to change
-                    # these even if the realtive paths don't change
-                    if fpath.startswith(source_path):
-                        # remove source_path from fpath and replace it with dest
-                        moved = fpath.replace(source_path, dest_path)
-                        moved_fn_hash_dict[moved] = hashed_file
-                        modified = True
-                    else:
-                        moved_fn_hash_dict[fpath] = hashed_file
-                if modified:
+                # only look at the entries that are actually inside the moved dir
+                # (a startswith check would also match e.g. 'dir2/file' for 'dir')
+                moved_paths = set(chsd.path_index().files_under(source_path))
+                if moved_paths:
+                    moved_fn_hash_dict = type(chsd.entries)()
+                    # rebuild the entries so their order is kept
+                    for fpath, hashed_file in chsd.entries.items():
+                        # NOTE: since we're using absolute paths we have to change
+                        # these even if the realtive paths don't change
+                        if fpath in moved_paths:
+                            # remove source_path from fpath and replace it with dest
+                            moved_fn_hash_dict[dest_path + fpath[len(source_path):]] = hashed_file
+                        else:
+                            moved_fn_hash_dict[fpath] = hashed_file
                     # replace with new fn hash dict
                     chsd.entries = moved_fn_hash_dict
+                    chsd.invalidate_path_index()
+                    modified = True
             else:
                 # save hash and del old path entry and replace it with new path
                 mb_hashed_file = chsd.get_entry(source_path)
@@ -990,7 +2675,7 @@ class ChecksumHelper:
                     modified = True
 
             # check if hash_file was also moved
-            if src_is_dir and chsd.get_path().startswith(source_path):
+            if src_is_dir and chsd.get_path().startswith(source_path + os.sep):
                 # we already got the path pointing directly to the moved file/dir from
                 # shutil.move even if the target was a dir
                 chsd.relocate(chsd.get_path().replace(source_path, dest_path))
@@ -1007,12 +2692,106 @@ class ChecksumHelper:
                 chsd.write(force=True, preserve_mtime=True)
 
 
+class PathTrie:
+    """
+    Directory trie over absolute, normalized file paths (e.g. the keys of
+    ChecksumHelperData.entries), so queries for a directory only cost
+    O(depth of the directory + nr of results) instead of a scan over all paths
+    """
+
+    __slots__ = ("children", "files", "count")
+
+    def __init__(self, file_paths: Optional[Iterable[str]] = None):
+        # directory name -> sub-trie
+        self.children: Dict[str, 'PathTrie'] = {}
+        # paths of the files that are directly in this directory
+        self.files: Set[str] = set()
+        # nr of files in this directory including all of its sub-directories
+        self.count = 0
+        if file_paths is not None:
+            for file_path in file_paths:
+                self.add(file_path)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @staticmethod
+    def _dir_parts(dir_path: str) -> List[str]:
+        # "/" -> [""], "/foo" -> ["", "foo"], "C:\\foo" -> ["C:", "foo"]
+        return dir_path.rstrip(os.sep).split(os.sep)
+
+    def _node(self, dir_path: str) -> Optional['PathTrie']:
+        node: Optional[PathTrie] = self
+        for part in PathTrie._dir_parts(dir_path):
+            node = cast(PathTrie, node).children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def add(self, file_path: str) -> bool:
+        """Returns False if file_path was already present"""
+        nodes = [self]
+        for part in PathTrie._dir_parts(os.path.dirname(file_path)):
+            node = nodes[-1].children.get(part)
+            if node is None:
+                node = nodes[-1].children[part] = PathTrie()
+            nodes.append(node)
+        if file_path in nodes[-1].files:
+            return False
+        nodes[-1].files.add(file_path)
+        for node in nodes:
+            node.count += 1
+        return True
+
+    def remove(self, file_path: str) -> bool:
+        """Returns False if file_path wasn't present"""
+        parts = PathTrie._dir_parts(os.path.dirname(file_path))
+        nodes = [self]
+        for part in parts:
+            node = nodes[-1].children.get(part)
+            if node is None:
+                return False
+            nodes.append(node)
+        if file_path not in nodes[-1].files:
+            return False
+        nodes[-1].files.remove(file_path)
+        for node in nodes:
+            node.count -= 1
+        # drop directories that don't contain any files anymore
+        for parent, part, node in zip(nodes, parts, nodes[1:]):
+            if node.count == 0:
+                del parent.children[part]
+                break
+        return True
+
+    def count_under(self, dir_path: str) -> int:
+        """Nr of files in dir_path including all of its sub-directories"""
+        node = self._node(dir_path)
+        return 0 if node is None else node.count
+
+    def has_files(self, dir_path: str) -> bool:
+        """Whether there are any files in dir_path or one of its sub-directories"""
+        return self.count_under(dir_path) > 0
+
+    def files_under(self, dir_path: str) -> Iterator[str]:
+        """Yields the paths of all files in dir_path and its sub-directories"""
+        node = self._node(dir_path)
+        if node is None:
+            return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield from node.files
+            stack.extend(node.children.values())
+
+
 class ChecksumHelperData:
 
     root_dir: str
     filename: str
 
-    def __init__(self, handling_checksumhelper, path_to_hash_file: str):
+    def __init__(self, handling_checksumhelper, path_to_hash_file: str,
+                 compact_entries: bool = False):
         self.handling_checksumhelper: ChecksumHelper = handling_checksumhelper
         # store location of file (or use filename to build loc)
         # so we can build the path to files from root_dir correctly
@@ -1021,8 +2800,14 @@ class ChecksumHelperData:
         self.root_dir, self.filename = os.path.split(
             os.path.normpath(os.path.abspath(path_to_hash_file)))
         self._was_read = False
+        # store entries in a CompactEntries instead of a dict once there are at least
+        # COMPACT_ENTRIES_MIN_SIZE of them, which uses a lot less memory for big hash
+        # files, but is slower and creates a new HashedFile on every look-up
+        self.compact_entries = compact_entries
         # filename -> 'HashedFile' (filename is an absolute and normalized path)
-        self.entries: Dict[str, 'HashedFile'] = {}
+        self.entries: MutableMapping[str, 'HashedFile'] = self._new_entries()
+        # directory trie over the entries, built on first use by path_index
+        self._path_index: Optional[PathTrie] = None
         self.mtime: Optional[float] = None
         _, ext = os.path.splitext(self.filename)
         # whether only one type of hash alogrithm is used
@@ -1056,12 +2841,15 @@ class ChecksumHelperData:
         :param file_path: Absolute path to hashed file
         :return: Tuple of hash in hex and name of used hash algorithm
         """
+        file_path = os.path.normpath(file_path)
         try:
             # self.entries uses normalized abspaths as keys
-            del self.entries[os.path.normpath(file_path)]
+            del self.entries[file_path]
         except KeyError:
             return False
         else:
+            if self._path_index is not None:
+                self._path_index.remove(file_path)
             return True
 
     @property
@@ -1092,23 +2880,58 @@ class ChecksumHelperData:
                           gets normalized here
         :param hash_str:  Hex-string representation of file hash
         """
-        self.entries[os.path.normpath(file_path)] = hashed_file
+        file_path = os.path.normpath(file_path)
+        self.entries[file_path] = hashed_file
+        if self._path_index is not None:
+            self._path_index.add(file_path)
+        if self.compact_entries:
+            self._maybe_compact_entries()
+
+    def path_index(self) -> PathTrie:
+        """
+        Directory trie over the paths of the entries, so all entries under a directory
+        can be found without scanning all of them
+        It's built on first use and kept up to date by set_entry/__delitem__, any other
+        modification of self.entries has to call invalidate_path_index
+        """
+        if self._path_index is None:
+            self._path_index = PathTrie(self.entries)
+        return self._path_index
+
+    def invalidate_path_index(self) -> None:
+        self._path_index = None
 
     def get_path(self) -> str:
         return os.path.join(self.root_dir, self.filename)
 
+    def _new_entries(self) -> MutableMapping[str, 'HashedFile']:
+        # small collections stay a dict, see _maybe_compact_entries
+        return {}
+
+    def _maybe_compact_entries(self) -> None:
+        """
+        Switches self.entries to a CompactEntries once there are enough of them that
+        the memory savings are worth the slower access
+        """
+        if (self.compact_entries and type(self.entries) is dict and
+                len(self.entries) >= COMPACT_ENTRIES_MIN_SIZE):
+            self.entries = CompactEntries(self.entries.items())
+
     def clear(self):
         self.entries.clear()
         self.entries = None
-        self.entries = {}
+        self.entries = self._new_entries()
+        self._path_index = None
 
     def read(self) -> None:
+        self._path_index = None
         # TODO handle failure
         try:
             if self.single_hash:
                 self._read_from_single_hash_file()
             else:
                 self._read()
+            self._maybe_compact_entries()
             self._was_read = True
         except InvalidHashLineError as e:
             logger.warn("File will be skipped: Malformed hash file: %s", str(e))
@@ -1132,90 +2955,109 @@ class ChecksumHelperData:
         if self.mtime is None:
             return
 
-        with open(self.get_path(), "r", encoding="UTF-8") as f:
-            text = f.read()
-
         warned_pardir_ref = False
-        for i, ln in enumerate(text.splitlines()):
-            stripped = ln.strip()
-            if not stripped:
-                continue
-
-            mtime = None
-            size = None
-            try:
-                mtime_end = stripped.index(",")
-                if mtime_end != 0:
-                    mtime = float(stripped[:mtime_end])
-
-                hash_type_end = stripped.index(",", mtime_end + 1)
-                hash_type = stripped[mtime_end + 1:hash_type_end]
-
-                hash_str_end = stripped.index(" ", hash_type_end + 1)
-                hash_str = stripped[hash_type_end + 1:hash_str_end]
-
-                file_path = stripped[hash_str_end + 1:]
-            except (ValueError, IndexError):
-                raise InvalidHashLineError(
-                    f"Invalid hash line at line {i + 1} in file "
-                    f"'{self.get_path()}': '{ln}'")
-
-            # alert on abspath in file; we use abspath internally but only write
-            # relative paths to file
-            if os.path.isabs(file_path):
-                # even if drive letters match: drives could be from different computers
-                # or could have been remounted
-                raise InvalidHashLineError(
-                    f"Absolute path found in hash line at line {i + 1} in file "
-                    f"'{self.get_path()}': '{ln}'")
-            elif not warned_pardir_ref:
-                normalized = os.path.normpath(file_path)
-                if normalized.startswith("../") or normalized.startswith("..\\"):
-                    logger.warning(
-                        "Found reference beyond the hash file's root dir "
-                        "on line %d in file: '%s': '%s'. "
-                        "Consider moving/copying the file using "
-                        "ChecksumHelper move/copy "
-                        "to the path that is the most common denominator!",
-                        i + 1, self.get_path(), ln)
-                    warned_pardir_ref = True
+        # iterate over the lines of the (buffered) file instead of reading all of it
+        # at once, so only the entries are kept in memory
+        with open(self.get_path(), "r", encoding="UTF-8") as f:
+            for i, ln in enumerate(f):
+                # universal newlines mode translates all line endings to \n
+                ln = ln.rstrip("\n")
+                stripped = ln.strip()
+                if not stripped:
+                    continue
 
-            # use normpath here to ensure that paths get normalized
-            # since we use them as keys
-            # also needed since we always use '/' as path sep when writing the file
-            # but use os.sep while running (since unix can't deal with '\' as path sep)
-            abs_normed_path = os.path.normpath(
-                os.path.join(self.root_dir, file_path))
-            self.entries[abs_normed_path] = HashedFile(
-                abs_normed_path, mtime, hash_type, binascii.a2b_hex(hash_str), False)
+                mtime = None
+                size = None
+                try:
+                    mtime_end = stripped.index(",")
+                    if mtime_end != 0:
+                        mtime = mtime_ns_from_str(stripped[:mtime_end])
+
+                    # optional size field: mtime,size,hash_type,hash path
+                    # (hash type names never consist of only digits)
+                    hash_type_start = mtime_end + 1
+                    hash_type_end = stripped.index(",", hash_type_start)
+                    size_str = stripped[hash_type_start:hash_type_end]
+                    if size_str.isdigit():
+                        size = int(size_str)
+                        hash_type_start = hash_type_end + 1
+                        hash_type_end = stripped.index(",", hash_type_start)
+                    hash_type = stripped[hash_type_start:hash_type_end]
+
+                    hash_str_end = stripped.index(" ", hash_type_end + 1)
+                    hash_str = stripped[hash_type_end + 1:hash_str_end]
+
+                    file_path = stripped[hash_str_end + 1:]
+                except (ValueError, IndexError):
+                    raise InvalidHashLineError(
+                        f"Invalid hash line at line {i + 1} in file "
+                        f"'{self.get_path()}': '{ln}'")
+
+                # alert on abspath in file; we use abspath internally but only write
+                # relative paths to file
+                if os.path.isabs(file_path):
+                    # even if drive letters match: drives could be from different computers
+                    # or could have been remounted
+                    raise InvalidHashLineError(
+                        f"Absolute path found in hash line at line {i + 1} in file "
+                        f"'{self.get_path()}': '{ln}'")
+                elif not warned_pardir_ref:
+                    normalized = os.path.normpath(file_path)
+                    if normalized.startswith("../") or normalized.startswith("..\\"):
+                        logger.warning(
+                            "Found reference beyond the hash file's root dir "
+                            "on line %d in file: '%s': '%s'. "
+                            "Consider moving/copying the file using "
+                            "ChecksumHelper move/copy "
+                            "to the path that is the most common denominator!",
+                            i + 1, self.get_path(), ln)
+                        warned_pardir_ref = True
+
+                # use normpath here to ensure that paths get normalized
+                # since we use them as keys
+                # also needed since we always use '/' as path sep when writing the file
+                # but use os.sep while running (since unix can't deal with '\' as path sep)
+                abs_normed_path = os.path.normpath(
+                    os.path.join(self.root_dir, file_path))
+                self.entries[abs_normed_path] = HashedFile(
+                    abs_normed_path, mtime, hash_type, binascii.a2b_hex(hash_str), False, size)
+                # switch while parsing so big files are never held in a dict
+                if len(self.entries) == COMPACT_ENTRIES_MIN_SIZE:
+                    self._maybe_compact_entries()
 
     def _read_from_single_hash_file(self) -> None:
-        hash_type = self.hash_type
         self.mtime = self.read_mtime()
         if self.mtime is None:
             return
 
-        # first line had \ufeff which is the BOM for utf-8 with bom
-        with open(self.get_path(), "r", encoding="UTF-8-SIG") as f:
-            # .lstrip(u'\ufeff')
-            # ^ remove BOM (byte order mark) char at beginning of document
-            # present if its UTF-8 with BOM - below does the same
+        # parse into new entries so a partial parse can be discarded if we have
+        # to fall back to a different encoding
+        entries_before = self.entries
+        self.entries = self._new_entries()
+        try:
+            # first line has \ufeff which is the BOM for utf-8 with bom
             # use 'utf-8-sig', which expects and strips off the UTF-8 Byte Order Mark, which
             # is what shows up as ï»¿.
-            try:
-                text = f.read()
-            except UnicodeDecodeError:
-                # utf-8 couldnt decode file try ANSI encoding
-                # which is "cp1252" on my system
-                # re-assigning f should work since were opening the same file in the same
-                # process but to be extra safe use a new var
-                af = open(self.get_path(), "r", encoding="cp1252")
-                text = af.read()
-                # context manager doesnt work now so close file manually
-                af.close()
-
+            # the file is parsed line by line while it's read, so only the entries are
+            # kept in memory
+            with open(self.get_path(), "r", encoding="UTF-8-SIG") as f:
+                self._parse_single_hash_lines(f)
+        except UnicodeDecodeError:
+            # utf-8 couldnt decode file try ANSI encoding
+            # which is "cp1252" on my system
+            self.entries = self._new_entries()
+            with open(self.get_path(), "r", encoding="cp1252") as f:
+                self._parse_single_hash_lines(f)
+        finally:
+            if entries_before:
+                entries_before.update(self.entries)
+                self.entries = entries_before
+
+    def _parse_single_hash_lines(self, lines: Iterable[str]) -> None:
+        hash_type = cast(str, self.hash_type)
         warned_pardir_ref = False
-        for i, ln in enumerate(text.splitlines()):
+        for i, ln in enumerate(lines):
+            ln = ln.rstrip("\n")
             # from GNU *sum utils:
             # default mode is to print a line with checksum, a character
             # indicating input mode ('*' for binary, space for text), and name
@@ -1278,11 +3120,13 @@ class ChecksumHelperData:
                 hash_bytes = binascii.a2b_hex(hash_str)
             except binascii.Error:
                 raise InvalidHashLineError(
-                    f"Expected a hexadecimal hash string, got '{hash_bytes}' "
+                    f"Expected a hexadecimal hash string, got '{hash_str}' "
                     f"on line {i + 1} in file '{self.get_path()}'.")
 
             self.entries[abs_normed_path] = HashedFile(
-                abs_normed_path, None, cast(str, hash_type), hash_bytes, text_mode)
+                abs_normed_path, None, hash_type, hash_bytes, text_mode)
+            if len(self.entries) == COMPACT_ENTRIES_MIN_SIZE:
+                self._maybe_compact_entries()
 
     def _check_write_file(self, force=False) -> bool:
         write_file = False
@@ -1344,7 +3188,7 @@ class ChecksumHelperData:
         if preserve_mtime:
             self._restore_mtime()
         else:
-            self.mtime = HashedFile.fetch_mtime(self.get_path())
+            self.mtime = self.read_mtime()
 
         logger.info("Wrote %s", self.get_path())
         return True
@@ -1355,8 +3199,11 @@ class ChecksumHelperData:
         for file_path, hashed_file in self.entries.items():
             rel_file_path = self._normalized_path(
                 os.path.relpath(file_path, start=root_dir))
+            # the size field is left out for entries without a size (they're written like
+            # before), but files with sizes can't be read by versions that predate it
             lines.append(
-                f"{hashed_file.mtime if hashed_file.mtime is not None else ''},"
+                f"{mtime_ns_to_str(hashed_file.mtime) if hashed_file.mtime is not None else ''},"
+                f"{'' if hashed_file.size is None else f'{hashed_file.size},'}"
                 f"{hashed_file.hash_type},"
                 f"{hashed_file.hex_hash()} {rel_file_path}")
 
@@ -1396,18 +3243,20 @@ class ChecksumHelperData:
 
         for file_path, hashed_file in self.entries.items():
             if hashed_file.hash_type != hash_type:
-                # verify stored hash using old algo still matches
-                new_hash = HashedFile.compute_file_hash_ignore_missing(
-                    file_path, hashed_file.hash_type)
-                # TODO new_hash might be None, below as well
-                if new_hash != hashed_file.hash_bytes:
+                # verify stored hash using old algo still matches while
+                # computing the hash with the new algo in the same pass
+                digests = HashedFile.compute_file_hashes_ignore_missing(
+                    file_path, {hashed_file.hash_type, hash_type})
+                # TODO digests might be None, below as well
+                if digests is None or digests[hashed_file.hash_type] != hashed_file.hash_bytes:
                     logger.warning("File %s doesnt match most current hash: %s!",
                                    file_path, hashed_file.hex_hash())
 
-                new_hash = HashedFile.compute_file_hash_ignore_missing(
-                    file_path, hash_type)
                 hashed_file.hash_type = hash_type
-                hashed_file.hash_bytes = new_hash
+                hashed_file.hash_bytes = cast(
+                    bytes, digests[hash_type] if digests is not None else None)
+                # store it again, since CompactEntries returns copies
+                self.entries[file_path] = hashed_file
 
         self.filename = f"{os.path.splitext(self.filename)[0]}.{hash_type}"
         self.single_hash = True
@@ -1468,12 +3317,357 @@ class ChecksumHelperData:
 
     def update_from_dict(self, update_dict: Dict[str, 'HashedFile']):
         self.entries.update(update_dict)
+        self._path_index = None
+        self._maybe_compact_entries()
 
     def filter_deleted_files(self) -> None:
-        self.entries = {fname: hash_str for fname, hash_str in self.entries.items()
-                        if os.path.isfile(fname)}
+        # delete in place so the order and the type of self.entries are kept
+        for fname in [fname for fname in self.entries if not os.path.isfile(fname)]:
+            del self[fname]
+
+    @staticmethod
+    def _verify_failure(rel_fpath: str, hashed_file: 'HashedFile', failed_msg: str,
+                        current_mtime: Optional[int] = None) -> Tuple[str, str]:
+        """Logs a failed verification and returns (failure type, rel_fpath)"""
+        # give more information if we have mtime data
+        if hashed_file.mtime is not None:
+            if current_mtime is None:
+                current_mtime = cast(
+                    int, hashed_file.fetch_mtime(hashed_file.filename))
+            if mtime_ns_matches(hashed_file.mtime, current_mtime):
+                logger.error("%s: %s -> CORRUPTED (same modification time)",
+                             rel_fpath, failed_msg)
+                return ("CORRUPTED (same modification time)", rel_fpath)
+            elif current_mtime > hashed_file.mtime:
+                logger.warning("%s: %s -> OUTDATED HASH (file is newer)",
+                               rel_fpath, failed_msg)
+                return ("OUTDATED HASH (file is newer)", rel_fpath)
+            else:
+                logger.warning("%s: %s -> OUTDATED HASH (file is older)",
+                               rel_fpath, failed_msg)
+                return ("OUTDATED HASH (file is older)", rel_fpath)
+        else:
+            logger.warning("%s: %s", rel_fpath, failed_msg)
+            return ("", rel_fpath)
+
+    @staticmethod
+    def _quick_stats(
+            fpaths: Sequence[str], jobs: int = 1,
+            scheduler: Optional[DeviceScheduler] = None) -> List[Optional[Tuple[int, int]]]:
+        """
+        Returns (mtime_ns, size) for every path in `fpaths` (None if it's missing)
+        Every directory is only listed once using os.scandir instead of stat'ing
+        every single file (on Windows the listing already contains the stat data)
+        """
+        by_dir: Dict[str, List[int]] = {}
+        for i, fpath in enumerate(fpaths):
+            by_dir.setdefault(os.path.dirname(fpath), []).append(i)
+
+        def scan_dir(item: Tuple[str, List[int]]) -> List[Optional[Tuple[int, int]]]:
+            dirname, indices = item
+            wanted = {os.path.basename(fpaths[i]) for i in indices}
+            found: Dict[str, Tuple[int, int]] = {}
+            try:
+                with os.scandir(dirname) as it:
+                    for entry in it:
+                        if entry.name in wanted:
+                            try:
+                                stat = entry.stat()
+                            except OSError:
+                                continue
+                            found[entry.name] = (stat.st_mtime_ns, stat.st_size)
+            except (FileNotFoundError, NotADirectoryError):
+                # everything in it is missing
+                return [None] * len(indices)
+            except OSError:
+                # e.g. no permission to list the dir -> stat files individually below
+                pass
+
+            results: List[Optional[Tuple[int, int]]] = []
+            for i in indices:
+                name = os.path.basename(fpaths[i])
+                if name in found:
+                    results.append(found[name])
+                    continue
+                # not listed, but the name could differ in case only on a case-insensitive
+                # file system so make sure it's really missing
+                try:
+                    stat = os.stat(fpaths[i])
+                except OSError:
+                    results.append(None)
+                else:
+                    results.append((stat.st_mtime_ns, stat.st_size))
+            return results
+
+        stats: List[Optional[Tuple[int, int]]] = [None] * len(fpaths)
+        # device_key expects a file path (it stats the parent dir), so use a file
+        # of the group, otherwise a mount point would be keyed to its parent's device
+        for (_, indices), dir_stats in imap_ordered(
+                scan_dir, by_dir.items(), jobs=jobs,
+                scheduler=scheduler, path_of=lambda item: fpaths[item[1][0]]):
+            for i, stat in zip(indices, dir_stats):
+                stats[i] = stat
+        return stats
+
+    def _quick_verify_entry(self, rel_fpath: str, hashed_file: 'HashedFile',
+                            mtime: int, size: int) -> Optional[Tuple[str, str]]:
+        """
+        Compares the recorded size and mtime to the ones on disk
+        Returns (failure type, rel_fpath) if they changed otherwise None
+        """
+        if hashed_file.size is not None and hashed_file.size != size:
+            return self._verify_failure(rel_fpath, hashed_file, "SIZE MISMATCH", mtime)
+        if hashed_file.mtime is not None and not mtime_ns_matches(hashed_file.mtime, mtime):
+            return self._verify_failure(rel_fpath, hashed_file, "MTIME CHANGED", mtime)
+        if hashed_file.mtime is None and hashed_file.size is None:
+            logger.warning("%s: NO MTIME OR SIZE RECORDED -> NOT CHECKED", rel_fpath)
+        else:
+            logger.info("%s: SIZE/MTIME OK", rel_fpath)
+        return None
+
+    def _whitelist_candidates(self, whitelist: Sequence[str]) -> Optional[Set[str]]:
+        """
+        Uses the literal directory prefix of the patterns (e.g. 'foo/bar' for 'foo/bar/*.txt')
+        to find all entries that could possibly match one of them
+        Returns None if there's a pattern without such a prefix
+        """
+        index = self.path_index()
+        candidates: Set[str] = set()
+        for pattern in whitelist:
+            wildcard_pos = min((i for i, c in enumerate(pattern) if c in "*?"),
+                               default=len(pattern))
+            prefix_dir, sep, _ = pattern[:wildcard_pos].rpartition(os.sep)
+            if not sep:
+                return None
+            candidates.update(index.files_under(
+                os.path.normpath(os.path.join(self.root_dir, prefix_dir))))
+        return candidates
+
+    def iter_verify(self, whitelist: Optional[Sequence[str]] = None,
+                    jobs: int = 1,
+                    scheduler: Optional[DeviceScheduler] = None,
+                    quick: bool = False,
+                    budget: Optional[VerifyBudget] = None,
+                    journal: Optional[VerifyJournal] = None,
+                    cancel: Optional[threading.Event] = None) -> Iterator['VerifyResult']:
+        """
+        Verifies the entries like `verify` but yields a VerifyResult for every entry as
+        soon as it's verified (in the order of self.entries) instead of collecting them
+        Outcomes are recorded in `journal` before they're yielded, entries that already
+        have an outcome in it are yielded (in order) with `resumed` set
+        Closing the iterator early stops verifying further entries
+        """
+        if not self.entries:
+            logger.info("There were no hashes to verify!")
+            return
+
+        if budget is not None:
+            budget.start()
+
+        candidates = self._whitelist_candidates(whitelist) if whitelist else None
+        whitelist_set = pattern_set(whitelist) if whitelist else None
+
+        # last item: outcome that was taken from the journal, these entries are passed
+        # through to keep the order
+        Item = Tuple[str, str, 'HashedFile', Optional['VerifyResult']]
+
+        def to_verify() -> Iterator[Item]:
+            for fpath, hashed_file in self.entries.items():
+                if cancel is not None and cancel.is_set():
+                    logger.info("%s: Verify cancelled", self.get_path())
+                    return
+                if candidates is not None and fpath not in candidates:
+                    continue
+                # relative path for reporting and whitelisting
+                # we have to use os.path.relpath even if its slow but replace fails if we have
+                # relpaths that reference files in the pardir or up
+                rel_fpath = os.path.relpath(fpath, start=self.root_dir)
+                if whitelist_set is not None:
+                    # skip file if we have a whitelist and there's no match
+                    if not whitelist_set.matches(rel_fpath):
+                        continue
+                if journal is not None and fpath in journal.outcomes:
+                    kind, failure_type = journal.outcomes[fpath]
+                    yield fpath, rel_fpath, hashed_file, VerifyResult(
+                        fpath, rel_fpath, kind, failure_type, hashed_file.hash_type,
+                        0, 0.0, True)
+                    continue
+                if budget is not None:
+                    if budget.exhausted():
+                        budget.stopped = True
+                        logger.info("%s: Verify budget used up after %d files (%d bytes)",
+                                    self.get_path(), budget.nr_entries, budget.bytes_used)
+                        return
+                    size = hashed_file.size
+                    if size is None:
+                        try:
+                            size = os.stat(fpath).st_size
+                        except OSError:
+                            size = 0
+                    budget.consume(size)
+                yield fpath, rel_fpath, hashed_file, None
+
+        def compute_current(item: Item, prehashed: Optional[bytes] = None,
+                            size: Optional[int] = None) -> Tuple[Optional[bytes], bool, int]:
+            """
+            Returns the current hash (None if missing), whether the size didn't match
+            and the nr of bytes that were hashed
+            `prehashed` has to come with the `size` it passed the pre-check with (if any)
+            """
+            fpath, _, hashed_file, _ = item
+            # cheap pre-check: a file with a different size can't match, so don't read it
+            if prehashed is None and hashed_file.size is not None:
+                try:
+                    size = os.stat(fpath).st_size
+                except FileNotFoundError:
+                    return None, False, 0
+                except OSError:
+                    # let computing the hash report the error
+                    pass
+                else:
+                    if size != hashed_file.size:
+                        return None, True, 0
+            current = prehashed
+            if current is None:
+                current = HashedFile.compute_file_hash_ignore_missing(
+                    fpath, hashed_file.hash_type, size)
+            if current is None:
+                return None, False, 0
+            if size is None:
+                try:
+                    size = os.stat(fpath).st_size
+                except OSError:
+                    size = 0
+            return current, False, size
+
+        def compute_current_batch(
+                batch: List[Item]) -> List[Optional[Tuple[Optional[bytes], bool, int, float]]]:
+            start = time.perf_counter()
+            to_hash = [item for item in batch if item[3] is None]
+            prehashed: Dict[str, bytes] = {}
+            sizes: Dict[str, int] = {}
+            # the process pool does its own batching
+            if len(to_hash) > 1 and _hash_pool is None:
+                by_type: Dict[str, List[str]] = {}
+                for fpath, _, hashed_file, _ in to_hash:
+                    if hashed_file.size is not None:
+                        # same pre-check as compute_current, so files whose size changed
+                        # aren't read; it reports them (and stat errors) on its own
+                        try:
+                            size = os.stat(fpath).st_size
+                        except OSError:
+                            continue
+                        if size != hashed_file.size:
+                            continue
+                        sizes[fpath] = size
+                    by_type.setdefault(hashed_file.hash_type, []).append(fpath)
+                for hash_type, fpaths in by_type.items():
+                    for fpath, digest in zip(fpaths, gen_hashes_from_files(fpaths, hash_type)):
+                        # files that couldn't be read are hashed again to report the error
+                        if digest is not None:
+                            prehashed[fpath] = cast(bytes, digest)
+            results = {item[0]: compute_current(item, prehashed.get(item[0]),
+                                                sizes.get(item[0]))
+                       for item in to_hash}
+            # the files of a batch are hashed together so they get an equal share of the time
+            duration = (time.perf_counter() - start) / max(len(to_hash), 1)
+            return [None if item[3] is not None else (*results[item[0]], duration)
+                    for item in batch]
+
+        def finish(fpath: str, rel_fpath: str, hashed_file: 'HashedFile', kind: str,
+                   failure_type: str = "", bytes_read: int = 0,
+                   duration: float = 0.0) -> 'VerifyResult':
+            if journal is not None:
+                journal.record(fpath, kind, failure_type)
+            return VerifyResult(fpath, rel_fpath, kind, failure_type, hashed_file.hash_type,
+                                bytes_read, duration)
+
+        if quick:
+            start = time.perf_counter()
+            items = list(to_verify())
+            stats = iter(self._quick_stats(
+                [fpath for fpath, _, _, resumed in items if resumed is None],
+                jobs=jobs, scheduler=scheduler))
+            duration = (time.perf_counter() - start) / len(items) if items else 0.0
+            for fpath, rel_fpath, hashed_file, resumed in items:
+                if resumed is not None:
+                    yield resumed
+                    continue
+                stat = next(stats)
+                if stat is None:
+                    logger.warning("%s: MISSING", rel_fpath)
+                    yield finish(fpath, rel_fpath, hashed_file, VerifyJournal.MISSING,
+                                 duration=duration)
+                    continue
+                failure = self._quick_verify_entry(rel_fpath, hashed_file, *stat)
+                if failure is None:
+                    yield finish(fpath, rel_fpath, hashed_file, VerifyJournal.OK,
+                                 duration=duration)
+                else:
+                    yield finish(fpath, rel_fpath, hashed_file, VerifyJournal.FAILED,
+                                 failure[0], duration=duration)
+            return
 
-    def verify(self, whitelist: Optional[Sequence[str]] = None) -> Tuple[List[Tuple[str, str]], List[str], int]:
+        # files that are (according to the recorded size) small are hashed in batches,
+        # resumed entries aren't read at all so they're batched as well
+        for batch, results in imap_ordered(
+                compute_current_batch,
+                batch_small_files(to_verify(),
+                                  lambda item: 0 if item[3] is not None else item[2].size),
+                jobs=jobs, scheduler=scheduler, path_of=lambda batch: batch[0][0]):
+            for (fpath, rel_fpath, hashed_file, resumed), result in zip(batch, results):
+                if resumed is not None:
+                    yield resumed
+                    continue
+                current, size_mismatch, nbytes, duration = cast(
+                    Tuple[Optional[bytes], bool, int, float], result)
+                if size_mismatch:
+                    failure_type, _ = self._verify_failure(
+                        rel_fpath, hashed_file, "SIZE MISMATCH")
+                    yield finish(fpath, rel_fpath, hashed_file, VerifyJournal.FAILED,
+                                 failure_type, duration=duration)
+                elif current is None:
+                    logger.warning("%s: MISSING", rel_fpath)
+                    yield finish(fpath, rel_fpath, hashed_file, VerifyJournal.MISSING,
+                                 duration=duration)
+                elif hashed_file.hash_bytes == current:
+                    logger.info("%s: %s OK", rel_fpath,
+                                hashed_file.hash_type.upper())
+                    yield finish(fpath, rel_fpath, hashed_file, VerifyJournal.OK,
+                                 bytes_read=nbytes, duration=duration)
+                else:
+                    failure_type, _ = self._verify_failure(
+                        rel_fpath, hashed_file, f"{hashed_file.hash_type.upper()} FAILED")
+                    yield finish(fpath, rel_fpath, hashed_file, VerifyJournal.FAILED,
+                                 failure_type, bytes_read=nbytes, duration=duration)
+
+    def verify(self, whitelist: Optional[Sequence[str]] = None,
+               jobs: int = 1,
+               scheduler: Optional[DeviceScheduler] = None,
+               quick: bool = False,
+               budget: Optional[VerifyBudget] = None,
+               journal: Optional[VerifyJournal] = None,
+               on_result: Optional[Callable[[str, str, str], None]] = None,
+               cancel: Optional[threading.Event] = None) -> Tuple[List[Tuple[str, str]], List[str], int]:
+        """
+        Verifies all entries (optionally only the ones matching a pattern in
+        `whitelist`) against the files on disk
+        Files whose size doesn't match the recorded one are reported without hashing them
+        jobs: number of worker threads used for hashing; results are still
+              collected (and logged) in the order of self.entries
+        scheduler: distribute the hashing by device instead (overrides jobs)
+        quick: don't read any files, only check whether they're missing or their
+               size/mtime changed; entries without either are counted as matches
+        budget: stop verifying further entries once the budget is used up
+                (the first `budget.nr_entries` entries were verified)
+        journal: outcomes are recorded in the journal; entries that already have an
+                 outcome in it aren't verified again, but are included in the results
+        on_result: called with (file path, outcome, failure type) for every verified
+                   entry (outcomes: VerifyJournal.OK, FAILED or MISSING)
+        cancel: once it's set no further entries are verified
+        Returns the failed entries as (failure type, rel path), the missing rel paths
+        and the nr of matches; use `iter_verify` to get the results one at a time
+        """
         crc_errors: List[Tuple[str, str]] = []
         missing: List[str] = []
         matches = 0
@@ -1481,50 +3675,24 @@ class ChecksumHelperData:
             logger.info("There were no hashes to verify!")
             return crc_errors, missing, matches
 
-        for fpath, hashed_file in self.entries.items():
-            # relative path for reporting and whitelisting
-            # we have to use os.path.relpath even if its slow but replace fails if we have
-            # relpaths that reference files in the pardir or up
-            rel_fpath = os.path.relpath(fpath, start=self.root_dir)
-            if whitelist:
-                # skip file if we have a whitelist and there's no match
-                if not any(wildcard_match(pattern, rel_fpath) for pattern in whitelist):
-                    continue
-
-            current: Optional[bytes] = HashedFile.compute_file_hash_ignore_missing(
-                fpath, hashed_file.hash_type)
-
-            if current is None:
-                missing.append(rel_fpath)
-                logger.warning("%s: MISSING", rel_fpath)
-            elif hashed_file.hash_bytes == current:
-                matches += 1
-                logger.info("%s: %s OK", rel_fpath,
-                            hashed_file.hash_type.upper())
+        nr_resumed = 0
+        for result in self.iter_verify(whitelist=whitelist, jobs=jobs, scheduler=scheduler,
+                                       quick=quick, budget=budget, journal=journal,
+                                       cancel=cancel):
+            if result.status == VerifyJournal.MISSING:
+                missing.append(result.rel_path)
+            elif result.status == VerifyJournal.FAILED:
+                crc_errors.append((result.failure_type, result.rel_path))
             else:
-                # give more information if we have mtime data
-                if hashed_file.mtime is not None:
-                    current_mtime = cast(
-                        float, hashed_file.fetch_mtime(hashed_file.filename))
-                    if current_mtime > hashed_file.mtime:
-                        logger.warning("%s: %s FAILED -> OUTDATED HASH (file is newer)",
-                                       rel_fpath, hashed_file.hash_type.upper())
-                        crc_errors.append(
-                            ("OUTDATED HASH (file is newer)", rel_fpath))
-                    elif current_mtime == hashed_file.mtime:
-                        logger.error("%s: %s FAILED -> CORRUPTED (same modification time)",
-                                     rel_fpath, hashed_file.hash_type.upper())
-                        crc_errors.append(
-                            ("CORRUPTED (same modification time)", rel_fpath))
-                    else:
-                        logger.warning("%s: %s FAILED -> OUTDATED HASH (file is older)",
-                                       rel_fpath, hashed_file.hash_type.upper())
-                        crc_errors.append(
-                            ("OUTDATED HASH (file is older)", rel_fpath))
-                else:
-                    crc_errors.append(("", rel_fpath))
-                    logger.warning("%s: %s FAILED", rel_fpath,
-                                   hashed_file.hash_type.upper())
+                matches += 1
+            if result.resumed:
+                nr_resumed += 1
+            elif on_result is not None:
+                on_result(result.path, result.status, result.failure_type)
+
+        if nr_resumed:
+            logger.info("%s: Skipped %d files that were already verified according to the journal",
+                        self.get_path(), nr_resumed)
 
         if matches and not crc_errors and not missing:
             logger.info(
@@ -1543,6 +3711,63 @@ class ChecksumHelperData:
                                self.get_path(), len(missing))
         return crc_errors, missing, matches
 
+    def async_verify(self, whitelist: Optional[Sequence[str]] = None,
+                     jobs: int = 1,
+                     scheduler: Optional[DeviceScheduler] = None,
+                     quick: bool = False,
+                     budget: Optional[VerifyBudget] = None,
+                     journal: Optional[VerifyJournal] = None,
+                     executor: Optional[Executor] = None
+                     ) -> 'AsyncRun[Tuple[str, str, str], Tuple[List[Tuple[str, str]], List[str], int]]':
+        """
+        Same as verify but runs on a worker thread of `executor` and streams
+        (file path, outcome, failure type) for every verified entry; the `result` of
+        the returned AsyncRun is the return value of verify
+        """
+        def run(emit: Callable[[Tuple[str, str, str]], None],
+                cancel: threading.Event) -> Tuple[List[Tuple[str, str]], List[str], int]:
+            return self.verify(
+                whitelist=whitelist, jobs=jobs, scheduler=scheduler, quick=quick,
+                budget=budget, journal=journal,
+                on_result=lambda fpath, kind, failure_type: emit((fpath, kind, failure_type)),
+                cancel=cancel)
+        return AsyncRun(run, executor)
+
+    def scrub(self, state: ScrubState, budget: VerifyBudget, min_interval: float = 0,
+              jobs: int = 1,
+              scheduler: Optional[DeviceScheduler] = None) -> Tuple[List[Tuple[str, str]], List[str], int]:
+        """
+        Verifies the entries that were verified the longest time ago (never verified
+        ones first, ties are broken by path) until `budget` is used up and records
+        the time of the verification in `state`
+        min_interval: entries verified less than this many seconds ago are skipped
+        Returns the same as `verify`
+        """
+        now = time.time()
+        due = sorted((fpath for fpath in self.entries
+                      if now - state.last_verified.get(fpath, 0) >= min_interval),
+                     key=lambda fpath: (state.last_verified.get(fpath, 0), fpath))
+        if not due:
+            logger.info("%s: All files were verified in the last %.0f seconds!",
+                        self.get_path(), min_interval)
+            return [], [], 0
+
+        # verify the due entries in the scrub order
+        to_scrub = ChecksumHelperData(self.handling_checksumhelper, self.get_path())
+        to_scrub.entries = {fpath: self.entries[fpath] for fpath in due}
+        result = to_scrub.verify(jobs=jobs, scheduler=scheduler, budget=budget)
+
+        for fpath in due[:budget.nr_entries]:
+            state.last_verified[fpath] = now
+        # forget files that don't have hashes anymore
+        for fpath in [fpath for fpath in state.last_verified if fpath not in self.entries]:
+            del state.last_verified[fpath]
+
+        nr_overdue = len(due) - budget.nr_entries
+        if nr_overdue:
+            logger.info("%s: %d files are still due to be scrubbed", self.get_path(), nr_overdue)
+        return result
+
 
 class ChecksumHelperDataIncremental(ChecksumHelperData):
 
@@ -1589,7 +3814,7 @@ class ChecksumHelperDataIncremental(ChecksumHelperData):
         with open(self.get_path(), "a", encoding=encoding, newline='') as w:
             w.write(serialized)
 
-        self.mtime = HashedFile.fetch_mtime(self.get_path())
+        self.mtime = self.read_mtime()
 
         self.entries.clear()
 
@@ -1608,21 +3833,99 @@ class ChecksumHelperDataIncremental(ChecksumHelperData):
     def filter_deleted_files(self) -> None:
         raise NotImplementedError
 
-    def verify(self, whitelist: Optional[Sequence[str]] = None) -> Tuple[List[Tuple[str, str]], List[str], int]:
+    def iter_verify(self, whitelist: Optional[Sequence[str]] = None,
+                    jobs: int = 1,
+                    scheduler: Optional[DeviceScheduler] = None,
+                    quick: bool = False,
+                    budget: Optional[VerifyBudget] = None,
+                    journal: Optional[VerifyJournal] = None,
+                    cancel: Optional[threading.Event] = None) -> Iterator[VerifyResult]:
         raise NotImplementedError
 
+    def verify(self, whitelist: Optional[Sequence[str]] = None,
+               jobs: int = 1,
+               scheduler: Optional[DeviceScheduler] = None,
+               quick: bool = False,
+               budget: Optional[VerifyBudget] = None,
+               journal: Optional[VerifyJournal] = None,
+               on_result: Optional[Callable[[str, str, str], None]] = None,
+               cancel: Optional[threading.Event] = None) -> Tuple[List[Tuple[str, str]], List[str], int]:
+        raise NotImplementedError
 
-@dataclass
+    def scrub(self, state: ScrubState, budget: VerifyBudget, min_interval: float = 0,
+              jobs: int = 1,
+              scheduler: Optional[DeviceScheduler] = None) -> Tuple[List[Tuple[str, str]], List[str], int]:
+        raise NotImplementedError
+
+
+NS_PER_SEC = 1_000_000_000
+
+
+def mtime_ns_from_str(mtime_str: str) -> int:
+    """
+    Parses an mtime in seconds as it's stored in .cshd files into integer nanoseconds
+    Exact for any number of decimal places up to 9, so it also reads the float
+    seconds written by older versions
+    """
+    if "e" in mtime_str or "E" in mtime_str:
+        # exponent notation can only come from a float repr
+        return int(float(mtime_str) * NS_PER_SEC)
+    negative = mtime_str.startswith("-")
+    secs, _, frac = mtime_str.lstrip("+-").partition(".")
+    ns = int(secs or "0") * NS_PER_SEC + int(frac[:9].ljust(9, "0"))
+    return -ns if negative else ns
+
+
+def mtime_ns_to_str(mtime_ns: int) -> str:
+    """
+    Formats integer nanoseconds as decimal seconds without losing precision
+    Trailing zeros are stripped, so mtimes from filesystems with a coarser
+    resolution look the same as they did with older versions, which also
+    still can read the result as float
+    """
+    secs, ns = divmod(abs(mtime_ns), NS_PER_SEC)
+    frac = f"{ns:09d}".rstrip("0") or "0"
+    return f"{'-' if mtime_ns < 0 else ''}{secs}.{frac}"
+
+
+def mtime_ns_matches(recorded_ns: int, current_ns: int) -> bool:
+    """
+    Whether the recorded mtime matches the current one. Older versions stored
+    `st_mtime` (a float), so the recorded value also matches if it equals the
+    current mtime after going through that float representation
+    """
+    if recorded_ns == current_ns:
+        return True
+    # same computation as os.stat uses for st_mtime
+    secs, ns = divmod(current_ns, NS_PER_SEC)
+    return mtime_ns_from_str(repr(secs + ns * 1e-9)) == recorded_ns
+
+
+# custom __init__ since size needs a default value, which is not possible
+# for dataclass fields when using __slots__
+@dataclass(init=False)
 class HashedFile:
-    __slots__ = ['filename', 'mtime', 'hash_type', 'hash_bytes', 'text_mode']
+    __slots__ = ['filename', 'mtime', 'hash_type', 'hash_bytes', 'text_mode', 'size']
 
     # absolute path!
     filename: str
-    mtime: Optional[float]
+    # in nanoseconds
+    mtime: Optional[int]
     hash_type: str
     hash_bytes: bytes
     # for compatability reasons
     text_mode: bool
+    # size in bytes, None if unknown (e.g. single hash files don't store it)
+    size: Optional[int]
+
+    def __init__(self, filename: str, mtime: Optional[int], hash_type: str,
+                 hash_bytes: bytes, text_mode: bool, size: Optional[int] = None):
+        self.filename = filename
+        self.mtime = mtime
+        self.hash_type = hash_type
+        self.hash_bytes = hash_bytes
+        self.text_mode = text_mode
+        self.size = size
 
     def meta_eql(self, o) -> bool:
         for field in fields(HashedFile):
@@ -1638,35 +3941,60 @@ class HashedFile:
         if self.mtime is None:
             return None
         else:
-            return datetime.datetime.fromtimestamp(self.mtime).isoformat()
+            return datetime.datetime.fromtimestamp(self.mtime / NS_PER_SEC).isoformat()
 
     @staticmethod
-    def fetch_mtime(filename: str) -> Optional[float]:
+    def fetch_stat(filename: str,
+                   entry: Optional[os.DirEntry] = None) -> Optional[os.stat_result]:
+        """Uses the (cached) stat data of `entry` instead of calling os.stat if passed"""
         try:
-            stat = os.stat(filename)
+            return entry.stat() if entry is not None else os.stat(filename)
         except FileNotFoundError:
             logger.warning(
                 "Could not find file '%s' for getting file stats!", filename)
-            result = None
         except PermissionError:
             logger.warning(
                 "Permission to stat the file was denied: %s!", filename)
-            result = None
-        else:
-            result = stat.st_mtime
+        return None
 
-        return result
+    @staticmethod
+    def fetch_mtime(filename: str, entry: Optional[os.DirEntry] = None) -> Optional[int]:
+        """Returns the mtime in nanoseconds"""
+        stat = HashedFile.fetch_stat(filename, entry)
+        return stat.st_mtime_ns if stat is not None else None
 
-    def update_mtime(self) -> None:
-        mb_mtime = HashedFile.fetch_mtime(self.filename)
+    def update_mtime(self, entry: Optional[os.DirEntry] = None) -> None:
+        mb_mtime = HashedFile.fetch_mtime(self.filename, entry)
         if mb_mtime is not None:
             self.mtime = mb_mtime
 
+    def update_fstat(self, entry: Optional[os.DirEntry] = None) -> None:
+        """Updates mtime and size from the file on disk (or the stat data of `entry`)"""
+        stat = HashedFile.fetch_stat(self.filename, entry)
+        if stat is not None:
+            self.mtime = stat.st_mtime_ns
+            self.size = stat.st_size
+
+    @overload
+    @staticmethod
+    def _compute_file_hash(filename: str, hash_type: str, log_missing: bool,
+                           size: Optional[int] = None) -> Optional[bytes]: ...
+
+    @overload
+    @staticmethod
+    def _compute_file_hash(filename: str, hash_type: AbstractSet[str], log_missing: bool,
+                           size: Optional[int] = None) -> Optional[Dict[str, bytes]]: ...
+
     @staticmethod
-    def _compute_file_hash(filename: str, hash_type: str, log_missing: bool) -> Optional[bytes]:
-        result: Optional[bytes] = None
+    def _compute_file_hash(
+            filename: str, hash_type: Union[str, AbstractSet[str]], log_missing: bool,
+            size: Optional[int] = None) -> Union[Optional[bytes], Optional[Dict[str, bytes]]]:
+        # size: size of the file if it's known, so the process pool doesn't stat it again
+        result: Union[Optional[bytes], Optional[Dict[str, bytes]]] = None
+        pool = _hash_pool
         try:
-            result = gen_hash_from_file(filename, hash_type)
+            result = (gen_hash_from_file(filename, hash_type) if pool is None
+                      else pool.hash_file(filename, hash_type, size))
         except PermissionError:
             logger.warning(
                 "Permission to open the file for hashing was denied: %s!", filename)
@@ -1680,23 +4008,404 @@ class HashedFile:
         return result
 
     @staticmethod
-    def compute_file_hash(filename: str, hash_type: str) -> Optional[bytes]:
-        return HashedFile._compute_file_hash(filename, hash_type, True)
+    def compute_file_hash(filename: str, hash_type: str,
+                          size: Optional[int] = None) -> Optional[bytes]:
+        return HashedFile._compute_file_hash(filename, hash_type, True, size)
 
     @staticmethod
-    def compute_file_hash_ignore_missing(filename: str, hash_type: str) -> Optional[bytes]:
-        return HashedFile._compute_file_hash(filename, hash_type, False)
+    def compute_file_hash_ignore_missing(filename: str, hash_type: str,
+                                         size: Optional[int] = None) -> Optional[bytes]:
+        return HashedFile._compute_file_hash(filename, hash_type, False, size)
+
+    @staticmethod
+    def compute_file_hashes(filename: str, hash_types: AbstractSet[str],
+                            size: Optional[int] = None) -> Optional[Dict[str, bytes]]:
+        """Computes the digests of all `hash_types` while reading the file only once"""
+        return HashedFile._compute_file_hash(filename, hash_types, True, size)
+
+    @staticmethod
+    def compute_file_hashes_ignore_missing(
+            filename: str, hash_types: AbstractSet[str],
+            size: Optional[int] = None) -> Optional[Dict[str, bytes]]:
+        return HashedFile._compute_file_hash(filename, hash_types, False, size)
 
     def copy(self) -> 'HashedFile':
         return copy.copy(self)
 
 
+# below this many entries ChecksumHelperData keeps using a dict, since CompactEntries
+# is a lot slower to access and small collections don't use much memory anyway
+COMPACT_ENTRIES_MIN_SIZE = 50_000
+
+
+class CompactEntries(MutableMapping[str, HashedFile]):
+    """
+    Alternative storage for ChecksumHelperData.entries that uses a columnar layout
+    instead of keeping a HashedFile (with its own path str, bytes and int objects)
+    alive per entry: directory prefixes are interned, file names and digests are
+    stored back to back in bytearrays, mtimes and sizes in int64 arrays and hash
+    types as small integer codes; rows are found using an open addressing hash table
+    that's also stored in an array
+
+    Keys have to be normalized absolute paths (same as for the regular dict)
+    Rows of deleted entries and replaced digests are reclaimed by compacting the
+    columns once at least half of them are unused (only when inserting or deleting,
+    so entries can still be replaced while iterating)
+    NOTE: entries have value semantics: looking up an entry creates a new HashedFile,
+          so modifying the returned object does NOT change the stored entry -> store
+          it again using __setitem__/set_entry
+    """
+
+    # stored in the mtime/size columns in place of None
+    _NONE: Final[int] = -(2 ** 63)
+    # markers for slots of the hash table that don't point to a row
+    _EMPTY: Final[int] = -1
+    _DELETED: Final[int] = -2
+    # don't bother compacting if less rows/digest bytes than this are unused
+    _COMPACT_MIN_ROWS: Final[int] = 1024
+    _COMPACT_MIN_BYTES: Final[int] = 64 * 1024
+
+    def __init__(self, entries: Optional[Iterable[Tuple[str, HashedFile]]] = None):
+        self.clear()
+        if entries is not None:
+            for file_path, hashed_file in entries:
+                self[file_path] = hashed_file
+
+    def clear(self) -> None:
+        # dir id -> interned directory path
+        self._dirs: List[str] = []
+        self._dir_ids: Dict[str, int] = {}
+        # hash type code -> hash type name
+        self._hash_types: List[str] = []
+        self._hash_type_codes: Dict[str, int] = {}
+        # hash table slot -> row; size is always a power of two
+        self._slots = array('q', [self._EMPTY]) * 8
+        # slots that are not _EMPTY (including _DELETED ones)
+        self._used_slots = 0
+        # columns, indexed by row; rows of deleted entries stay, but aren't alive
+        self._alive = bytearray()
+        self._hashes = array('q')
+        self._dir_of = array('I')
+        self._name_start = array('Q')
+        self._name_len = array('I')
+        self._names = bytearray()
+        self._hash_type_of = array('B')
+        self._text_mode = bytearray()
+        self._mtimes = array('q')
+        self._sizes = array('q')
+        self._digest_start = array('Q')
+        self._digest_len = array('B')
+        self._digests = bytearray()
+        self._len = 0
+        # rows of deleted entries and bytes of digests that were replaced
+        self._dead_rows = 0
+        self._dead_digest_bytes = 0
+
+    @staticmethod
+    def _encode_name(name: str) -> bytes:
+        # surrogatepass so file names that were decoded using surrogateescape survive
+        return name.encode("utf-8", "surrogatepass")
+
+    def _name(self, row: int) -> str:
+        start = self._name_start[row]
+        return self._names[start:start + self._name_len[row]].decode("utf-8", "surrogatepass")
+
+    def _path(self, row: int) -> str:
+        return os.path.join(self._dirs[self._dir_of[row]], self._name(row))
+
+    def _find(self, dir_id: int, name: bytes, name_hash: int) -> Tuple[int, int]:
+        """
+        Returns the slot and row of the entry or the slot it should be inserted at
+        and _EMPTY as row
+        """
+        slots = self._slots
+        mask = len(slots) - 1
+        i = name_hash & mask
+        free = -1
+        while True:
+            row = slots[i]
+            if row == self._EMPTY:
+                return (i if free == -1 else free), self._EMPTY
+            if row == self._DELETED:
+                if free == -1:
+                    free = i
+            elif (self._hashes[row] == name_hash and self._dir_of[row] == dir_id and
+                    self._names[self._name_start[row]:
+                                self._name_start[row] + self._name_len[row]] == name):
+                return i, row
+            i = (i + 1) & mask
+
+    def _locate(self, file_path: str) -> Optional[Tuple[int, int]]:
+        """Returns the slot and row of file_path or None if there's no entry for it"""
+        dirname, name = os.path.split(file_path)
+        dir_id = self._dir_ids.get(dirname)
+        if dir_id is None:
+            return None
+        slot, row = self._find(dir_id, self._encode_name(name), hash((dir_id, name)))
+        return None if row == self._EMPTY else (slot, row)
+
+    def _grow(self) -> None:
+        # start at a load factor of at most 1/3 (grown again at 2/3)
+        # re-inserting also gets rid of the _DELETED slots
+        capacity = 8
+        while capacity < self._len * 3:
+            capacity *= 2
+        slots = array('q', [self._EMPTY]) * capacity
+        mask = capacity - 1
+        hashes, alive = self._hashes, self._alive
+        for row in range(len(alive)):
+            if alive[row]:
+                i = hashes[row] & mask
+                while slots[i] != self._EMPTY:
+                    i = (i + 1) & mask
+                slots[i] = row
+        self._slots = slots
+        self._used_slots = self._len
+
+    def _needs_compacting(self) -> bool:
+        return ((self._dead_rows >= self._COMPACT_MIN_ROWS and
+                 self._dead_rows * 2 >= len(self._alive)) or
+                (self._dead_digest_bytes >= self._COMPACT_MIN_BYTES and
+                 self._dead_digest_bytes * 2 >= len(self._digests)))
+
+    def _compact(self) -> None:
+        """
+        Drops the rows of deleted entries and the digests that were replaced
+        (keeps the insertion order) and rebuilds the hash table
+        """
+        alive = self._alive
+        rows = [row for row in range(len(alive)) if alive[row]]
+
+        def take(column: array) -> array:
+            return array(column.typecode, (column[row] for row in rows))
+
+        names, name_start, name_len = self._names, self._name_start, self._name_len
+        digests, digest_start, digest_len = self._digests, self._digest_start, self._digest_len
+        new_names = bytearray()
+        new_name_start = array('Q')
+        new_digests = bytearray()
+        new_digest_start = array('Q')
+        for row in rows:
+            start = name_start[row]
+            new_name_start.append(len(new_names))
+            new_names += names[start:start + name_len[row]]
+            start = digest_start[row]
+            new_digest_start.append(len(new_digests))
+            new_digests += digests[start:start + digest_len[row]]
+
+        self._alive = bytearray(b"\x01") * len(rows)
+        self._hashes = take(self._hashes)
+        self._dir_of = take(self._dir_of)
+        self._name_start = new_name_start
+        self._name_len = take(name_len)
+        self._names = new_names
+        self._hash_type_of = take(self._hash_type_of)
+        self._text_mode = bytearray(self._text_mode[row] for row in rows)
+        self._mtimes = take(self._mtimes)
+        self._sizes = take(self._sizes)
+        self._digest_start = new_digest_start
+        self._digest_len = take(digest_len)
+        self._digests = new_digests
+        self._dead_rows = 0
+        self._dead_digest_bytes = 0
+        self._grow()
+
+    def _entry(self, file_path: str, row: int) -> HashedFile:
+        mtime = self._mtimes[row]
+        size = self._sizes[row]
+        start = self._digest_start[row]
+        return HashedFile(
+            file_path, None if mtime == self._NONE else mtime,
+            self._hash_types[self._hash_type_of[row]],
+            bytes(self._digests[start:start + self._digest_len[row]]),
+            bool(self._text_mode[row]), None if size == self._NONE else size)
+
+    def _hash_type_code(self, hash_type: str) -> int:
+        code = self._hash_type_codes.get(hash_type)
+        if code is None:
+            code = len(self._hash_types)
+            self._hash_types.append(hash_type)
+            self._hash_type_codes[hash_type] = code
+        return code
+
+    def __getitem__(self, file_path: str) -> HashedFile:
+        found = self._locate(file_path)
+        if found is None:
+            raise KeyError(file_path)
+        return self._entry(file_path, found[1])
+
+    def __setitem__(self, file_path: str, hashed_file: HashedFile) -> None:
+        digest = hashed_file.hash_bytes
+        mtime = self._NONE if hashed_file.mtime is None else hashed_file.mtime
+        size = self._NONE if hashed_file.size is None else hashed_file.size
+        hash_type = self._hash_type_code(hashed_file.hash_type)
+
+        dirname, name = os.path.split(file_path)
+        dir_id = self._dir_ids.get(dirname)
+        if dir_id is None:
+            dir_id = len(self._dirs)
+            self._dirs.append(dirname)
+            self._dir_ids[dirname] = dir_id
+        encoded = self._encode_name(name)
+        name_hash = hash((dir_id, name))
+        slot, row = self._find(dir_id, encoded, name_hash)
+
+        if row == self._EMPTY:
+            row = len(self._alive)
+            if self._slots[slot] == self._EMPTY:
+                self._used_slots += 1
+            self._slots[slot] = row
+            self._alive.append(1)
+            self._hashes.append(name_hash)
+            self._dir_of.append(dir_id)
+            self._name_start.append(len(self._names))
+            self._name_len.append(len(encoded))
+            self._names += encoded
+            self._hash_type_of.append(hash_type)
+            self._text_mode.append(hashed_file.text_mode)
+            self._mtimes.append(mtime)
+            self._sizes.append(size)
+            self._digest_start.append(len(self._digests))
+            self._digest_len.append(len(digest))
+            self._digests += digest
+            self._len += 1
+            if self._needs_compacting():
+                self._compact()
+            elif self._used_slots * 3 >= len(self._slots) * 2:
+                self._grow()
+            return
+
+        self._hash_type_of[row] = hash_type
+        self._text_mode[row] = hashed_file.text_mode
+        self._mtimes[row] = mtime
+        self._sizes[row] = size
+        if len(digest) == self._digest_len[row]:
+            start = self._digest_start[row]
+            self._digests[start:start + len(digest)] = digest
+        else:
+            # different hash type -> append it, the old digest stays unused in the buffer
+            # until the next compaction
+            self._dead_digest_bytes += self._digest_len[row]
+            self._digest_start[row] = len(self._digests)
+            self._digest_len[row] = len(digest)
+            self._digests += digest
+
+    def __delitem__(self, file_path: str) -> None:
+        found = self._locate(file_path)
+        if found is None:
+            raise KeyError(file_path)
+        slot, row = found
+        self._slots[slot] = self._DELETED
+        # the columns of the row are left as they are, it's just skipped when iterating
+        self._alive[row] = 0
+        self._len -= 1
+        self._dead_rows += 1
+        self._dead_digest_bytes += self._digest_len[row]
+        if self._needs_compacting():
+            self._compact()
+
+    def __contains__(self, file_path: object) -> bool:
+        return isinstance(file_path, str) and self._locate(file_path) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for _, file_path in self._iter_rows():
+            yield file_path
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _iter_rows(self) -> Iterator[Tuple[int, str]]:
+        # entries are iterated in insertion order, same as with a dict
+        alive = self._alive
+        for row in range(len(alive)):
+            if alive[row]:
+                yield row, self._path(row)
+
+    def items(self) -> '_CompactEntriesItemsView':
+        return _CompactEntriesItemsView(self)
+
+    def values(self) -> '_CompactEntriesValuesView':
+        return _CompactEntriesValuesView(self)
+
+
+class _CompactEntriesItemsView(ItemsView):
+    # only overwritten so the entry doesn't have to be looked up again for every key
+    _mapping: CompactEntries
+
+    def __iter__(self) -> Iterator[Tuple[str, HashedFile]]:
+        entries = self._mapping
+        for row, file_path in entries._iter_rows():
+            yield file_path, entries._entry(file_path, row)
+
+
+class _CompactEntriesValuesView(ValuesView):
+    _mapping: CompactEntries
+
+    def __iter__(self) -> Iterator[HashedFile]:
+        entries = self._mapping
+        for row, file_path in entries._iter_rows():
+            yield entries._entry(file_path, row)
+
+
+def _device_jobs_arg(value: str) -> Tuple[str, int]:
+    try:
+        path, jobs = value.rsplit("=", 1)
+        return path, int(jobs)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Expected PATH=N (e.g. /mnt/hdd=1) got '{value}'")
+
+
+DURATION_SUFFIXES = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _size_arg(value: str) -> int:
+    try:
+        return parse_size(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Expected a size like 4096, 500M or 1.5T got '{value}'")
+
+
+def _duration_arg(value: str) -> float:
+    """Parses durations in seconds like 3600, 90m or 2h"""
+    number, suffix = value, ""
+    if value and value[-1] in DURATION_SUFFIXES:
+        number, suffix = value[:-1], value[-1]
+    try:
+        return float(number) * DURATION_SUFFIXES[suffix]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Expected a duration like 3600, 90m or 2h got '{value}'")
+
+
+def _scheduler_from_args(args: argparse.Namespace) -> Optional[DeviceScheduler]:
+    # None -> option wasn't passed, empty list -> only group by device
+    if args.device_jobs is None:
+        return None
+    return DeviceScheduler(default_jobs=args.jobs, device_jobs=dict(args.device_jobs))
+
+
+def _hash_jobs_from_args(args: argparse.Namespace) -> int:
+    """
+    Number of hashing threads (not used when there's a DeviceScheduler, so the
+    per-device jobs still limit the concurrent reads)
+    With a process pool the threads only wait for the processes, so there have to
+    be enough of them to fill up the batches
+    """
+    if _hash_pool is None:
+        return args.jobs
+    return max(args.jobs, _hash_pool.processes * _hash_pool.batch_size)
+
+
 def _cl_check_missing(args: argparse.Namespace) -> None:
     c = ChecksumHelper(args.path,
                        hash_filename_filter=args.hash_filename_filter)
     print("ATTENTION! By default ChecksumHelper finds all checksum files in "
           "sub-folders, if you want to limit the depth use the parameter -d")
     c.options["discover_hash_files_depth"] = args.discover_hash_files_depth
+    c.options["walk_jobs"] = args.walk_jobs
+    c.options["walk_ordered"] = not args.walk_unordered
     c.check_missing_files()
 
 
@@ -1706,51 +4415,66 @@ def _cl_incremental(args: argparse.Namespace):
                        log_path=args.log)
     c.options["include_unchanged_files_incremental"] = not args.dont_include_unchanged
     c.options["discover_hash_files_depth"] = args.discover_hash_files_depth
+    c.options["walk_jobs"] = args.walk_jobs
+    c.options["walk_ordered"] = not args.walk_unordered
     c.options['incremental_skip_unchanged'] = args.skip_unchanged
     c.options['incremental_collect_fstat'] = not args.dont_collect_mtime
+    c.options["single_walk"] = args.single_walk
+    if args.stat_cache:
+        c.stat_cache = StatCache(args.stat_cache)
 
-    if args.most_current_hash_file:
-        c.most_current_from_file(args.most_current_hash_file)
-
-    if args.per_directory:
-        incremental = c.do_incremental_checksums(
-            args.hash_algorithm,
-            single_hash=args.single_hash,
-            root_only=True,
-            whitelist=args.whitelist,
-            blacklist=args.blacklist,
-            only_missing=args.only_missing,
-            incremental_writes=args.incremental_writes)
-        if incremental is not None:
-            incremental.write()
-
-        for dp in os.listdir(args.path):
-            if not os.path.isdir(os.path.join(args.path, dp)):
-                continue
-
-            dirpath = dp + os.sep
-            if not include_path(dirpath, args.whitelist, args.blacklist):
-                continue
+    # close the cache on errors as well, so the digests stored so far are committed
+    try:
+        if args.most_current_hash_file:
+            c.most_current_from_file(args.most_current_hash_file)
 
+        scheduler = _scheduler_from_args(args)
+        if args.per_directory:
             incremental = c.do_incremental_checksums(
                 args.hash_algorithm,
                 single_hash=args.single_hash,
-                start_path=os.path.abspath(os.path.join(args.path, dp)),
+                root_only=True,
                 whitelist=args.whitelist,
                 blacklist=args.blacklist,
                 only_missing=args.only_missing,
-                incremental_writes=args.incremental_writes)
+                incremental_writes=args.incremental_writes,
+                jobs=_hash_jobs_from_args(args), scheduler=scheduler)
             if incremental is not None:
                 incremental.write()
-    else:
-        incremental = c.do_incremental_checksums(args.hash_algorithm, single_hash=args.single_hash,
-                                                 whitelist=args.whitelist, blacklist=args.blacklist,
-                                                 only_missing=args.only_missing,
-                                                 incremental_writes=args.incremental_writes)
-        if incremental is not None:
-            if args.out_filename:
-                incremental.relocate(args.out_filename)
-            incremental.write()
+
+            for dp in os.listdir(args.path):
+                if not os.path.isdir(os.path.join(args.path, dp)):
+                    continue
+
+                dirpath = dp + os.sep
+                if not include_path(dirpath, args.whitelist, args.blacklist):
+                    continue
+
+                incremental = c.do_incremental_checksums(
+                    args.hash_algorithm,
+                    single_hash=args.single_hash,
+                    start_path=os.path.abspath(os.path.join(args.path, dp)),
+                    whitelist=args.whitelist,
+                    blacklist=args.blacklist,
+                    only_missing=args.only_missing,
+                    incremental_writes=args.incremental_writes,
+                    jobs=_hash_jobs_from_args(args), scheduler=scheduler)
+                if incremental is not None:
+                    incremental.write()
+        else:
+            incremental = c.do_incremental_checksums(
+                args.hash_algorithm, single_hash=args.single_hash,
+                whitelist=args.whitelist, blacklist=args.blacklist,
+                only_missing=args.only_missing,
+                incremental_writes=args.incremental_writes,
+                jobs=_hash_jobs_from_args(args), scheduler=scheduler)
+            if incremental is not None:
+                if args.out_filename:
+                    incremental.relocate(args.out_filename)
+                incremental.write()
+    finally:
+        if c.stat_cache is not None:
+            c.stat_cache.close()
 
 
 def _cl_gen_missing(args: argparse.Namespace):
@@ -1758,23 +4482,37 @@ def _cl_gen_missing(args: argparse.Namespace):
                        hash_filename_filter=args.hash_filename_filter,
                        log_path=args.log)
     c.options["discover_hash_files_depth"] = args.discover_hash_files_depth
+    c.options["walk_jobs"] = args.walk_jobs
+    c.options["walk_ordered"] = not args.walk_unordered
     c.options['incremental_collect_fstat'] = not args.dont_collect_mtime
-
-    if args.most_current_hash_file:
-        c.most_current_from_file(args.most_current_hash_file)
-
-    gen_missing = c.gen_missing_checksums(args.hash_algorithm, single_hash=args.single_hash,
-                                          whitelist=args.whitelist, blacklist=args.blacklist)
-    if gen_missing is not None:
-        if args.out_filename:
-            gen_missing.relocate(args.out_filename)
-        gen_missing.write()
+    c.options["single_walk"] = args.single_walk
+    if args.stat_cache:
+        c.stat_cache = StatCache(args.stat_cache)
+
+    # close the cache on errors as well, so the digests stored so far are committed
+    try:
+        if args.most_current_hash_file:
+            c.most_current_from_file(args.most_current_hash_file)
+
+        gen_missing = c.gen_missing_checksums(args.hash_algorithm, single_hash=args.single_hash,
+                                              whitelist=args.whitelist, blacklist=args.blacklist,
+                                              jobs=_hash_jobs_from_args(args),
+                                              scheduler=_scheduler_from_args(args))
+        if gen_missing is not None:
+            if args.out_filename:
+                gen_missing.relocate(args.out_filename)
+            gen_missing.write()
+    finally:
+        if c.stat_cache is not None:
+            c.stat_cache.close()
 
 
 def _cl_build_most_current(args: argparse.Namespace) -> None:
     c = ChecksumHelper(args.path,
                        hash_filename_filter=args.hash_filename_filter)
     c.options["discover_hash_files_depth"] = args.discover_hash_files_depth
+    c.options["walk_jobs"] = args.walk_jobs
+    c.options["walk_ordered"] = not args.walk_unordered
     c.build_most_current()
     if c.hash_file_most_current:
         if not args.dont_filter_deleted:
@@ -1798,28 +4536,62 @@ def _cl_move(args: argparse.Namespace) -> None:
     c = ChecksumHelper(
         args.root_dir, hash_filename_filter=args.hash_filename_filter)
     c.options["discover_hash_files_depth"] = args.discover_hash_files_depth
+    c.options["walk_jobs"] = args.walk_jobs
+    c.options["walk_ordered"] = not args.walk_unordered
     c.move_files(args.source_path, args.mv_path)
 
 
+def _verify_budget_from_args(args: argparse.Namespace) -> Optional[VerifyBudget]:
+    if args.max_bytes is None and args.max_duration is None:
+        return None
+    return VerifyBudget(max_bytes=args.max_bytes, max_seconds=args.max_duration)
+
+
+def _verify_journal_from_args(args: argparse.Namespace) -> Optional[VerifyJournal]:
+    if args.journal is None:
+        return None
+    return VerifyJournal(args.journal, resume=args.resume)
+
+
+def _finish_verify_journal(journal: Optional[VerifyJournal],
+                           budget: Optional[VerifyBudget]) -> None:
+    if journal is None:
+        return
+    journal.close()
+    if budget is not None and budget.stopped:
+        logger.info("Verify was stopped early, continue it with: --journal %s --resume",
+                    journal.path)
+    else:
+        # everything was verified -> a resume would skip all files
+        os.remove(journal.path)
+
+
 def _cl_verify_all(args: argparse.Namespace) -> Tuple[int, int, int, int]:
     files_total = 0
     all_missing = []
     all_failed_checksums = []
+    budget = _verify_budget_from_args(args)
+    journal = _verify_journal_from_args(args)
     # verify all found hashes of discovered hash files for all supplied paths
     for root_p in args.root_dir:
         c = ChecksumHelper(
             root_p, hash_filename_filter=args.hash_filename_filter)
         c.options["discover_hash_files_depth"] = args.discover_hash_files_depth
+        c.options["walk_jobs"] = args.walk_jobs
+        c.options["walk_ordered"] = not args.walk_unordered
         c.build_most_current()
         # hash_file_most_current can either be of type HashFile or MixedAlgoHashCollection
         crc_errors, missing, matches = cast(ChecksumHelperData,
-                                            c.hash_file_most_current).verify()
+                                            c.hash_file_most_current).verify(
+                                                jobs=_hash_jobs_from_args(args),
+                                                scheduler=_scheduler_from_args(args),
+                                                quick=args.quick, budget=budget, journal=journal)
         all_missing.append((root_p, missing))
         all_failed_checksums.append((root_p, crc_errors))
-        files_total += len(
-            cast(ChecksumHelperData,
-                 c.hash_file_most_current).entries)
+        # not len(entries) since a budget might have stopped the verify early
+        files_total += len(crc_errors) + len(missing) + matches
 
+    _finish_verify_journal(journal, budget)
     logger.info("Verified folders: %s", ", ".join(args.root_dir))
     log_summary(files_total, all_missing, all_failed_checksums)
 
@@ -1833,15 +4605,21 @@ def _cl_verify_hfile(args: argparse.Namespace) -> Tuple[int, int, int, int]:
     files_total = 0
     all_missing = []
     all_failed_checksums = []
+    budget = _verify_budget_from_args(args)
+    journal = _verify_journal_from_args(args)
     for hash_file in args.hash_file_name:
         cshd = ChecksumHelperData(None, hash_file)
         cshd.read()
-        crc_errors, missing, matches = cshd.verify()
+        crc_errors, missing, matches = cshd.verify(
+            jobs=_hash_jobs_from_args(args), scheduler=_scheduler_from_args(args),
+            quick=args.quick, budget=budget, journal=journal)
         all_missing.append((cshd.root_dir, missing))
         all_failed_checksums.append((cshd.root_dir, crc_errors))
 
-        files_total += len(cshd.entries)
+        # not len(entries) since a budget might have stopped the verify early
+        files_total += len(crc_errors) + len(missing) + matches
 
+    _finish_verify_journal(journal, budget)
     logger.info("Verified hash file(s): %s", ", ".join(args.hash_file_name))
     log_summary(files_total, all_missing, all_failed_checksums)
 
@@ -1897,12 +4675,19 @@ def _cl_verify_filter(args: argparse.Namespace) -> None:
     c = ChecksumHelper(
         args.root_dir, hash_filename_filter=args.hash_filename_filter)
     c.options["discover_hash_files_depth"] = args.discover_hash_files_depth
+    c.options["walk_jobs"] = args.walk_jobs
+    c.options["walk_ordered"] = not args.walk_unordered
     c.build_most_current()
     # so windows users can use both /  and \ (unix doesn't have os.altsep)
     filter_unified = [x.replace(os.altsep, os.sep)
                       for x in args.filter] if os.sep == '\\' else args.filter
     current_hf = cast(ChecksumHelperData, c.hash_file_most_current)
-    crc_errors, missing, matches = current_hf.verify(whitelist=filter_unified)
+    budget = _verify_budget_from_args(args)
+    journal = _verify_journal_from_args(args)
+    crc_errors, missing, matches = current_hf.verify(
+        whitelist=filter_unified, jobs=_hash_jobs_from_args(args),
+        scheduler=_scheduler_from_args(args), quick=args.quick, budget=budget, journal=journal)
+    _finish_verify_journal(journal, budget)
 
     # calculate total files since current_hf will have all the entries and not just
     # the filtered ones we're checking!
@@ -1913,6 +4698,32 @@ def _cl_verify_filter(args: argparse.Namespace) -> None:
         files_total, [(args.root_dir, missing)], [(args.root_dir, crc_errors)])
 
 
+def _cl_verify_scrub(args: argparse.Namespace) -> Tuple[int, int, int, int]:
+    c = ChecksumHelper(
+        args.root_dir, hash_filename_filter=args.hash_filename_filter)
+    c.options["discover_hash_files_depth"] = args.discover_hash_files_depth
+    c.options["walk_jobs"] = args.walk_jobs
+    c.options["walk_ordered"] = not args.walk_unordered
+    c.build_most_current()
+    current_hf = cast(ChecksumHelperData, c.hash_file_most_current)
+
+    state = ScrubState(args.state_file if args.state_file else
+                       os.path.join(c.root_dir, SCRUB_STATE_FILENAME))
+    state.read()
+    budget = VerifyBudget(max_bytes=args.max_bytes, max_seconds=args.max_duration)
+    crc_errors, missing, matches = current_hf.scrub(
+        state, budget, min_interval=args.interval * 86400,
+        jobs=_hash_jobs_from_args(args), scheduler=_scheduler_from_args(args))
+    state.write()
+
+    files_total = len(crc_errors) + len(missing) + matches
+    logger.info("Scrubbed %d of %d files in: %s", files_total, len(current_hf.entries),
+                args.root_dir)
+    log_summary(
+        files_total, [(args.root_dir, missing)], [(args.root_dir, crc_errors)])
+    return files_total, matches, len(missing), len(crc_errors)
+
+
 class SmartFormatter(argparse.HelpFormatter):
     """Smart formatter that uses the RawTextFormatter if the help text begins with 'R|'
        src: https://stackoverflow.com/a/22157136 by Anthon"""
@@ -1992,6 +4803,14 @@ def main():
                                help="R|Number of subdirs to descend down to search for hash files:\n"
                                     " 0 -> root dir only\n-1 -> max depth\nDefault: -1",
                                metavar="DEPTH")
+    parent_parser.add_argument("--walk-jobs", type=int, default=1, metavar="N",
+                               help="Number of threads listing directories while walking the "
+                                    "tree (default: 1), speeds up walking very wide trees "
+                                    "on network shares")
+    parent_parser.add_argument("--walk-unordered", action="store_true", default=False,
+                               help="Process directories in the order they were listed when "
+                                    "using --walk-jobs instead of the (deterministic) "
+                                    "os.walk order")
     parent_parser.add_argument("-v", "--verbosity", action="count", default=0,
                                help="increase output verbosity")
     parent_parser.add_argument("--log", default=None, metavar="LOGPATH",
@@ -2001,7 +4820,49 @@ def main():
                                help="Log levels (from most verbose to least verbose: debug, "
                                     "extraverbose, verbose, info, warning, error")
 
-    incremental = subparsers.add_parser("incremental", aliases=["inc"], parents=[parent_parser],
+    # options controlling how files are hashed, used by all subcommands that hash files
+    hashing_parent = argparse.ArgumentParser(add_help=False)
+    hashing_parent.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                                help="Number of files that are hashed in parallel (default: 1). "
+                                     "When used with --device-jobs: number of files hashed "
+                                     "in parallel per device")
+    hashing_parent.add_argument("--device-jobs", nargs="*", metavar="PATH=N", default=None,
+                                type=_device_jobs_arg,
+                                help="Schedule hashing per device (files are grouped by the device "
+                                     "they're stored on) so multiple disks are read simultaneously. "
+                                     "Optionally takes PATH=N pairs that declare that files "
+                                     "under PATH are on their own device which is read by N "
+                                     "jobs (e.g. /mnt/hdd=1 /mnt/ssd=8)")
+    hashing_parent.add_argument("--processes", type=int, default=None, metavar="N",
+                                help="Compute the digests on N worker processes (0: one per CPU) "
+                                     "instead of threads, for hash algorithms that don't "
+                                     "release the GIL or trees with many tiny files. Small files "
+                                     "are sent to the processes in batches, so --jobs is "
+                                     "raised to at least 32 * N")
+    hashing_parent.add_argument("--io-rate", type=_size_arg, default=None, metavar="SIZE",
+                                help="Limit reading files to SIZE bytes per second (e.g. 50M) "
+                                     "to protect other workloads on the same disks")
+    hashing_parent.add_argument("--io-ops", type=int, default=None, metavar="N",
+                                help="Limit reading files to N read calls per second")
+    hashing_parent.add_argument("--io-control-file", type=str, default=None, metavar="PATH",
+                                help="Change the I/O limits while running by writing "
+                                     "'RATE [OPS]' to PATH (e.g. '50M 200'; 0 disables a limit, "
+                                     "the OPS limit stays the same if it's omitted)")
+    # only for subcommands that generate hashes
+    hash_cache_parent = argparse.ArgumentParser(add_help=False)
+    hash_cache_parent.add_argument("--stat-cache", type=str, metavar="CACHE_PATH", default=None,
+                                   help="Path to a persistent cache of file digests (created if "
+                                        "missing). Files whose size, mtime, inode and device "
+                                        "didn't change since they were cached won't be re-read. "
+                                        "Like --skip-unchanged this trusts the file metadata!")
+    hash_cache_parent.add_argument("--single-walk", action="store_true", default=False,
+                                   help="Walk the tree only once and re-use the directory "
+                                        "listings for discovering hash files, checking for "
+                                        "missing files and hashing. Keeps the listings of "
+                                        "the whole tree in memory!")
+
+    incremental = subparsers.add_parser("incremental", aliases=["inc"],
+                                        parents=[parent_parser, hashing_parent, hash_cache_parent],
                                         help="Discover hash files in subdirectories and verify"
                                              " found hashes and creating new hashes for new "
                                              "files! (So not truly incremental). ATTENTION: All "
@@ -2115,12 +4976,30 @@ def main():
     # ------------ VERIFY SUBPARSER ----------------
     verify = subparsers.add_parser("verify", aliases=["vf"], parents=[parent_parser],
                                    help="Commands for verifying operations")
+    verify_parent = argparse.ArgumentParser(add_help=False)
+    verify_parent.add_argument("--quick", action="store_true",
+                               help="Don't read the files, only report files that are missing "
+                                    "or whose size or modification time changed. "
+                                    "Does NOT detect corrupted files!")
+    verify_parent.add_argument("--max-bytes", type=_size_arg, default=None, metavar="SIZE",
+                               help="Stop once SIZE bytes (e.g. 500G) were read")
+    verify_parent.add_argument("--max-duration", type=_duration_arg, default=None,
+                               metavar="DURATION",
+                               help="Stop starting to verify files after DURATION (e.g. 90m, 2h)")
+    verify_parent.add_argument("--journal", type=str, default=None, metavar="JOURNAL_PATH",
+                               help="Record the outcome of every verified file in JOURNAL_PATH "
+                                    "as soon as it's known, so the verify can be continued using "
+                                    "--resume if it's stopped or killed. The journal is removed "
+                                    "once all files were verified")
+    verify_parent.add_argument("--resume", action="store_true",
+                               help="Skip the files that were already verified according to "
+                                    "--journal (their outcomes are still included in the summary)")
     # add subparser for verify modes since we can't combine all the modes in one command
     # without confusion
     verify_subcmds = verify.add_subparsers(title='verify',
                                            description='Commands for verfying operations',
                                            dest="verisubcmd")
-    verify_all = verify_subcmds.add_parser("all", aliases=(),
+    verify_all = verify_subcmds.add_parser("all", aliases=(), parents=[hashing_parent, verify_parent],
                                            help="Discover all hash files and verify the most "
                                                 "up-to-date file hashes found for given "
                                                 "directories")
@@ -2129,13 +5008,13 @@ def main():
     # set func to call when subcommand is used
     verify_all.set_defaults(func=_cl_verify_all)
 
-    verify_hfile = verify_subcmds.add_parser("hash_file", aliases=('hf',),
+    verify_hfile = verify_subcmds.add_parser("hash_file", aliases=('hf',), parents=[hashing_parent, verify_parent],
                                              help="Verify all files in the specified hash files")
     verify_hfile.add_argument("hash_file_name", type=str, nargs='+',
                               help="Path to hash file(s)")
     verify_hfile.set_defaults(func=_cl_verify_hfile)
 
-    verify_filter = verify_subcmds.add_parser("filter", aliases=('f',),
+    verify_filter = verify_subcmds.add_parser("filter", aliases=('f',), parents=[hashing_parent, verify_parent],
                                               help="Verify all files that match one of the"
                                                    " supplied filters")
     verify_filter.add_argument("root_dir", type=str,
@@ -2145,10 +5024,30 @@ def main():
                                help="Wildcard filters that should be matched against files to "
                                     "verify: ? matches any one char, * matches 0 or more chars")
     verify_filter.set_defaults(func=_cl_verify_filter)
+
+    verify_scrub = verify_subcmds.add_parser("scrub", aliases=(), parents=[hashing_parent],
+                                             help="Verify the files that were verified the "
+                                                  "longest time ago until a budget is used up, "
+                                                  "so repeated runs eventually verify all files")
+    verify_scrub.add_argument("root_dir", type=str,
+                              help="Root directory where we look for hash files in "
+                                   "subdirectories")
+    verify_scrub.add_argument("--state-file", type=str, default=None,
+                              help="File that records when files were verified last "
+                                   f"(default: ROOT_DIR/{SCRUB_STATE_FILENAME})")
+    verify_scrub.add_argument("--max-bytes", type=_size_arg, default=None, metavar="SIZE",
+                              help="Stop once SIZE bytes (e.g. 500G) were read")
+    verify_scrub.add_argument("--max-duration", type=_duration_arg, default=None,
+                              metavar="DURATION",
+                              help="Stop starting to verify files after DURATION (e.g. 90m, 2h)")
+    verify_scrub.add_argument("--interval", type=float, default=0, metavar="DAYS",
+                              help="Skip files that were verified less than DAYS ago")
+    verify_scrub.set_defaults(func=_cl_verify_scrub)
     # ------------ END OF VERIFY SUBPARSER ----------------
 
     # ------------ MISSING SUBPARSER ----------------
-    gen_missing = subparsers.add_parser("gen_missing", parents=[parent_parser],
+    gen_missing = subparsers.add_parser("gen_missing",
+                                        parents=[parent_parser, hashing_parent, hash_cache_parent],
                                         help="Discover hash files in subdirectories and "
                                              "generate checksums for just the files that don't have "
                                              "a checksum yet.",
@@ -2187,6 +5086,9 @@ def main():
     # ------------ END OF MISSING SUBPARSER ----------------
 
     args = parser.parse_args()
+    # only the verify subcommands have --resume
+    if getattr(args, "resume", False) and not args.journal:
+        parser.error("--resume requires a --journal to resume from")
     if len(sys.argv) == 1:
         # default to stdout, but stderr would be better (use sys.stderr, then exit(1))
         parser.print_help()
@@ -2251,6 +5153,9 @@ def main():
     elif args.verbosity >= 2:
         stdohandler.setLevel(LOG_LVL_EXTRAVERBOSE)
 
+    if hasattr(args, "io_rate") and (args.io_rate or args.io_ops or args.io_control_file):
+        set_io_throttle(IOThrottle(args.io_rate, args.io_ops, args.io_control_file))
+
     if hasattr(args, "whitelist") and os.sep == '\\':
         # so windows users can use both /  and \ (unix doesn't have os.altsep)
         args.whitelist = ([pat.replace(os.altsep, os.sep) for pat in args.whitelist]
@@ -2258,7 +5163,17 @@ def main():
         args.blacklist = ([pat.replace(os.altsep, os.sep) for pat in args.blacklist]
                           if args.blacklist else None)
 
-    args.func(args)
+    pool: Optional[ProcessHashPool] = None
+    if getattr(args, "processes", None) is not None:
+        pool = ProcessHashPool(args.processes or None)
+        set_hash_pool(pool)
+
+    try:
+        args.func(args)
+    finally:
+        if pool is not None:
+            set_hash_pool(None)
+            pool.close()
 
 
 if __name__ == "__main__":
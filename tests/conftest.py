@@ -3,6 +3,8 @@ import pytest
 
 from utils import TESTS_DIR
 
+from checksum_helper.checksum_helper import mtime_ns_from_str
+
 @pytest.fixture(scope="session", autouse=True)
 def set_mtimes():
     # since some tests (mostly verify, most_current and incremental) require
@@ -14,5 +16,7 @@ def set_mtimes():
 
     for ln in lines:
         mtime_str, relpath = ln.strip().split(" ", 1)
-        mtime = float(mtime_str)
-        os.utime(os.path.join(TESTS_DIR, relpath), times=(mtime, mtime))
+        # set the exact nanoseconds, otherwise the result of converting the float
+        # depends on the platform's timestamp resolution
+        mtime = mtime_ns_from_str(mtime_str)
+        os.utime(os.path.join(TESTS_DIR, relpath), ns=(mtime, mtime))
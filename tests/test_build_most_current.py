@@ -4,7 +4,10 @@ import pytest
 import time
 
 from utils import TESTS_DIR, setup_tmpdir_param, read_file, write_file_str, Args
-from checksum_helper.checksum_helper import ChecksumHelper, ChecksumHelperData, _cl_build_most_current
+from checksum_helper.checksum_helper import (
+    ChecksumHelper, ChecksumHelperData, CompactEntries, _cl_build_most_current
+)
+from checksum_helper import checksum_helper
 
 
 @pytest.fixture
@@ -103,3 +106,21 @@ def test_all_paths_normpath():
         # make sure all paths are properly normalized so we dont have get sth like this:
         # C://test//abc//123//..//.//file.txt
         assert all(p == os.path.normpath(p) for p in hf.entries.keys())
+
+
+def test_build_most_current_compact_entries(setup_dir_to_checksum, monkeypatch):
+    root_dir = setup_dir_to_checksum
+    monkeypatch.setattr(checksum_helper, "COMPACT_ENTRIES_MIN_SIZE", 1)
+    shutil.copy2(os.path.join(TESTS_DIR, "test_build_most_current_files", "pre-existing.cshd"),
+                 root_dir)
+
+    c = ChecksumHelper(root_dir)
+    c.build_most_current()
+    compact = ChecksumHelper(root_dir)
+    compact.options["compact_entries"] = True
+    compact.build_most_current()
+
+    assert isinstance(compact.hash_file_most_current.entries, CompactEntries)
+    assert len(compact.hash_file_most_current) == len(c.hash_file_most_current)
+    assert list(compact.hash_file_most_current.entries.items()) == \
+        list(c.hash_file_most_current.entries.items())
@@ -54,6 +54,207 @@ def test_cshd_handles_empty_lines(setup_tmpdir_param):
     assert cshd.get_entry(os.path.join(tmpdir, 'goo.mp4'))
 
 
+def test_cshd_size_field(setup_tmpdir_param):
+    tmpdir = setup_tmpdir_param
+    cshd_path = os.path.join(tmpdir, "foo.cshd")
+
+    with open(cshd_path, 'w', encoding='utf-8') as f:
+        f.write(
+"""1337.1337,42,md5,deadbeef foo/bar/baz/xer.txt
+1337.1337,md5,abcdef goo.mp4
+,7,md5,abcdef no_mtime.txt
+""")
+
+    cshd = ch.ChecksumHelperData(None, cshd_path)
+    cshd.read()
+    assert len(cshd) == 3
+    with_size = cshd.get_entry(os.path.join(tmpdir, 'foo/bar/baz/xer.txt'))
+    assert with_size.size == 42
+    assert with_size.hash_type == "md5"
+    assert cshd.get_entry(os.path.join(tmpdir, 'goo.mp4')).size is None
+    no_mtime = cshd.get_entry(os.path.join(tmpdir, 'no_mtime.txt'))
+    assert no_mtime.mtime is None
+    assert no_mtime.size == 7
+
+    assert cshd.write(force=True)
+    with open(cshd_path, 'r', encoding='utf-8-sig') as f:
+        written = sorted(f.read().splitlines())
+    # entries without a size are written in the old format
+    assert written == [
+        ",7,md5,abcdef no_mtime.txt",
+        "1337.1337,42,md5,deadbeef foo/bar/baz/xer.txt",
+        "1337.1337,md5,abcdef goo.mp4",
+    ]
+
+
+def test_compact_entries_mapping():
+    entries = ch.CompactEntries()
+    expected = {}
+    for fpath, hf in [
+            (os.path.join(os.sep, "foo", "bar.txt"),
+             ch.HashedFile("", 1337_133700000, "md5", b"\xde\xad", False, 42)),
+            (os.path.join(os.sep, "foo", "baz", "xer.txt"),
+             ch.HashedFile("", None, "sha512", b"\xab" * 64, True, None)),
+            (os.path.join(os.sep, "goo.mp4"),
+             ch.HashedFile("", 0, "md5", b"\xcd" * 16, False, 0)),
+            # overwriting keeps the position, a digest of a different size is appended
+            (os.path.join(os.sep, "foo", "bar.txt"),
+             ch.HashedFile("", 1, "sha256", b"\x01" * 32, False, None)),
+    ]:
+        entries[fpath] = hf
+        expected[fpath] = ch.HashedFile(
+            fpath, hf.mtime, hf.hash_type, hf.hash_bytes, hf.text_mode, hf.size)
+
+    assert len(entries) == 3
+    assert list(entries) == list(expected)
+    assert list(entries.items()) == list(expected.items())
+    assert list(entries.values()) == list(expected.values())
+    assert os.path.join(os.sep, "goo.mp4") in entries
+    assert os.path.join(os.sep, "foo") not in entries
+    assert os.path.join(os.sep, "foo", "missing.txt") not in entries
+
+    # entries are materialized on look-up -> changes have to be stored explicitly
+    hf = entries[os.path.join(os.sep, "goo.mp4")]
+    hf.mtime = 5
+    assert entries[os.path.join(os.sep, "goo.mp4")].mtime == 0
+
+    del entries[os.path.join(os.sep, "foo", "bar.txt")]
+    del expected[os.path.join(os.sep, "foo", "bar.txt")]
+    with pytest.raises(KeyError):
+        del entries[os.path.join(os.sep, "foo", "bar.txt")]
+    with pytest.raises(KeyError):
+        entries[os.path.join(os.sep, "foo", "bar.txt")]
+    assert entries == expected
+    assert list(entries) == list(expected)
+
+    entries.clear()
+    assert len(entries) == 0
+    assert list(entries) == []
+
+
+def test_compact_entries_compaction(monkeypatch):
+    monkeypatch.setattr(ch.CompactEntries, "_COMPACT_MIN_ROWS", 4)
+    monkeypatch.setattr(ch.CompactEntries, "_COMPACT_MIN_BYTES", 64)
+    entries = ch.CompactEntries()
+    expected = {}
+    for i in range(100):
+        fpath = os.path.join(os.sep, "foo", f"{i}.txt")
+        entries[fpath] = ch.HashedFile("", i, "md5", bytes([i]) * 16, False, i)
+        expected[fpath] = ch.HashedFile(fpath, i, "md5", bytes([i]) * 16, False, i)
+        # churn: delete every other entry again
+        if i % 2:
+            del entries[fpath]
+            del expected[fpath]
+    # dead rows are dropped once at least half of them are unused
+    assert len(entries._alive) < 100
+    assert list(entries.items()) == list(expected.items())
+
+    # replacing digests with ones of a different size
+    for i in range(10):
+        algo, size = ("sha512", 64) if i % 2 == 0 else ("md5", 16)
+        for fpath in list(expected):
+            hf = ch.HashedFile(fpath, i, algo, b"\xab" * size, False, None)
+            entries[fpath] = hf
+            expected[fpath] = hf
+        # compaction only happens on inserts/deletes
+        fpath = os.path.join(os.sep, f"new{i}.txt")
+        entries[fpath] = expected[fpath] = ch.HashedFile(fpath, i, "md5", b"\x01" * 16, False, 1)
+    assert len(entries._digests) <= 3 * sum(len(hf.hash_bytes) for hf in expected.values())
+    assert list(entries.items()) == list(expected.items())
+    assert all(fpath in entries for fpath in expected)
+    assert os.path.join(os.sep, "foo", "1.txt") not in entries
+
+
+def test_cshd_compact_entries_read_write(setup_tmpdir_param, monkeypatch):
+    tmpdir = setup_tmpdir_param
+    cshd_path = os.path.join(tmpdir, "foo.cshd")
+
+    contents = """1337.1337,42,md5,deadbeef foo/bar/baz/xer.txt
+1337.1337,md5,abcdef goo.mp4
+,7,sha256,abcdef no_mtime.txt
+"""
+    with open(cshd_path, 'w', encoding='utf-8') as f:
+        f.write(contents)
+
+    cshd = ch.ChecksumHelperData(None, cshd_path)
+    cshd.read()
+    compact = ch.ChecksumHelperData(None, cshd_path, compact_entries=True)
+    compact.read()
+    # small collections stay a dict
+    assert type(compact.entries) is dict
+    monkeypatch.setattr(ch, "COMPACT_ENTRIES_MIN_SIZE", 2)
+    compact = ch.ChecksumHelperData(None, cshd_path, compact_entries=True)
+    compact.read()
+    assert isinstance(compact.entries, ch.CompactEntries)
+    assert compact.entries == cshd.entries
+    assert compact.get_entry(os.path.join(tmpdir, "foo", "bar", "baz", "xer.txt")) == \
+        cshd.get_entry(os.path.join(tmpdir, "foo", "bar", "baz", "xer.txt"))
+
+    assert compact.write(force=True)
+    with open(cshd_path, 'r', encoding='utf-8-sig') as f:
+        assert sorted(f.read().splitlines()) == sorted(contents.splitlines())
+
+
+def test_path_trie():
+    root = os.path.join(os.sep, "root")
+    paths = [os.path.join(root, *parts) for parts in [
+        ("foo.txt",), ("sub", "bar.txt"), ("sub", "deep", "baz.txt"), ("sub2", "xer.txt")]]
+    trie = ch.PathTrie(paths)
+
+    assert len(trie) == 4
+    assert trie.count_under(root) == 4
+    assert trie.count_under(os.sep) == 4
+    assert trie.count_under(os.path.join(root, "sub")) == 2
+    assert trie.has_files(os.path.join(root, "sub", "deep"))
+    # no prefix matching on the directory names
+    assert not trie.has_files(os.path.join(root, "su"))
+    assert not trie.has_files(os.path.join(root, "foo.txt"))
+    assert sorted(trie.files_under(os.path.join(root, "sub"))) == sorted(paths[1:3])
+    assert list(trie.files_under(os.path.join(root, "missing"))) == []
+
+    assert trie.add(paths[0]) is False
+    assert trie.remove(paths[2]) is True
+    assert trie.remove(paths[2]) is False
+    assert not trie.has_files(os.path.join(root, "sub", "deep"))
+    assert trie.count_under(root) == 3
+
+
+def test_cshd_path_index_kept_up_to_date(setup_tmpdir_param):
+    tmpdir = setup_tmpdir_param
+    cshd = ch.ChecksumHelperData(None, os.path.join(tmpdir, "foo.cshd"))
+    fpath = os.path.join(tmpdir, "sub", "foo.txt")
+    cshd.set_entry(fpath, ch.HashedFile(fpath, None, "md5", b"\xab", False))
+
+    index = cshd.path_index()
+    assert list(index.files_under(os.path.join(tmpdir, "sub"))) == [fpath]
+    other = os.path.join(tmpdir, "sub", "bar", "bar.txt")
+    cshd.set_entry(other, ch.HashedFile(other, None, "md5", b"\xab", False))
+    assert index.count_under(os.path.join(tmpdir, "sub")) == 2
+    del cshd[fpath]
+    assert list(index.files_under(tmpdir)) == [other]
+
+
+@pytest.mark.parametrize("mtime_ns,expected", [
+    (1524334794406719446, "1524334794.406719446"),
+    (1524334794406719400, "1524334794.4067194"),
+    (1524334794000000000, "1524334794.0"),
+    (-1500000000, "-1.5"),
+])
+def test_mtime_ns_str_round_trip(mtime_ns, expected):
+    assert ch.mtime_ns_to_str(mtime_ns) == expected
+    assert ch.mtime_ns_from_str(expected) == mtime_ns
+
+
+def test_mtime_ns_matches_legacy_float():
+    current_ns = 1524334794406719446
+    # older versions wrote repr(st_mtime)
+    legacy = ch.mtime_ns_from_str(repr(current_ns / 1e9))
+    assert legacy != current_ns
+    assert ch.mtime_ns_matches(legacy, current_ns)
+    assert ch.mtime_ns_matches(current_ns, current_ns)
+    assert not ch.mtime_ns_matches(current_ns + 1000, current_ns)
+
+
 def test_cshd_single_hash_handles_empty_lines(setup_tmpdir_param):
     tmpdir = setup_tmpdir_param
     cshd_path = os.path.join(tmpdir, "foo.md5")
@@ -77,6 +278,23 @@ abcdef  goo.mp4
     assert cshd.get_entry(os.path.join(tmpdir, 'goo.mp4'))
 
 
+def test_cshd_single_hash_cp1252_fallback(setup_tmpdir_param):
+    tmpdir = setup_tmpdir_param
+    cshd_path = os.path.join(tmpdir, "foo.md5")
+
+    # only the last line can't be decoded as utf-8 -> everything parsed
+    # before has to be discarded and parsed again
+    with open(cshd_path, 'wb') as f:
+        f.write("deadbeef *caf\u00e9.txt\r\nabcdef *na\u00efve.txt\r\n".encode("utf-8"))
+        f.write("abcdef *r\u00e9sum\u00e9.txt\r\n".encode("cp1252"))
+
+    cshd = ch.ChecksumHelperData(None, cshd_path)
+    cshd.read()
+    assert cshd.was_read is True
+    assert sorted(os.path.basename(p) for p in cshd.entries) == [
+        "caf\u00c3\u00a9.txt", "na\u00c3\u00afve.txt", "r\u00e9sum\u00e9.txt"]
+
+
 def test_cshd_not_read_on_invalid_hash_line(setup_tmpdir_param):
     tmpdir = setup_tmpdir_param
     cshd_path = os.path.join(tmpdir, "foo.cshd")
@@ -5,11 +5,14 @@ import logging
 import time
 import binascii
 import copy
+import asyncio
 
 from typing import cast
 
-from utils import TESTS_DIR, setup_tmpdir_param, read_file, write_file_str, Args, compare_lines_sorted
-from checksum_helper.checksum_helper import ChecksumHelper, _cl_incremental, descend_into, HashedFile, ChecksumHelperData, LOG_LVL_VERBOSE, LOG_LVL_EXTRAVERBOSE
+from checksum_helper import checksum_helper
+
+from utils import TESTS_DIR, setup_tmpdir_param, read_file, write_file_str, Args, compare_lines_sorted, skip_no_symlinks
+from checksum_helper.checksum_helper import ChecksumHelper, _cl_incremental, descend_into, HashedFile, ChecksumHelperData, LOG_LVL_VERBOSE, LOG_LVL_EXTRAVERBOSE, StatCache
 
 
 #                       filter, include unchanged
@@ -63,6 +66,242 @@ def test_do_incremental(incremental_writes, setup_dir_to_checksum):
     compare_lines_sorted(verified_sha_contents, generated_sha_contents)
 
 
+def test_do_incremental_jobs_same_order(setup_dir_to_checksum):
+    checksume_hlpr, include_unchanged, root_dir = setup_dir_to_checksum
+
+    serial = checksume_hlpr.do_incremental_checksums("sha512", single_hash=True)
+    assert serial is not None
+    processed_serial = checksume_hlpr.total_files_processed
+
+    checksume_hlpr.total_files_processed = 0
+    parallel = checksume_hlpr.do_incremental_checksums("sha512", single_hash=True, jobs=4)
+    assert parallel is not None
+
+    assert checksume_hlpr.total_files_processed == processed_serial
+    assert list(parallel.entries.keys()) == list(serial.entries.keys())
+    assert all(parallel.entries[k].meta_eql(serial.entries[k]) for k in serial.entries)
+
+
+def test_do_incremental_serial_without_pipeline(setup_dir_to_checksum, monkeypatch):
+    checksume_hlpr, include_unchanged, root_dir = setup_dir_to_checksum
+    expected = checksume_hlpr.do_incremental_checksums("sha512", single_hash=True, jobs=2)
+
+    def no_pipeline(*args, **kwargs):
+        assert False, "serial runs should hash on the calling thread"
+    monkeypatch.setattr(checksum_helper, "Pipeline", no_pipeline)
+    serial = checksume_hlpr.do_incremental_checksums("sha512", single_hash=True)
+    assert expected is not None and serial is not None
+    assert list(serial.entries.keys()) == list(expected.entries.keys())
+    assert all(serial.entries[k].meta_eql(expected.entries[k]) for k in expected.entries)
+
+
+def test_do_incremental_stat_cache(setup_dir_to_checksum, monkeypatch):
+    checksume_hlpr, include_unchanged, root_dir = setup_dir_to_checksum
+    cache_path = os.path.join(os.path.dirname(root_dir), "stat_cache.db")
+
+    with StatCache(cache_path) as cache:
+        checksume_hlpr.stat_cache = cache
+        first = checksume_hlpr.do_incremental_checksums("sha512", single_hash=True)
+        assert first is not None
+
+    modified = os.path.join(root_dir, "new 2.txt")
+    with open(modified, "w") as f:
+        f.write("MODIFIED")
+
+    hashed = []
+    orig = checksum_helper.gen_hash_from_file
+    def counting(fname, algos, *args, **kwargs):
+        hashed.append(fname)
+        return orig(fname, algos, *args, **kwargs)
+    monkeypatch.setattr(checksum_helper, "gen_hash_from_file", counting)
+
+    with StatCache(cache_path) as cache:
+        checksume_hlpr.stat_cache = cache
+        second = checksume_hlpr.do_incremental_checksums("sha512", single_hash=True)
+        assert second is not None
+
+    # only the modified file had to be read again
+    assert hashed == [modified]
+    assert second.get_entry(modified).hash_bytes == orig(modified, "sha512")
+    for fpath, hashed_file in second.entries.items():
+        if fpath != modified and fpath in first:
+            assert hashed_file.hash_bytes == first.get_entry(fpath).hash_bytes
+
+
+def test_do_incremental_reuses_walk_stat(setup_dir_to_checksum, monkeypatch):
+    checksume_hlpr, include_unchanged, root_dir = setup_dir_to_checksum
+    checksume_hlpr.build_most_current()
+
+    stat_calls = []
+    orig_stat = os.stat
+    def counting_stat(path, *args, **kwargs):
+        stat_calls.append(path)
+        return orig_stat(path, *args, **kwargs)
+    monkeypatch.setattr(os, "stat", counting_stat)
+
+    incremental = checksume_hlpr.do_incremental_checksums("sha512")
+    assert incremental is not None
+    missing = checksume_hlpr.gen_missing_checksums("sha512")
+    assert missing is not None
+
+    # mtime/size are taken from the DirEntry of the walk
+    assert stat_calls == []
+    for fpath, hashed_file in [*incremental.entries.items(), *missing.entries.items()]:
+        assert hashed_file.mtime == orig_stat(fpath).st_mtime_ns
+        assert hashed_file.size == orig_stat(fpath).st_size
+
+
+@pytest.mark.parametrize("only_missing", (False, True))
+def test_do_incremental_single_walk(only_missing, setup_dir_to_checksum, monkeypatch):
+    checksume_hlpr, include_unchanged, root_dir = setup_dir_to_checksum
+    filter_str = checksume_hlpr.hash_filename_filter
+
+    # same result when walking the tree for every step
+    multi_walk = ChecksumHelper(root_dir, hash_filename_filter=filter_str)
+    multi_walk.options["include_unchanged_files_incremental"] = include_unchanged
+    expected = multi_walk.do_incremental_checksums("sha512", only_missing=only_missing)
+
+    listed = []
+    orig_scandir = os.scandir
+    def counting_scandir(path, *args, **kwargs):
+        listed.append(path)
+        return orig_scandir(path, *args, **kwargs)
+    monkeypatch.setattr(os, "scandir", counting_scandir)
+    def no_listdir(path):
+        assert False, "missing dirs should be checked using the listings"
+    monkeypatch.setattr(os, "listdir", no_listdir)
+
+    checksume_hlpr.options["single_walk"] = True
+    incremental = checksume_hlpr.do_incremental_checksums("sha512", only_missing=only_missing)
+    # every dir was listed exactly once
+    assert sorted(listed) == sorted(set(listed))
+    assert set(listed) == {dirpath for dirpath, _, _ in os.walk(root_dir)}
+    # listings are only kept for the run
+    assert checksume_hlpr.tree_listing is None
+
+    assert incremental is not None and expected is not None
+    assert list(incremental.entries.keys()) == list(expected.entries.keys())
+    for fpath, hashed_file in incremental.entries.items():
+        assert hashed_file.hash_bytes == expected.entries[fpath].hash_bytes
+        assert hashed_file.mtime == expected.entries[fpath].mtime
+
+
+@skip_no_symlinks
+def test_tree_listing_walk(setup_dir_to_checksum):
+    _, _, root_dir = setup_dir_to_checksum
+    os.symlink(os.path.join(root_dir, "sub1"), os.path.join(root_dir, "sub1_link"))
+    listing = checksum_helper.TreeListing(root_dir)
+
+    def walk(walker):
+        result = []
+        for dirpath, dirs, files in walker:
+            dirs[:] = [d for d in dirs if d.name != "sub2"]
+            result.append((dirpath, [d.name for d in dirs], [f.name for f in files]))
+        return result
+
+    # pruning doesn't change the stored listings
+    for _ in range(2):
+        assert walk(listing.walk(root_dir)) == walk(checksum_helper.scandir_walk(root_dir))
+    sub1 = os.path.join(root_dir, "sub1")
+    assert walk(listing.walk(sub1)) == walk(checksum_helper.scandir_walk(sub1))
+    assert listing.covers(sub1)
+    assert not listing.covers(root_dir + "2")
+    assert listing.is_empty(sub1) is False
+    assert listing.is_empty(os.path.join(root_dir, "not_listed")) is None
+
+
+@skip_no_symlinks
+def test_scandir_walk_same_as_os_walk(setup_dir_to_checksum):
+    _, _, root_dir = setup_dir_to_checksum
+    os.symlink(os.path.join(root_dir, "sub1"), os.path.join(root_dir, "sub1_link"))
+
+    expected = [(dirpath, sorted(dirnames), sorted(fnames))
+                for dirpath, dirnames, fnames in os.walk(root_dir)]
+    walked = [(dirpath, sorted(d.name for d in dirs), sorted(f.name for f in files))
+              for dirpath, dirs, files in checksum_helper.scandir_walk(root_dir)]
+    assert sorted(walked) == sorted(expected)
+
+
+@skip_no_symlinks
+@pytest.mark.parametrize("ordered", (True, False))
+@pytest.mark.parametrize("max_pending", (1, 2, None))
+def test_parallel_scandir_walk(ordered, max_pending, setup_dir_to_checksum):
+    _, _, root_dir = setup_dir_to_checksum
+    os.symlink(os.path.join(root_dir, "sub1"), os.path.join(root_dir, "sub1_link"))
+
+    def walk(walker, prune):
+        result = []
+        for dirpath, dirs, files in walker:
+            # pruned dirs must not be listed
+            dirs[:] = [d for d in dirs if d.name != prune]
+            result.append((dirpath, [d.name for d in dirs], [f.name for f in files]))
+        return result
+
+    for prune in (None, "sub1", "sub2"):
+        expected = walk(checksum_helper.scandir_walk(root_dir), prune)
+        walked = walk(checksum_helper.parallel_scandir_walk(
+            root_dir, 4, ordered=ordered, max_pending=max_pending), prune)
+        if ordered:
+            assert walked == expected
+        else:
+            assert sorted(walked) == sorted(expected)
+            # parents are always yielded before their subdirs
+            seen = set()
+            for dirpath, _, _ in walked:
+                assert dirpath == root_dir or os.path.dirname(dirpath) in seen
+                seen.add(dirpath)
+
+
+@pytest.mark.parametrize("walk_ordered", (True, False))
+def test_filtered_walk_walk_jobs(walk_ordered, setup_dir_to_checksum):
+    _, _, root_dir = setup_dir_to_checksum
+    ch = ChecksumHelper(root_dir, None)
+    expected = list(ch.filtered_walk(root_dir, whitelist=["sub1*"]))
+    expected_root = list(ch.filtered_walk(root_dir, root_only=True))
+
+    ch.options["walk_jobs"] = 4
+    ch.options["walk_ordered"] = walk_ordered
+    walked = list(ch.filtered_walk(root_dir, whitelist=["sub1*"]))
+    assert walked == expected if walk_ordered else sorted(walked) == sorted(expected)
+    assert list(ch.filtered_walk(root_dir, root_only=True)) == expected_root
+
+
+def test_build_verify_mtime_ns(setup_tmpdir_param, monkeypatch):
+    tmpdir = setup_tmpdir_param
+    fpath = os.path.join(tmpdir, "ns.txt")
+    with open(fpath, "w") as f:
+        f.write("ns")
+    os.utime(fpath, ns=(1524334794406719446, 1524334794406719446))
+    current_ns = os.stat(fpath).st_mtime_ns
+    digest = checksum_helper.gen_hash_from_file(fpath, "md5")
+
+    ch = ChecksumHelper(tmpdir, None)
+    ch.options['include_unchanged_files_incremental'] = False
+    most_current = ChecksumHelperData(ch, os.path.join(tmpdir, "most_current.cshd"))
+    ch.hash_file_most_current = most_current
+
+    # mtime written by an older version as float seconds -> unchanged
+    # and the recorded mtime gets the full precision
+    most_current.entries[fpath] = HashedFile(
+        fpath, checksum_helper.mtime_ns_from_str(repr(current_ns / 1e9)), "md5", digest, False)
+    include, generated = ch._build_verfiy_hash(fpath, "md5", skip_unchanged=True)
+    assert include is False
+    assert cast(HashedFile, generated).mtime == current_ns
+
+    hashed = []
+    orig = checksum_helper.gen_hash_from_file
+    def counting(fname, algos, *args, **kwargs):
+        hashed.append(fname)
+        return orig(fname, algos, *args, **kwargs)
+    monkeypatch.setattr(checksum_helper, "gen_hash_from_file", counting)
+
+    # differs by less than float seconds can represent -> re-hashed
+    most_current.entries[fpath] = HashedFile(fpath, current_ns - 1, "md5", digest, False)
+    include, generated = ch._build_verfiy_hash(fpath, "md5", skip_unchanged=True)
+    assert hashed == [fpath]
+    assert include is False
+
+
 @pytest.fixture
 def setup_dir_to_checksum_path_only(setup_tmpdir_param):
     tmpdir = setup_tmpdir_param
@@ -349,17 +588,17 @@ def test_descend_into(path, whitelist, blacklist, expected):
 
 
 build_verify_hf_most_current_data = [
-    ("new 2.txt", 1524334794.4067194, "sha512", "f6c5600ed1dbdcfdf829081f5417dccbbd2b9288e0b427e65c8cf67e274b69009cd142475e15304f599f429f260a661b5df4de26746459a3cef7f32006e5d1c1"),
-    ("new 3.txt", 1524334698.6291595, "md5", "92eb5ffee6ae2fec3ad71c777531578f"),
+    ("new 2.txt", 1524334794406719400, "sha512", "f6c5600ed1dbdcfdf829081f5417dccbbd2b9288e0b427e65c8cf67e274b69009cd142475e15304f599f429f260a661b5df4de26746459a3cef7f32006e5d1c1"),
+    ("new 3.txt", 1524334698629159500, "md5", "92eb5ffee6ae2fec3ad71c777531578f"),
     # no hash recorded
-    ("new 4.txt", 1524334840.3075361, "sha512", "e7ef17a6816ef8af636f6d2d4d2707c8ccfda931d0ec2bd576292eafb826d690004798079d4d35249c009b66834ec2d53894915c25bfa8b6cae0db91f4ceb261"),
-    (f"sub1{os.sep}new 2.txt", 1524334688.5989518, "sha512", "1f40fc92da241694750979ee6cf582f2d5d7d28e18335de05abc54d0560e0f5302860c652bf08d560252aa5e74210546f369fbbbce8c12cfc7957b2652fe9a75"),
-    (f"sub1{os.sep}new 3.txt", 1524334859.3268101, "sha512", "0555ffa5af6247333309562cd61d2e1de19a8e1f8927447f78d114098f279eedd387e8c441d1a18f9e5541e750c5176016c379ff5ecb90e16784bd4508477328"),
-    (f"sub1{os.sep}new 4.txt", 1524334707.4520152, "sha3_512", "bfe4d7f7377116dc15f794d902621797b72b32396382de2b6e49d4f1d7eabdfddcfc3bc127bb67f92f9458a5733bb21804e7ccd56b4b6f81049339f477cd279d"),
+    ("new 4.txt", 1524334840307536100, "sha512", "e7ef17a6816ef8af636f6d2d4d2707c8ccfda931d0ec2bd576292eafb826d690004798079d4d35249c009b66834ec2d53894915c25bfa8b6cae0db91f4ceb261"),
+    (f"sub1{os.sep}new 2.txt", 1524334688598951800, "sha512", "1f40fc92da241694750979ee6cf582f2d5d7d28e18335de05abc54d0560e0f5302860c652bf08d560252aa5e74210546f369fbbbce8c12cfc7957b2652fe9a75"),
+    (f"sub1{os.sep}new 3.txt", 1524334859326810100, "sha512", "0555ffa5af6247333309562cd61d2e1de19a8e1f8927447f78d114098f279eedd387e8c441d1a18f9e5541e750c5176016c379ff5ecb90e16784bd4508477328"),
+    (f"sub1{os.sep}new 4.txt", 1524334707452015200, "sha3_512", "bfe4d7f7377116dc15f794d902621797b72b32396382de2b6e49d4f1d7eabdfddcfc3bc127bb67f92f9458a5733bb21804e7ccd56b4b6f81049339f477cd279d"),
     # no hash recorded
-    (f"sub1{os.sep}sub2{os.sep}new 2.txt", 1524334852.8311138, "sha512", "00dbe8c9f126a09af5172b9381c6c7462070aeab0020e49a6c73adbbdd7c14f1230fe4d0e08b81d1631a215a91592a074e625eaaa571e45704f8c5898c2bcca1"),
-    (f"sub1{os.sep}sub2{os.sep}new 3.txt", 1524334698.6291595, "md5", "92eb5ffee6ae2fec3ad71c777531578f"),
-    (f"sub1{os.sep}sub2{os.sep}new 4.txt", 1524334802.3300772, "sha3_512", "ce24e8e181d24d8189308ada1d6dc8fe780608b865a3e549e8903cebaf5910210487e93d4eb2397e8a0653b64f2e64e8b39298cd29a48effc3c86b96fe43b320"),
+    (f"sub1{os.sep}sub2{os.sep}new 2.txt", 1524334852831113800, "sha512", "00dbe8c9f126a09af5172b9381c6c7462070aeab0020e49a6c73adbbdd7c14f1230fe4d0e08b81d1631a215a91592a074e625eaaa571e45704f8c5898c2bcca1"),
+    (f"sub1{os.sep}sub2{os.sep}new 3.txt", 1524334698629159500, "md5", "92eb5ffee6ae2fec3ad71c777531578f"),
+    (f"sub1{os.sep}sub2{os.sep}new 4.txt", 1524334802330077200, "sha3_512", "ce24e8e181d24d8189308ada1d6dc8fe780608b865a3e549e8903cebaf5910210487e93d4eb2397e8a0653b64f2e64e8b39298cd29a48effc3c86b96fe43b320"),
 ]
 
 
@@ -389,7 +628,8 @@ def test_build_verify(setup_tmpdir_param, caplog) -> None:
     include, generated = ch._build_verfiy_hash(abs_fp, "sha512")
     assert include is True
     assert generated.meta_eql(  # type: ignore
-            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False))
+            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False,
+                       os.path.getsize(abs_fp)))
 
     include, generated = ch._build_verfiy_hash(abs_fp, "sha512", collect_fstat=False)
     assert include is True
@@ -405,7 +645,8 @@ def test_build_verify(setup_tmpdir_param, caplog) -> None:
     include, generated = ch._build_verfiy_hash(abs_fp, "sha512", collect_fstat=False, skip_unchanged=True)
     assert include is ch.options['include_unchanged_files_incremental']
     assert generated.meta_eql(  # type: ignore
-            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False))
+            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False,
+                       os.path.getsize(abs_fp)))
 
     # change hash so a new hf gets generated
     bu_hash = most_current.entries[abs_fp].hash_bytes
@@ -413,7 +654,8 @@ def test_build_verify(setup_tmpdir_param, caplog) -> None:
     include, generated = ch._build_verfiy_hash(abs_fp, "sha512", collect_fstat=True)
     assert include is ch.options['include_unchanged_files_incremental']
     assert generated.meta_eql(  # type: ignore
-            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False))
+            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False,
+                       os.path.getsize(abs_fp)))
     # restore!!
     most_current.entries[abs_fp].hash_bytes = bu_hash
 
@@ -431,7 +673,8 @@ def test_build_verify(setup_tmpdir_param, caplog) -> None:
     include, generated = ch._build_verfiy_hash(abs_fp, "sha512", skip_unchanged=True)
     assert include is False
     assert generated.meta_eql(  # type: ignore
-            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False))
+            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False,
+                       os.path.getsize(abs_fp)))
 
     assert caplog.record_tuples == [
         ('checksum_helper.checksum_helper', LOG_LVL_EXTRAVERBOSE, f"Skipping generation of a hash for file '{abs_fp}' since the mtime matches!"),
@@ -448,7 +691,8 @@ def test_build_verify(setup_tmpdir_param, caplog) -> None:
     include, generated = ch._build_verfiy_hash(abs_fp, "md5", skip_unchanged=True)
     assert include is True
     assert generated.meta_eql(  # type: ignore
-            HashedFile(abs_fp, mtime, "md5", binascii.a2b_hex("0cc175b9c0f1b6a831c399e269772661"), False))
+            HashedFile(abs_fp, mtime, "md5", binascii.a2b_hex("0cc175b9c0f1b6a831c399e269772661"), False,
+                       os.path.getsize(abs_fp)))
 
     assert caplog.record_tuples == [
         ('checksum_helper.checksum_helper', LOG_LVL_EXTRAVERBOSE, f"Skipping generation of a hash for file '{abs_fp}' since the mtime matches!"),
@@ -477,7 +721,8 @@ def test_build_verify(setup_tmpdir_param, caplog) -> None:
     include, generated = ch._build_verfiy_hash(abs_fp, "sha512")
     assert include is True
     assert generated.meta_eql(  # type: ignore
-            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False))
+            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False,
+                       os.path.getsize(abs_fp)))
 
     assert caplog.record_tuples == [
         ('checksum_helper.checksum_helper', LOG_LVL_EXTRAVERBOSE, f"Old and new hashes match for file {abs_fp}!"),
@@ -525,12 +770,13 @@ def test_build_verify(setup_tmpdir_param, caplog) -> None:
     most_current.entries[abs_fp].hash_bytes = binascii.a2b_hex(hash_str.replace('0', '2').replace('a', 'd'))
 
     # OLDER mtime
-    most_current.entries[abs_fp].mtime = mtime - 2
+    most_current.entries[abs_fp].mtime = mtime - 2_000_000_000
 
     include, generated = ch._build_verfiy_hash(abs_fp, "sha512")
     assert include is True
     assert generated.meta_eql(  # type: ignore
-            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False))
+            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False,
+                       os.path.getsize(abs_fp)))
 
     assert caplog.record_tuples == [
         ('checksum_helper.checksum_helper', logging.INFO, f"File \"{abs_fp}\" changed, a new hash was generated!"),
@@ -552,12 +798,13 @@ def test_build_verify(setup_tmpdir_param, caplog) -> None:
     most_current.entries[abs_fp].hash_bytes = binascii.a2b_hex(hash_str.replace('0', '2').replace('a', 'd'))
 
     # OLDER mtime
-    most_current.entries[abs_fp].mtime = mtime + 2
+    most_current.entries[abs_fp].mtime = mtime + 2_000_000_000
 
     include, generated = ch._build_verfiy_hash(abs_fp, "sha512")
     assert include is True
     assert generated.meta_eql(  # type: ignore
-            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False))
+            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False,
+                       os.path.getsize(abs_fp)))
 
     assert caplog.record_tuples == [
         ('checksum_helper.checksum_helper', logging.INFO,
@@ -584,7 +831,8 @@ def test_build_verify(setup_tmpdir_param, caplog) -> None:
     include, generated = ch._build_verfiy_hash(abs_fp, "sha512")
     assert include is True
     assert generated.meta_eql(  # type: ignore
-            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False))
+            HashedFile(abs_fp, mtime, "sha512", binascii.a2b_hex(hash_str), False,
+                       os.path.getsize(abs_fp)))
 
     assert caplog.record_tuples == [
         ('checksum_helper.checksum_helper', logging.WARNING, f"Unexpected change of file hash, when modification time is the same for file: {abs_fp}"),
@@ -609,7 +857,8 @@ def test_build_verify(setup_tmpdir_param, caplog) -> None:
     include, generated = ch._build_verfiy_hash(abs_fp, "md5")
     assert include is True
     assert generated.meta_eql(  # type: ignore
-            HashedFile(abs_fp, mtime, "md5", binascii.a2b_hex("0cc175b9c0f1b6a831c399e269772661"), False))
+            HashedFile(abs_fp, mtime, "md5", binascii.a2b_hex("0cc175b9c0f1b6a831c399e269772661"), False,
+                       os.path.getsize(abs_fp)))
 
     assert caplog.record_tuples == [
             ('checksum_helper.checksum_helper', LOG_LVL_EXTRAVERBOSE, f'Old and new hashes match for file {abs_fp}!'),
@@ -740,3 +989,60 @@ def test_filtered_walk(wl, bl, expected, setup_dir_to_checksum):
     abs_expected = [os.path.join(root_dir, p) for p in sorted(expected)]
     assert abs_expected == sorted(list(ch.filtered_walk(
         ch.root_dir, False, whitelist=wl, blacklist=bl)))
+
+
+def test_async_do_incremental_checksums(setup_dir_to_checksum):
+    checksume_hlpr, include_unchanged, root_dir = setup_dir_to_checksum
+    sync_hlpr = ChecksumHelper(root_dir, hash_filename_filter=checksume_hlpr.hash_filename_filter)
+    sync_hlpr.options["include_unchanged_files_incremental"] = include_unchanged
+    expected = sync_hlpr.do_incremental_checksums("sha512")
+    assert expected is not None
+
+    async def run():
+        await checksume_hlpr.async_build_most_current()
+        assert checksume_hlpr.hash_file_most_current is not None
+        inc = checksume_hlpr.async_do_incremental_checksums("sha512")
+        streamed = [entry async for entry in inc]
+        return streamed, inc.result
+
+    streamed, incremental = asyncio.run(run())
+    assert incremental is not None
+    assert [fp for fp, _ in streamed] == list(expected.entries.keys())
+    assert all(hf.hash_bytes == expected.entries[fp].hash_bytes for fp, hf in streamed)
+    assert list(incremental.entries.keys()) == list(expected.entries.keys())
+
+
+def test_async_do_incremental_checksums_cancel(setup_tmpdir_param):
+    tmpdir = setup_tmpdir_param
+    nr_files = 500
+    for i in range(nr_files):
+        with open(os.path.join(tmpdir, f"f{i:03}.txt"), "w") as f:
+            f.write(f"file {i}")
+    ch = ChecksumHelper(tmpdir)
+    hashed = []
+
+    async def run():
+        inc = ch.async_do_incremental_checksums("sha512", incremental_writes=True)
+
+        async def consume():
+            async for file_path, _ in inc:
+                hashed.append(file_path)
+                if len(hashed) == 5:
+                    # cancelled while waiting for the next entry
+                    asyncio.current_task().cancel()
+
+        task = asyncio.ensure_future(consume())
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert inc.cancel.is_set()
+
+    asyncio.run(run())
+    assert 5 <= len(hashed) < nr_files
+    # the entries up to the cancellation were flushed and the hash file is complete
+    hash_file_path = os.path.join(tmpdir, f"{os.path.basename(tmpdir)}_{time.strftime('%Y-%m-%d')}.cshd")
+    written = ChecksumHelperData(ch, hash_file_path)
+    written.read()
+    assert set(hashed) <= set(written.entries.keys())
+    assert len(written.entries) < nr_files
+    for fpath, hashed_file in written.entries.items():
+        assert hashed_file.hash_bytes == checksum_helper.gen_hash_from_file(fpath, "sha512")
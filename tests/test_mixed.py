@@ -1,7 +1,10 @@
 import os
+import gc
 import shutil
 import logging
 import time
+import asyncio
+import threading
 import pytest
 
 import utils
@@ -10,8 +13,10 @@ from utils import TESTS_DIR, setup_tmpdir_param, Args, cshd_strip_mtime
 
 from checksum_helper.checksum_helper import (
     split_path, move_fpath, HashedFile, gen_hash_from_file, ChecksumHelper,
-    _cl_copy_hash_file, discover_hash_files, ChecksumHelperData, _cl_gen_missing
+    _cl_copy_hash_file, discover_hash_files, ChecksumHelperData, _cl_gen_missing,
+    DeviceScheduler, ReadStrategy, IOThrottle, Pipeline, ProcessHashPool, AsyncRun, StatCache
 )
+from checksum_helper import checksum_helper
 
 
 def test_copyto(setup_tmpdir_param, monkeypatch, caplog) -> None:
@@ -435,3 +440,361 @@ def test_filter_own_logs(log_base, logs, setup_gen_missing):
     ch = ChecksumHelper(tmpdir)
     generated = [fn for fn in ch.filtered_walk(tmpdir) if any(log_fn in fn for log_fn in logs)]
     assert generated
+
+
+def test_gen_missing_stat_cache_closed_on_error(setup_gen_missing, tmp_path, monkeypatch):
+    tmpdir, _ = setup_gen_missing
+    # outside of tmpdir so it doesn't get hashed itself
+    cache_path = str(tmp_path / "stat_cache.db")
+
+    def fail_write(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(ChecksumHelperData, "write", fail_write)
+
+    a = Args(path=tmpdir, hash_filename_filter=None, single_hash=True,
+             discover_hash_files_depth=-1, log=None, most_current_hash_file=None,
+             hash_algorithm="sha512", whitelist=None, blacklist=None,
+             dont_collect_mtime=False, out_filename=None, stat_cache=cache_path)
+    with pytest.raises(OSError, match="disk full"):
+        _cl_gen_missing(a)
+
+    # the digests that were stored before the error were committed
+    with StatCache(cache_path) as cache:
+        assert cache._conn.execute("SELECT COUNT(*) FROM stat_cache").fetchone()[0] > 0
+
+
+def test_device_scheduler_groups(setup_tmpdir_param):
+    tmpdir = setup_tmpdir_param
+    hdd = os.path.join(tmpdir, "hdd")
+    os.makedirs(os.path.join(hdd, "sub"))
+    sched = DeviceScheduler(default_jobs=4, device_jobs={hdd: 1, os.path.join(hdd, "sub"): 2})
+
+    # longest declared path wins
+    assert sched.device_key(os.path.join(hdd, "sub", "f.txt")) == (os.path.join(hdd, "sub", ""), 2)
+    assert sched.device_key(os.path.join(hdd, "f.txt")) == (os.path.join(hdd, ""), 1)
+    # only whole path components match
+    assert sched.device_key(os.path.join(tmpdir, "hdd2", "f.txt"))[1] == 4
+    # everything else is grouped by st_dev
+    assert sched.device_key(os.path.join(tmpdir, "f.txt")) == (os.stat(tmpdir).st_dev, 4)
+
+
+def test_quick_stats_device_key_of_files(setup_tmpdir_param):
+    tmpdir = setup_tmpdir_param
+    hdd = os.path.join(tmpdir, "hdd")
+    os.makedirs(hdd)
+    fpaths = [os.path.join(hdd, "a.txt"), os.path.join(tmpdir, "b.txt")]
+    for fpath in fpaths:
+        utils.write_file_str(fpath, "x")
+    sched = DeviceScheduler(default_jobs=2, device_jobs={hdd: 1})
+    keys = []
+    device_key = sched.device_key
+
+    def record_key(file_path):
+        key = device_key(file_path)
+        keys.append(key)
+        return key
+    sched.device_key = record_key
+
+    stats = ChecksumHelperData._quick_stats(fpaths, jobs=2, scheduler=sched)
+    assert [s[1] for s in stats] == [1, 1]
+    # the dir's files belong to the declared device, not the one the dir itself is on
+    assert sorted(keys, key=str) == sorted(
+        [(os.path.join(hdd, ""), 1), (os.stat(tmpdir).st_dev, 2)], key=str)
+
+
+def test_gen_missing_scheduler_same_as_serial(setup_gen_missing):
+    tmpdir, _ = setup_gen_missing
+    ch = ChecksumHelper(tmpdir, hash_filename_filter=None)
+    serial = ch.gen_missing_checksums("sha512")
+    assert serial is not None
+
+    scheduled = ch.gen_missing_checksums(
+        "sha512", scheduler=DeviceScheduler(default_jobs=2, device_jobs={tmpdir: 3}, max_pending=4))
+    assert scheduled is not None
+    assert list(scheduled.entries.keys()) == list(serial.entries.keys())
+    assert all(scheduled.entries[k].meta_eql(serial.entries[k]) for k in serial.entries)
+
+
+def test_pipeline():
+    def double(items):
+        for i in items:
+            yield i * 2
+
+    pipeline = (Pipeline(range(1000), maxsize=4)
+                .add_stage("double", double)
+                .add_stage("str", lambda items: map(str, items)))
+    assert list(pipeline) == [str(i * 2) for i in range(1000)]
+    assert [stage.processed for stage in pipeline.stages] == [1000, 1000]
+    assert pipeline.status().startswith("double: 1000 (")
+
+    # backpressure: a stage is at most maxsize items (+ the one it's trying to put)
+    # ahead of the consumer
+    produced = []
+    def source():
+        for i in range(100):
+            produced.append(i)
+            yield i
+    pipeline = Pipeline(source(), maxsize=2).add_stage("walk", iter)
+    it = iter(pipeline)
+    assert next(it) == 0
+    time.sleep(0.2)
+    assert len(produced) <= 4
+    # consumer stopping early stops the stages
+    it.close()
+    assert all(not stage.thread.is_alive() for stage in pipeline.stages)
+
+
+def test_pipeline_stage_error():
+    def fail(items):
+        for i in items:
+            if i == 5:
+                raise ValueError("stage failed")
+            yield i
+
+    consumed = []
+    with pytest.raises(ValueError, match="stage failed"):
+        for i in Pipeline(range(10)).add_stage("fail", fail).add_stage("next", iter):
+            consumed.append(i)
+    assert consumed == [0, 1, 2, 3, 4]
+
+
+def test_process_hash_pool(setup_gen_missing):
+    tmpdir, _ = setup_gen_missing
+    ch = ChecksumHelper(tmpdir, hash_filename_filter=None)
+    serial = ch.gen_missing_checksums("sha512")
+    assert serial is not None
+
+    # batches smaller than the number of threads so some of them get flushed
+    # because they're full and some after the linger time
+    with ProcessHashPool(2, batch_size=3) as pool:
+        checksum_helper.set_hash_pool(pool)
+        try:
+            pooled = ChecksumHelper(tmpdir, hash_filename_filter=None).gen_missing_checksums(
+                "sha512", jobs=8)
+            assert pooled is not None
+            assert list(pooled.entries.keys()) == list(serial.entries.keys())
+            assert all(pooled.entries[k].hash_bytes == serial.entries[k].hash_bytes
+                       for k in serial.entries)
+
+            # multiple algorithms at once and errors are passed on from the workers
+            fpath = os.path.join(tmpdir, "f1.txt")
+            assert HashedFile.compute_file_hashes(fpath, {"md5", "sha1"}) == gen_hash_from_file(
+                fpath, {"md5", "sha1"})
+            assert HashedFile.compute_file_hash(os.path.join(tmpdir, "missing"), "md5") is None
+
+            # the workers only stat files if the caller doesn't know the size
+            assert checksum_helper._hash_batch([(fpath, "md5", 1234), (fpath, "md5", None)]) == [
+                (True, gen_hash_from_file(fpath, "md5"), 1234),
+                (True, gen_hash_from_file(fpath, "md5"), os.stat(fpath).st_size)]
+
+            serial.write()
+            crc_errors, missing, matches = serial.verify(jobs=8)
+            assert not crc_errors and not missing and matches == len(serial.entries)
+
+            # enough threads to fill the batches, but the reads per device stay limited
+            args = Args(jobs=1, device_jobs=[])
+            assert checksum_helper._hash_jobs_from_args(args) == 6
+            assert checksum_helper._scheduler_from_args(args).default_jobs == 1
+        finally:
+            checksum_helper.set_hash_pool(None)
+
+
+def test_gen_hash_from_file_multiple_algos(setup_tmpdir_param):
+    tmpdir = setup_tmpdir_param
+    fn = os.path.join(tmpdir, "file.bin")
+    contents = os.urandom(200_000)
+    with open(fn, "wb") as f:
+        f.write(contents)
+
+    digests = gen_hash_from_file(fn, {"md5", "sha512"})
+    assert digests == {"md5": gen_hash_from_file(fn, "md5"),
+                       "sha512": gen_hash_from_file(fn, "sha512")}
+    assert gen_hash_from_file(fn, {"md5"}, True) == {"md5": utils.hash_contents("md5", contents)}
+
+
+def test_gen_hashes_from_files(setup_tmpdir_param):
+    tmpdir = setup_tmpdir_param
+    fnames = []
+    for i, size in enumerate([0, 1, 4096, 65535, 200_000]):
+        fn = os.path.join(tmpdir, f"file{i}.bin")
+        with open(fn, "wb") as f:
+            f.write(os.urandom(size))
+        fnames.append(fn)
+    missing = os.path.join(tmpdir, "missing.bin")
+
+    for algos in ("sha512", "sha3_256", {"md5", "sha1"}):
+        assert checksum_helper.gen_hashes_from_files([*fnames, missing], algos) == [
+            *(gen_hash_from_file(fn, algos) for fn in fnames), None]
+
+
+def test_batch_small_files():
+    sizes = [1, 2, None, 3, 100, 4, 5, 6, 7, 8]
+    batches = list(checksum_helper.batch_small_files(
+        range(len(sizes)), lambda i: sizes[i], max_size=10, batch_size=3))
+    assert batches == [[0, 1], [2], [3], [4], [5, 6, 7], [8, 9]]
+
+
+def test_verify_small_file_batches(setup_tmpdir_param):
+    tmpdir = setup_tmpdir_param
+    for i in range(10):
+        with open(os.path.join(tmpdir, f"f{i}.txt"), "w") as f:
+            f.write(f"file {i}")
+    ch = ChecksumHelper(tmpdir, hash_filename_filter=None)
+    hf = ch.gen_missing_checksums("sha512")
+    assert hf is not None
+    # one changed file, same size
+    with open(os.path.join(tmpdir, "f3.txt"), "w") as f:
+        f.write("file x")
+    os.remove(os.path.join(tmpdir, "f5.txt"))
+
+    for jobs in (1, 4):
+        crc_errors, missing, matches = hf.verify(jobs=jobs)
+        assert [rel for _, rel in crc_errors] == ["f3.txt"]
+        assert missing == ["f5.txt"]
+        assert matches == 8
+
+
+@pytest.mark.parametrize("size", [0, 1, 4096, 65536, 200_001])
+@pytest.mark.parametrize("strategy", list(ReadStrategy))
+@pytest.mark.parametrize("chunk_size", [4096, 65536])
+def test_gen_hash_from_file_read_strategies(size, strategy, chunk_size, setup_tmpdir_param):
+    tmpdir = setup_tmpdir_param
+    fn = os.path.join(tmpdir, "file.bin")
+    contents = os.urandom(size)
+    with open(fn, "wb") as f:
+        f.write(contents)
+
+    assert gen_hash_from_file(fn, "sha512", True, read_strategies=[(None, strategy, chunk_size)]) == (
+        utils.hash_contents("sha512", contents))
+
+
+@pytest.mark.parametrize("strategy", list(ReadStrategy))
+def test_gen_hash_from_file_throttled(strategy, setup_tmpdir_param, monkeypatch):
+    tmpdir = setup_tmpdir_param
+    fn = os.path.join(tmpdir, "file.bin")
+    contents = os.urandom(300 * 1024)
+    with open(fn, "wb") as f:
+        f.write(contents)
+
+    waits = []
+    monkeypatch.setattr(checksum_helper.time, "sleep", waits.append)
+    throttle = IOThrottle(bytes_per_sec=100 * 1024)
+    assert gen_hash_from_file(fn, "sha512", True, read_strategies=[(None, strategy, 64 * 1024)],
+                              throttle=throttle) == utils.hash_contents("sha512", contents)
+    # sleep doesn't advance the clock here so the last wait is the whole debt:
+    # 200KiB over the burst at 100KiB/s
+    assert 1.9 < max(waits) <= 2.0
+
+
+def test_io_throttle_control_file(setup_tmpdir_param, monkeypatch):
+    tmpdir = setup_tmpdir_param
+    control_file = os.path.join(tmpdir, "io_limits")
+    throttle = IOThrottle(control_file=control_file)
+    throttle.CONTROL_FILE_CHECK_INTERVAL = 0
+    monkeypatch.setattr(checksum_helper.time, "sleep", lambda _: None)
+
+    # missing control file -> unlimited
+    throttle.acquire(1024)
+    assert throttle.bytes_per_sec is None and throttle.iops is None
+
+    with open(control_file, "w") as f:
+        f.write("100K 5\n")
+    os.utime(control_file, ns=(1_000_000_000, 1_000_000_000))
+    throttle.acquire(1024)
+    assert throttle.bytes_per_sec == 100 * 1024 and throttle.iops == 5
+
+    with open(control_file, "w") as f:
+        f.write("0")
+    os.utime(control_file, ns=(2_000_000_000, 2_000_000_000))
+    throttle.acquire(1024)
+    assert throttle.bytes_per_sec is None and throttle.iops == 5
+
+
+def test_to_single_hash_file_reads_once(setup_tmpdir_param, monkeypatch):
+    tmpdir = setup_tmpdir_param
+    fn = os.path.join(tmpdir, "file.txt")
+    with open(fn, "w") as f:
+        f.write("foo")
+
+    hf = ChecksumHelperData(None, os.path.join(tmpdir, "test.cshd"))
+    hf.set_entry(fn, HashedFile(fn, None, "md5", gen_hash_from_file(fn, "md5"), False))
+
+    calls = []
+    orig = gen_hash_from_file
+    def counting(fname, algos, *args):
+        calls.append((fname, algos))
+        return orig(fname, algos, *args)
+    monkeypatch.setattr("checksum_helper.checksum_helper.gen_hash_from_file", counting)
+
+    hf.to_single_hash_file("sha512")
+
+    assert calls == [(fn, {"md5", "sha512"})]
+    entry = hf.get_entry(fn)
+    assert entry.hash_type == "sha512"
+    assert entry.hash_bytes == orig(fn, "sha512")
+
+
+def test_async_run_not_closed():
+    stopped = threading.Event()
+
+    def produce(emit, cancel):
+        i = 0
+        while not cancel.is_set():
+            emit(i)
+            i += 1
+        stopped.set()
+
+    async def run():
+        # buffer fills up right away, so the thread waits in emit
+        run_async = AsyncRun(produce, maxsize=2)
+        async for item in run_async:
+            break
+        del run_async
+        gc.collect()
+        return await asyncio.get_running_loop().run_in_executor(None, stopped.wait, 5)
+
+    assert asyncio.run(run())
+
+    # loop is closed while the AsyncRun is still referenced
+    stopped.clear()
+    loop = asyncio.new_event_loop()
+    run_async = AsyncRun(produce, maxsize=2)
+
+    async def consume_one():
+        async for item in run_async:
+            return item
+
+    try:
+        assert loop.run_until_complete(consume_one()) == 0
+    finally:
+        loop.close()
+    assert stopped.wait(5)
+
+
+def test_async_run_cancelled_twice():
+    started = threading.Event()
+    stopped = threading.Event()
+
+    def produce(emit, cancel):
+        started.set()
+        cancel.wait()
+        # takes a while to stop at the next item
+        time.sleep(0.3)
+        stopped.set()
+
+    async def consume():
+        async for _ in AsyncRun(produce):
+            pass
+
+    async def run():
+        task = asyncio.ensure_future(consume())
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # the cancellation is only passed on once the worker thread stopped
+        assert stopped.is_set()
+
+    asyncio.run(run())
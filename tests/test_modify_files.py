@@ -238,3 +238,22 @@ def test_move_preserves_mtime(mtime_ordered_hfiles, monkeypatch):
     assert hf_mtimes == hf_mtimes_after_move
 
 
+def test_move_dir_ignores_dirs_with_same_prefix(setup_tmpdir_param):
+    root = setup_tmpdir_param
+    for d in ("sub", "sub2"):
+        os.makedirs(os.path.join(root, d))
+        write_file_str(os.path.join(root, d, "test.txt"), d)
+    hf = os.path.join(root, "hashes.cshd")
+    write_file_str(hf, "1234124.5,md5,342452afbc5340 sub/test.txt\n"
+                       "1234124.5,md5,342452afbc5340 sub2/test.txt\n")
+
+    a = Args(root_dir=root, hash_filename_filter=None,
+             discover_hash_files_depth=-1, source_path=os.path.join(root, "sub"),
+             mv_path=os.path.join(root, "moved"))
+    _cl_move(a)
+
+    # order of the entries is kept and only the entries of the moved dir were changed
+    assert read_file(hf).splitlines() == [
+        "1234124.5,md5,342452afbc5340 moved/test.txt",
+        "1234124.5,md5,342452afbc5340 sub2/test.txt",
+    ]
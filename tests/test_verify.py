@@ -1,11 +1,13 @@
 import os
 import logging
 import time
+import asyncio
 import pytest
 
-from utils import TESTS_DIR, Args, hash_contents
+from utils import TESTS_DIR, Args, hash_contents, setup_tmpdir_param
 
-from checksum_helper.checksum_helper import ChecksumHelper, _cl_verify_hfile, _cl_verify_all, _cl_verify_filter
+from checksum_helper import checksum_helper
+from checksum_helper.checksum_helper import ChecksumHelper, _cl_verify_hfile, _cl_verify_all, _cl_verify_filter, _cl_verify_scrub, ScrubState, SCRUB_STATE_FILENAME
 
 
 def x_contains_all_y(x, y) -> None:
@@ -215,6 +217,108 @@ def test_verify_hfile_warn_missing_and_crc(caplog):
     ]
 
 
+def test_verify_hfile_jobs_stable_order(caplog):
+    test_verify_root = os.path.join(TESTS_DIR, "test_verify_files", "tt")
+    caplog.set_level(logging.INFO, logger='checksum_helper.checksum_helper')
+    hfile_path = os.path.join(test_verify_root, "sub1+2_n3+4.sha512")
+
+    caplog.clear()
+    assert _cl_verify_hfile(Args(hash_file_name=[hfile_path])) == (11, 7, 2, 2)
+    serial_records = caplog.record_tuples
+
+    caplog.clear()
+    assert _cl_verify_hfile(Args(jobs=4, hash_file_name=[hfile_path])) == (11, 7, 2, 2)
+    # results are reported in the same order even when hashing in parallel
+    assert caplog.record_tuples == serial_records
+
+
+def test_verify_size_mismatch_not_hashed(setup_tmpdir_param, caplog, monkeypatch):
+    tmpdir = setup_tmpdir_param
+    caplog.set_level(logging.INFO, logger='checksum_helper.checksum_helper')
+    fpath = os.path.join(tmpdir, "size.txt")
+    with open(fpath, "w", encoding="utf-8") as f:
+        f.write("size")
+    mtime = os.stat(fpath).st_mtime
+    hfile_path = os.path.join(tmpdir, "size.cshd")
+    with open(hfile_path, "w", encoding="utf-8") as f:
+        f.write(f"{mtime},5,md5,{hash_contents('md5', b'size')} size.txt\n")
+
+    def fail_hash(*args, **kwargs):
+        assert False, "file with a mismatching size should not be hashed"
+    monkeypatch.setattr(checksum_helper, "gen_hash_from_file", fail_hash)
+
+    caplog.clear()
+    assert _cl_verify_hfile(Args(hash_file_name=[hfile_path])) == (1, 0, 0, 1)
+    assert ('checksum_helper.checksum_helper', logging.ERROR,
+            'size.txt: SIZE MISMATCH -> CORRUPTED (same modification time)') in caplog.record_tuples
+
+    # small files are hashed in batches, which has to skip the mismatching file as well
+    ok_path = os.path.join(tmpdir, "ok.txt")
+    with open(ok_path, "w", encoding="utf-8") as f:
+        f.write("ok")
+    with open(hfile_path, "a", encoding="utf-8") as f:
+        f.write(f"{os.stat(ok_path).st_mtime},2,md5,{hash_contents('md5', b'ok')} ok.txt\n")
+    gen_hashes_from_files = checksum_helper.gen_hashes_from_files
+
+    def batch_hash(fnames, *args, **kwargs):
+        assert fpath not in fnames, "file with a mismatching size should not be hashed"
+        return gen_hashes_from_files(fnames, *args, **kwargs)
+    monkeypatch.setattr(checksum_helper, "gen_hashes_from_files", batch_hash)
+
+    caplog.clear()
+    assert _cl_verify_hfile(Args(hash_file_name=[hfile_path])) == (2, 1, 0, 1)
+    assert ('checksum_helper.checksum_helper', logging.ERROR,
+            'size.txt: SIZE MISMATCH -> CORRUPTED (same modification time)') in caplog.record_tuples
+
+
+def test_verify_quick(setup_tmpdir_param, caplog, monkeypatch):
+    tmpdir = setup_tmpdir_param
+    caplog.set_level(logging.INFO, logger='checksum_helper.checksum_helper')
+    os.makedirs(os.path.join(tmpdir, "sub"))
+    for rel_fpath in ("ok.txt", "grown.txt", "touched.txt", "no_meta.txt", "sub/ok.txt"):
+        with open(os.path.join(tmpdir, rel_fpath), "w", encoding="utf-8") as f:
+            f.write("quick")
+    mtime = 1600000000_123456789
+    for rel_fpath in ("ok.txt", "grown.txt", "touched.txt", "sub/ok.txt"):
+        os.utime(os.path.join(tmpdir, rel_fpath), ns=(mtime, mtime))
+    with open(os.path.join(tmpdir, "grown.txt"), "a", encoding="utf-8") as f:
+        f.write("more")
+    os.utime(os.path.join(tmpdir, "grown.txt"), ns=(mtime, mtime))
+    touched = mtime + 5_000_000_000
+    os.utime(os.path.join(tmpdir, "touched.txt"), ns=(touched, touched))
+
+    md5 = hash_contents('md5', b'quick')
+    hfile_path = os.path.join(tmpdir, "quick.cshd")
+    with open(hfile_path, "w", encoding="utf-8") as f:
+        f.write(
+            f"1600000000.123456789,5,md5,{md5} ok.txt\n"
+            f"1600000000.123456789,5,md5,{md5} grown.txt\n"
+            f"1600000000.123456789,5,md5,{md5} touched.txt\n"
+            f",md5,{md5} no_meta.txt\n"
+            f"1600000000.123456789,5,md5,{md5} missing.txt\n"
+            f"1600000000.123456789,5,md5,{md5} missing_dir/missing.txt\n"
+            f"1600000000.123456789,5,md5,{md5} sub/ok.txt\n")
+
+    def fail_hash(*args, **kwargs):
+        assert False, "quick verify should not read any files"
+    monkeypatch.setattr(checksum_helper, "gen_hash_from_file", fail_hash)
+
+    for jobs in (1, 4):
+        caplog.clear()
+        assert _cl_verify_hfile(Args(jobs=jobs, quick=True, hash_file_name=[hfile_path])) == (7, 3, 2, 2)
+        assert caplog.record_tuples[:7] == [
+            ('checksum_helper.checksum_helper', logging.INFO, 'ok.txt: SIZE/MTIME OK'),
+            ('checksum_helper.checksum_helper', logging.ERROR,
+             'grown.txt: SIZE MISMATCH -> CORRUPTED (same modification time)'),
+            ('checksum_helper.checksum_helper', logging.WARNING,
+             'touched.txt: MTIME CHANGED -> OUTDATED HASH (file is newer)'),
+            ('checksum_helper.checksum_helper', logging.WARNING, 'no_meta.txt: NO MTIME OR SIZE RECORDED -> NOT CHECKED'),
+            ('checksum_helper.checksum_helper', logging.WARNING, 'missing.txt: MISSING'),
+            ('checksum_helper.checksum_helper', logging.WARNING, f'missing_dir{os.sep}missing.txt: MISSING'),
+            ('checksum_helper.checksum_helper', logging.INFO, f'sub{os.sep}ok.txt: SIZE/MTIME OK'),
+        ]
+
+
 def test_verify_all(caplog):
     test_verify_root = os.path.join(TESTS_DIR, "test_verify_files", "tt")
     # caplog.set_level sets on root logger by default which is somehow not the logger setup by
@@ -568,3 +672,187 @@ def test_verify_filter(caplog):
         ('checksum_helper.checksum_helper', logging.WARNING,
          f"{root_dir}{os.sep}tt_most_current_{time.strftime('%Y-%m-%d')}.cshd: 1 missing files!"),
     ]
+
+
+def test_verify_scrub(setup_tmpdir_param, caplog):
+    tmpdir = setup_tmpdir_param
+    caplog.set_level(logging.INFO, logger='checksum_helper.checksum_helper')
+    md5 = hash_contents('md5', b'scrub')
+    lines = []
+    for name in ("a.txt", "b.txt", "c.txt", "d.txt"):
+        with open(os.path.join(tmpdir, name), "w", encoding="utf-8") as f:
+            f.write("scrub")
+        lines.append(f",5,md5,{md5} {name}\n")
+    with open(os.path.join(tmpdir, "scrub.cshd"), "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+    def scrub(interval=0):
+        return _cl_verify_scrub(Args(
+            root_dir=tmpdir, discover_hash_files_depth=0, hash_filename_filter=(),
+            state_file=None, max_bytes=10, interval=interval))
+
+    def last_verified():
+        state = ScrubState(os.path.join(tmpdir, SCRUB_STATE_FILENAME))
+        state.read()
+        return sorted(os.path.basename(p) for p in state.last_verified)
+
+    # never verified files first, then ordered by path
+    assert scrub() == (2, 2, 0, 0)
+    assert last_verified() == ["a.txt", "b.txt"]
+    assert scrub() == (2, 2, 0, 0)
+    assert last_verified() == ["a.txt", "b.txt", "c.txt", "d.txt"]
+
+    # every file was verified less than a day ago
+    caplog.clear()
+    assert scrub(interval=1) == (0, 0, 0, 0)
+
+    # corruption is reported like verify does
+    with open(os.path.join(tmpdir, "a.txt"), "w", encoding="utf-8") as f:
+        f.write("bitrt")
+    caplog.clear()
+    assert scrub() == (2, 1, 0, 1)
+    assert ('checksum_helper.checksum_helper', logging.WARNING,
+            'a.txt: MD5 FAILED') in caplog.record_tuples
+
+    # the state file in the root dir doesn't get hashed
+    incremental = ChecksumHelper(tmpdir).do_incremental_checksums("md5")
+    assert incremental is not None
+    assert SCRUB_STATE_FILENAME not in [os.path.basename(p) for p in incremental.entries]
+    assert os.path.join(tmpdir, "a.txt") in incremental.entries
+
+
+def test_verify_budget_resume_journal(setup_tmpdir_param, caplog):
+    tmpdir = setup_tmpdir_param
+    caplog.set_level(logging.INFO, logger='checksum_helper.checksum_helper')
+    md5 = hash_contents('md5', b'jrnl')
+    lines = []
+    for name in ("a.txt", "b.txt", "c.txt", "d.txt"):
+        with open(os.path.join(tmpdir, name), "w", encoding="utf-8") as f:
+            f.write("jrnl" if name != "a.txt" else "JRNL")
+        lines.append(f",4,md5,{md5} {name}\n")
+    hfile_path = os.path.join(tmpdir, "jrnl.cshd")
+    with open(hfile_path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    journal_path = os.path.join(tmpdir, "verify.journal")
+
+    def verify(max_bytes=None, resume=False):
+        return _cl_verify_hfile(Args(
+            max_bytes=max_bytes, journal=journal_path, resume=resume,
+            hash_file_name=[hfile_path]))
+
+    # stops after 8 bytes
+    assert verify(max_bytes=8) == (2, 1, 0, 1)
+    with open(journal_path, "r", encoding="utf-8") as f:
+        assert f.read().splitlines() == [
+            f"FAILED,,{os.path.join(tmpdir, 'a.txt')}",
+            f"OK,,{os.path.join(tmpdir, 'b.txt')}",
+        ]
+
+    caplog.clear()
+    # a.txt and b.txt are not verified again, but included in the results
+    assert verify(resume=True) == (4, 3, 0, 1)
+    assert [msg for _, _, msg in caplog.record_tuples if msg.endswith(": MD5 OK")] == [
+        "c.txt: MD5 OK", "d.txt: MD5 OK"]
+    # everything was verified
+    assert not os.path.exists(journal_path)
+
+
+def test_verify_whitelist_only_matches_under_prefix_dir(setup_tmpdir_param, monkeypatch):
+    tmpdir = setup_tmpdir_param
+    rel_fpaths = ["foo.txt", f"sub{os.sep}foo.txt", f"sub{os.sep}deep{os.sep}foo.txt",
+                  f"sub2{os.sep}foo.txt"]
+    md5 = hash_contents('md5', b'filter')
+    cshd = checksum_helper.ChecksumHelperData(None, os.path.join(tmpdir, "filter.cshd"))
+    for rel_fpath in rel_fpaths:
+        fpath = os.path.join(tmpdir, rel_fpath)
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        with open(fpath, "wb") as f:
+            f.write(b"filter")
+        cshd.set_entry(fpath, checksum_helper.HashedFile(
+            fpath, None, "md5", bytes.fromhex(md5), False))
+
+    matched = []
+    matches = checksum_helper.PatternSet.matches
+
+    def counting_matches(self, text):
+        matched.append(text)
+        return matches(self, text)
+    monkeypatch.setattr(checksum_helper.PatternSet, "matches", counting_matches)
+
+    # only the entries in the literal dir prefix of the patterns are matched
+    assert cshd.verify(whitelist=[f"sub{os.sep}*.txt"]) == ([], [], 2)
+    assert sorted(matched) == sorted(rel_fpaths[1:3])
+
+    # no prefix -> all entries have to be matched
+    matched.clear()
+    assert cshd.verify(whitelist=[f"sub{os.sep}*.txt", "*2*"]) == ([], [], 3)
+    assert sorted(matched) == sorted(rel_fpaths)
+
+
+def test_async_verify(verify_cshd_2failed_files):
+    hfile_path = verify_cshd_2failed_files
+    ch = ChecksumHelper(os.path.dirname(hfile_path))
+    cshd = checksum_helper.ChecksumHelperData(ch, hfile_path)
+    cshd.read()
+    expected = cshd.verify()
+
+    async def run():
+        run_verify = cshd.async_verify(jobs=2)
+        streamed = [result async for result in run_verify]
+        return streamed, run_verify.result, await cshd.async_verify()
+
+    streamed, result, awaited = asyncio.run(run())
+    assert result == expected
+    assert awaited == expected
+    assert [fpath for fpath, _, _ in streamed] == list(cshd.entries.keys())
+    assert sorted(os.path.relpath(fpath, cshd.root_dir) for fpath, kind, _ in streamed
+                  if kind == checksum_helper.VerifyJournal.FAILED) == sorted(
+                      rel for _, rel in expected[0])
+    assert [os.path.relpath(fpath, cshd.root_dir) for fpath, kind, _ in streamed
+            if kind == checksum_helper.VerifyJournal.MISSING] == expected[1]
+
+
+def test_iter_verify(verify_cshd_2failed_files, setup_tmpdir_param):
+    hfile_path = verify_cshd_2failed_files
+    ch = ChecksumHelper(os.path.dirname(hfile_path))
+    cshd = checksum_helper.ChecksumHelperData(ch, hfile_path)
+    cshd.read()
+    expected = cshd.verify()
+
+    for jobs in (1, 3):
+        results = list(cshd.iter_verify(jobs=jobs))
+        assert [r.path for r in results] == list(cshd.entries.keys())
+        assert sorted((r.failure_type, r.rel_path) for r in results
+                      if r.status == checksum_helper.VerifyJournal.FAILED) == sorted(expected[0])
+        assert [r.rel_path for r in results
+                if r.status == checksum_helper.VerifyJournal.MISSING] == expected[1]
+        assert len([r for r in results if r.status == checksum_helper.VerifyJournal.OK]) == expected[2]
+        for r in results:
+            assert r.hash_type == cshd.entries[r.path].hash_type
+            assert r.duration >= 0
+            assert not r.resumed
+            if r.status == checksum_helper.VerifyJournal.OK:
+                assert r.bytes_read == os.stat(r.path).st_size
+            elif r.status == checksum_helper.VerifyJournal.MISSING:
+                assert r.bytes_read == 0
+
+    # closing the iterator early stops verifying
+    it = cshd.iter_verify()
+    first = next(it)
+    it.close()
+    assert first.path == next(iter(cshd.entries))
+
+    # entries in the journal are yielded as resumed
+    journal_path = os.path.join(setup_tmpdir_param, "verify.journal")
+    with checksum_helper.VerifyJournal(journal_path) as journal:
+        it = cshd.iter_verify(journal=journal)
+        verified = [next(it), next(it)]
+        it.close()
+    with checksum_helper.VerifyJournal(journal_path, resume=True) as journal:
+        results = list(cshd.iter_verify(journal=journal))
+    assert [r.path for r in results if r.resumed] == [r.path for r in verified]
+    assert [r.path for r in results] == list(cshd.entries.keys())
+    with checksum_helper.VerifyJournal(journal_path, resume=True) as journal:
+        results = list(cshd.iter_verify(journal=journal, quick=True))
+    assert [r.path for r in results] == list(cshd.entries.keys())
+    assert all(r.resumed for r in results)
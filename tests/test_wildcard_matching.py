@@ -14,13 +14,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-from checksum_helper.checksum_helper import wildcard_match
+import random
+
+from checksum_helper.checksum_helper import wildcard_match, PatternSet
 
 
 def wildcard_caller(text, pattern, expected):
     # wildcard_match(pattern, text)
     # use is here to make sure we acutally get True not a value that just evaluates to True
     assert wildcard_match(pattern, text) is expected
+    assert PatternSet([pattern]).matches(text) is expected
 
 
 def test_wildcard_matching():
@@ -343,6 +346,7 @@ def wildcard_caller_partial(text, pattern, expected):
     # wildcard_match(pattern, text)
     # use is here to make sure we acutally get True not a value that just evaluates to True
     assert wildcard_match(pattern, text, partial_match=True) is expected
+    assert PatternSet([pattern]).partial_matches(text) is expected
 
 
 def test_wildcard_matching_partial():
@@ -356,3 +360,37 @@ def test_wildcard_matching_partial():
     wildcard_caller_partial("f_o/bar/", "fo?/*", False)
     wildcard_caller_partial("foo/bar/", "foo/qux/*", False)
     wildcard_caller_partial("foo/Qux/", "foo/qux/*", False)
+
+
+def test_pattern_set_same_as_wildcard_match():
+    rng = random.Random(1337)
+    for _ in range(200):
+        patterns = ["".join(rng.choice("ab/*?.") for _ in range(rng.randint(0, 6)))
+                    for _ in range(rng.randint(0, 4))]
+        ps = PatternSet(patterns)
+        for _ in range(25):
+            text = "".join(rng.choice("ab/*.") for _ in range(rng.randint(0, 8)))
+            assert ps.matches(text) is any(wildcard_match(p, text) for p in patterns)
+            assert ps.partial_matches(text) is any(
+                wildcard_match(p, text, partial_match=True) for p in patterns)
+
+
+def test_pattern_set_literal_buckets():
+    ps = PatternSet(["dir/sub/*", "*.ext", "*.tar.gz", "exact.txt", "a*b?", "pre**"])
+    assert ps.matches("dir/sub/")
+    assert ps.matches("dir/sub/foo/bar.txt")
+    assert not ps.matches("dir/sub")
+    assert not ps.matches("dir/su/b.txt")
+    assert ps.matches("foo/bar.ext")
+    assert ps.matches(".ext")
+    assert not ps.matches("foo/bar.ext2")
+    assert ps.matches("foo.tar.gz")
+    assert ps.matches("exact.txt")
+    assert not ps.matches("foo/exact.txt")
+    assert ps.matches("a/foo/bc")
+    assert not ps.matches("a/foo/b")
+    assert ps.matches("prefix")
+    assert not PatternSet([]).matches("")
+    assert PatternSet([""]).matches("")
+    assert PatternSet(["*"]).matches("")
+
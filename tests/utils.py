@@ -4,6 +4,7 @@ import shutil
 import json
 import pickle
 import hashlib
+import tempfile
 
 from typing import List
 
@@ -11,6 +12,19 @@ from typing import List
 TESTS_DIR = os.path.dirname(os.path.realpath(__file__))
 
 
+def can_symlink() -> bool:
+    # creating symlinks on windows needs admin rights or developer mode
+    with tempfile.TemporaryDirectory() as tmpdir:
+        try:
+            os.symlink(tmpdir, os.path.join(tmpdir, "link"))
+        except (OSError, NotImplementedError, AttributeError):
+            return False
+    return True
+
+
+skip_no_symlinks = pytest.mark.skipif(not can_symlink(), reason="can't create symlinks")
+
+
 def read_file(fn, encoding="UTF-8"):
     with open(fn, "r", encoding=encoding) as f:
         return f.read()
@@ -106,6 +120,20 @@ def setup_tmpdir_param():
 
 # stub for testing the _cl funcs directly
 class Args:
+    # defaults of options shared by all subcommands
+    walk_jobs = 1
+    walk_unordered = False
+    single_walk = False
+    # hashing/verify options
+    jobs = 1
+    device_jobs = None
+    stat_cache = None
+    quick = False
+    max_bytes = None
+    max_duration = None
+    journal = None
+    resume = False
+
     def __init__(self, *args, **kwargs):
         self.__dict__.update(kwargs)
 
@@ -137,6 +165,11 @@ def cshd_strip_mtime(cshd_contents):
     stripped = []
     for ln in cshd_contents.splitlines():
         mtime_end = ln.index(",")
-        stripped.append(ln[mtime_end + 1:])
+        rest = ln[mtime_end + 1:]
+        # also strip the optional size field
+        size_str, _, after_size = rest.partition(",")
+        if size_str.isdigit():
+            rest = after_size
+        stripped.append(rest)
 
     return "\n".join(stripped)